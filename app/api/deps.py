@@ -1,11 +1,15 @@
+import hmac
+
 from fastapi import Depends, HTTPException, status
-from fastapi.security import OAuth2PasswordBearer
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer, OAuth2PasswordBearer
 from jose import JWTError
 from pydantic import ValidationError
 
 from app.core import security
+from app.core.config import settings
 from app.schemas.user import UserInDB
 from app.core.security import TokenData
+from app.core.log import user_id_var
 from app.crud import crud_user
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login") # Point to your login endpoint
@@ -18,6 +22,7 @@ async def get_current_user(token: str = Depends(oauth2_scheme)) -> UserInDB:
     user = await crud_user.get_user_by_id(user_id=token_data.user_id)
     if user is None:
         raise security.credentials_exception
+    user_id_var.set(user.id) # Attached to the request's log events
     return user
 
 async def get_current_active_user(current_user: UserInDB = Depends(get_current_user)) -> UserInDB:
@@ -25,6 +30,28 @@ async def get_current_active_user(current_user: UserInDB = Depends(get_current_u
         raise HTTPException(status_code=400, detail="Inactive user")
     return current_user
 
+def is_platform_admin(user: UserInDB) -> bool:
+    """ Platform admins are granted by configuration only, never by anything stored from a request. """
+    return user.email.lower() in {email.lower() for email in settings.ADMIN_EMAILS}
+
+# Dependency for platform-wide admin endpoints (debug/maintenance), not team admins
+async def get_current_admin_user(current_user: UserInDB = Depends(get_current_active_user)) -> UserInDB:
+    if not is_platform_admin(current_user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+    return current_user
+
+# Dependency for /api/metrics: the METRICS_TOKEN (Prometheus) or a platform admin's access token
+async def require_metrics_access(
+    credentials: HTTPAuthorizationCredentials = Depends(HTTPBearer(auto_error=False))
+):
+    if credentials is None:
+        raise security.credentials_exception
+    if settings.METRICS_TOKEN and hmac.compare_digest(credentials.credentials.encode(), settings.METRICS_TOKEN.encode()):
+        return
+    user = await get_current_user(credentials.credentials)
+    if not user.is_active or not is_platform_admin(user):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Admin privileges required")
+
 # Dependency to check if user is an admin of a specific team
 async def get_team_admin(
     team_id: str,
@@ -43,11 +70,11 @@ async def get_team_member(
     team_id: str,
     current_user: UserInDB = Depends(get_current_active_user)
 ) -> UserInDB:
-     from app.crud.crud_team import get_team_by_id # Avoid circular import
-     team = await get_team_by_id(team_id)
-     if not team:
+     from app.crud.crud_membership import get_membership # Avoid circular import
+     from app.crud.crud_team import get_team_by_id
+     # Admins have an "admin" membership, so one _id lookup covers both
+     if await get_membership(team_id, current_user.id):
+         return current_user
+     if not await get_team_by_id(team_id):
          raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Team not found")
-     # Check if user is admin OR in the member_ids list
-     if team.admin_id != current_user.id and current_user.id not in team.member_ids:
-         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this team")
-     return current_user
\ No newline at end of file
+     raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not a member of this team")
\ No newline at end of file
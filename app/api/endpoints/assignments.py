@@ -3,8 +3,9 @@ from typing import List
 
 from app.schemas import assignment as assignment_schema
 from app.schemas import user as user_schema # For dependency
-from app.crud import crud_assignment, crud_team # Need crud_team to check team exists
+from app.crud import crud_assignment, crud_stats, crud_team # Need crud_team to check team exists
 from app.api import deps
+from app.core import cache
 
 router = APIRouter()
 
@@ -43,8 +44,12 @@ async def get_team_assignments(
     # if not team:
     #     raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Team not found")
 
-    assignments_db = await crud_assignment.get_assignments_for_team(team_id=team_id)
-    return [assignment_schema.AssignmentPublic.model_validate(a) for a in assignments_db]
+    async def build():
+        assignments_db = await crud_assignment.get_assignments_for_team(team_id=team_id)
+        return [assignment_schema.AssignmentPublic.model_validate(a) for a in assignments_db]
+
+    return await cache.cached_json("team_assignments", team_id, "assignments", build,
+                                   List[assignment_schema.AssignmentPublic])
 
 
 @router.get("/{assignment_id}", response_model=assignment_schema.AssignmentPublic)
@@ -56,15 +61,47 @@ async def get_assignment_details(
     """
     Get details of a specific assignment. Requires user to be a team member.
     """
-    assignment = await crud_assignment.get_assignment_by_id(assignment_id)
-    if not assignment:
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assignment not found")
+    async def build():
+        assignment = await crud_assignment.get_assignment_by_id(assignment_id)
+        if not assignment:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assignment not found")
 
-    # Ensure the assignment belongs to the team the user is authorized for
-    if assignment.team_id != team_id:
-         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Assignment does not belong to this team context")
+        # Ensure the assignment belongs to the team the user is authorized for
+        if assignment.team_id != team_id:
+             raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Assignment does not belong to this team context")
 
-    return assignment_schema.AssignmentPublic.model_validate(assignment)
+        return assignment_schema.AssignmentPublic.model_validate(assignment)
+
+    # Only successful responses are cached, under the team in the path
+    return await cache.cached_json("assignment_details", team_id, f"assignment:{assignment_id}", build,
+                                   assignment_schema.AssignmentPublic)
+
+
+@router.get("/{assignment_id}/stats", response_model=assignment_schema.AssignmentStatsPublic)
+async def get_assignment_stats(
+    team_id: str,
+    assignment_id: str,
+    current_user: user_schema.UserInDB = Depends(deps.get_team_admin) # Teachers only
+):
+    """
+    Submitted / not submitted / late student counts and total versions for an assignment.
+    Requires user to be the team admin.
+    """
+    stats = await crud_stats.get_assignment_stats(assignment_id)
+    if not stats or stats.team_id != team_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assignment stats not found")
+    team = await crud_team.get_team_by_id(team_id)
+    student_count = max(team.member_count - 1, 0) if team else 0 # Every member except the admin
+
+    return assignment_schema.AssignmentStatsPublic(
+        assignment_id=assignment_id,
+        student_count=student_count,
+        submitted_count=stats.submitted_count,
+        not_submitted_count=max(student_count - stats.submitted_count, 0),
+        late_count=stats.late_count,
+        version_count=stats.version_count,
+        updated_at=stats.updated_at
+    )
 
 
 # Add endpoints for updating/deleting assignments (admin only)
\ No newline at end of file
@@ -0,0 +1,23 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, status
+from typing import Any, Dict, List
+
+from app.schemas import user as user_schema # For dependency
+from app.core import profiler
+from app.core.config import settings
+from app.api import deps
+
+router = APIRouter()
+
+@router.get("/slow-queries", response_model=List[Dict[str, Any]])
+async def get_slow_queries(
+    limit: int = Query(50, ge=1, le=1000),
+    current_user: user_schema.UserInDB = Depends(deps.get_current_admin_user)
+):
+    """
+    Most recent slow Mongo commands issued by the CRUD layer, newest first, with the calling
+    CRUD function and an explain("executionStats") summary. Admin only.
+    Requires QUERY_PROFILER_ENABLED=true.
+    """
+    if not settings.QUERY_PROFILER_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Query profiler is not enabled")
+    return profiler.get_slow_queries(limit=limit)
@@ -0,0 +1,74 @@
+import asyncio
+from typing import List
+
+from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi.responses import StreamingResponse
+
+from app.schemas import user as user_schema # For dependency
+from app.crud import crud_membership
+from app.api import deps
+from app.core import events
+from app.core.config import settings
+
+router = APIRouter()
+
+# Server-sent event streams (text/event-stream). Each event is sent as
+#   event: assignment.created | submission.updated | submission.deleted
+#   data: {"_id": ..., ...}
+# Events only carry ids and a few fields: clients refetch what they display. A stream that ends
+# (slow consumer, server shutdown) should be reconnected, followed by a refetch.
+
+async def _event_stream(subscription: events.Subscription):
+    try:
+        yield "retry: 5000\n\n" # Reconnect delay for EventSource clients
+        while True:
+            try:
+                event = await asyncio.wait_for(subscription.get(), timeout=settings.EVENTS_HEARTBEAT_SECONDS)
+            except asyncio.TimeoutError:
+                yield ": keepalive\n\n" # Keeps proxies from closing idle streams, and detects gone clients
+                continue
+            if event is None:
+                if subscription.dropped:
+                    yield "event: overflow\ndata: {}\n\n" # Too far behind: refetch after reconnecting
+                return
+            yield event.to_sse()
+    finally:
+        if not subscription.dropped: # Dropped subscriptions were removed by the broker
+            events.broker.unsubscribe(subscription)
+
+
+def _stream_response(topics: List[str]) -> StreamingResponse:
+    if not settings.EVENTS_ENABLED:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Live updates are disabled")
+    subscription = events.broker.subscribe(topics, settings.EVENTS_QUEUE_SIZE)
+    return StreamingResponse(
+        _event_stream(subscription),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} # No proxy buffering of the stream
+    )
+
+
+@router.get("/teams/{team_id}")
+async def stream_team_events(
+    team_id: str,
+    current_user: user_schema.UserInDB = Depends(deps.get_team_member) # Must be member
+):
+    """
+    Live updates of a team: new assignments for every member, plus every submission change for
+    the team admin.
+    """
+    topics = [events.team_topic(team_id)]
+    membership = await crud_membership.get_membership(team_id, current_user.id)
+    if membership and membership.role == "admin":
+        topics.append(events.team_submissions_topic(team_id))
+    return _stream_response(topics)
+
+
+@router.get("/me")
+async def stream_my_events(
+    current_user: user_schema.UserInDB = Depends(deps.get_current_active_user)
+):
+    """
+    Live updates of the current user's own submissions (e.g. from another device or a sync push).
+    """
+    return _stream_response([events.user_topic(current_user.id)])
@@ -1,54 +1,59 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import base64
+import binascii
+import hashlib
+
+from fastapi import APIRouter, Depends, File, Form, Header, HTTPException, Request, Response, UploadFile, status
 from typing import List, Optional
 
 from app.schemas import submission as submission_schema
 from app.schemas import user as user_schema # For dependency
-from app.crud import crud_submission, crud_assignment, crud_team
+from app.crud import crud_submission, crud_assignment, crud_membership, crud_team, crud_upload
 from app.api import deps
-from datetime import datetime, timezone # For validation
+from app.core.config import settings
+from app.services.storage import get_storage_backend, submission_file_key
+from datetime import datetime, timedelta, timezone # For validation
 
 router = APIRouter()
 
-# NOTE: Actual file upload logic (to S3 etc.) is NOT included here.
-# This assumes you handle upload elsewhere and pass the resulting URL.
-# If uploading directly to FastAPI, use UploadFile.
+# Files can either be uploaded elsewhere (e.g. straight to S3) and registered here by URL,
+# or streamed directly to POST /upload (or the resumable /uploads), which write them through app/services/storage.py.
 
-@router.post("", response_model=submission_schema.SubmissionPublic, status_code=status.HTTP_201_CREATED)
-async def create_or_update_submission(
-    assignment_id: str, # Usually from path
-    submission_data: submission_schema.SubmissionCreate, # Contains file URL etc.
-    current_user: user_schema.UserInDB = Depends(deps.get_current_active_user)
-):
-    """
-    Submit the first version of an assignment OR upload a new version
-    if a submission already exists for this user/assignment.
-    Requires user to be a member of the assignment's team.
-    Assumes assignment_id is part of the path, e.g., /api/assignments/{assignment_id}/submissions
-    """
-    # 1. Validate Assignment
+
+async def _get_assignment_for_member(assignment_id: str, current_user: user_schema.UserInDB):
+    """ Fetch the assignment, requiring the user to be a member of its team. """
     assignment = await crud_assignment.get_assignment_by_id(assignment_id)
     if not assignment:
         raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assignment not found")
 
-    # 2. Validate Team Membership
-    team = await crud_team.get_team_by_id(assignment.team_id)
-    if not team or current_user.id not in team.member_ids:
+    if not await crud_membership.get_membership(assignment.team_id, current_user.id):
          raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="User not a member of the team for this assignment")
 
-    # 3. Validate Due Date (Optional)
+    # Validate Due Date (Optional)
     # if assignment.due_date and datetime.now(timezone.utc) > assignment.due_date:
     #     raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Assignment due date has passed")
+    return assignment
+
 
-    # 4. Check if submission already exists
-    doc_id = crud_submission.generate_submission_doc_id(assignment_id, current_user.id)
+async def _save_submission(
+    assignment,
+    student_id: str,
+    file_url: str,
+    content_hash: Optional[str],
+    notes: Optional[str]
+) -> submission_schema.SubmissionPublic:
+    """ Create the first submission version or append a new one, and build the public response. """
+    doc_id = crud_submission.generate_submission_doc_id(assignment.id, student_id)
     existing_submission = await crud_submission.get_submission_by_doc_id(doc_id)
 
-    if existing_submission:
+    if existing_submission and crud_submission.is_unchanged_upload(existing_submission, content_hash):
+        # --- Same file as the current version: return it without writing ---
+        submission_to_return = existing_submission
+    elif existing_submission:
         # --- Add new version ---
         new_version_data = submission_schema.SubmissionUploadNewVersion(
-             file_url=submission_data.file_url, # Extract relevant fields
-             content_hash=submission_data.content_hash,
-             notes=submission_data.notes
+             file_url=file_url,
+             content_hash=content_hash,
+             notes=notes
         )
         updated_submission = await crud_submission.add_new_submission_version(
             doc_id=doc_id,
@@ -64,28 +69,283 @@ async def create_or_update_submission(
         submission_to_return = updated_submission
     else:
         # --- Create first submission ---
-        # Ensure team_id is correct in submission data (can override or validate)
         create_data = submission_schema.SubmissionCreate(
-             assignment_id=assignment_id,
+             assignment_id=assignment.id,
              team_id=assignment.team_id, # Use validated team_id
-             file_url=submission_data.file_url,
-             content_hash=submission_data.content_hash,
-             notes=submission_data.notes
+             file_url=file_url,
+             content_hash=content_hash,
+             notes=notes
         )
-        new_submission = await crud_submission.create_submission(
+        submission_to_return = await crud_submission.create_submission(
             submission_in=create_data,
-            student_id=current_user.id
+            student_id=student_id
         )
-        submission_to_return = new_submission
 
     # Prepare public response
-    latest_version = next((v for v in reversed(submission_to_return.versions) if v.version == submission_to_return.current_version), None)
     return submission_schema.SubmissionPublic(
         **submission_to_return.model_dump(by_alias=True),
-        latest_version=latest_version
+        latest_version=crud_submission.get_latest_version(submission_to_return)
+    )
+
+
+@router.post("", response_model=submission_schema.SubmissionPublic, status_code=status.HTTP_201_CREATED)
+async def create_or_update_submission(
+    assignment_id: str, # Usually from path
+    submission_data: submission_schema.SubmissionCreate, # Contains file URL etc.
+    current_user: user_schema.UserInDB = Depends(deps.get_current_active_user)
+):
+    """
+    Submit the first version of an assignment OR upload a new version
+    if a submission already exists for this user/assignment.
+    Requires user to be a member of the assignment's team.
+    Assumes assignment_id is part of the path, e.g., /api/assignments/{assignment_id}/submissions
+    """
+    assignment = await _get_assignment_for_member(assignment_id, current_user)
+    return await _save_submission(
+        assignment,
+        student_id=current_user.id,
+        file_url=submission_data.file_url,
+        content_hash=submission_data.content_hash,
+        notes=submission_data.notes
     )
 
 
+@router.post("/upload", response_model=submission_schema.SubmissionPublic, status_code=status.HTTP_201_CREATED)
+async def upload_submission_file(
+    assignment_id: str,
+    file: UploadFile = File(...),
+    notes: Optional[str] = Form(None),
+    current_user: user_schema.UserInDB = Depends(deps.get_current_active_user)
+):
+    """
+    Upload the submission file directly and record it as a new submission version.
+    The file is streamed to the storage backend in UPLOAD_CHUNK_SIZE chunks while its
+    sha256 content_hash is computed, so it is never held in memory as a whole.
+    """
+    assignment = await _get_assignment_for_member(assignment_id, current_user)
+
+    storage = get_storage_backend()
+    writer = storage.open_writer()
+    hasher = hashlib.sha256()
+    size = 0
+    try:
+        while chunk := await file.read(settings.UPLOAD_CHUNK_SIZE):
+            size += len(chunk)
+            if size > settings.MAX_UPLOAD_SIZE:
+                raise HTTPException(
+                    status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                    detail=f"File exceeds the {settings.MAX_UPLOAD_SIZE} byte upload limit"
+                )
+            hasher.update(chunk)
+            await writer.write(chunk)
+    except BaseException:
+        await writer.abort() # Don't leave partial files behind
+        raise
+
+    content_hash = hasher.hexdigest()
+    # Content-addressed key: re-uploading the same file overwrites identical bytes
+    file_url = await writer.commit(submission_file_key(assignment.id, content_hash, file.filename))
+
+    return await _save_submission(
+        assignment,
+        student_id=current_user.id,
+        file_url=file_url,
+        content_hash=content_hash,
+        notes=notes
+    )
+
+
+# --- Resumable uploads (tus 1.0 core protocol + termination) ---
+# POST /uploads creates an upload, PATCH /uploads/{id} appends bytes at Upload-Offset and HEAD /uploads/{id}
+# reports the offset to resume from. The PATCH that reaches Upload-Length finalizes the file into a new
+# submission version. Abandoned uploads are purged after UPLOAD_EXPIRY_HOURS (see app/main.py).
+
+TUS_VERSION = "1.0.0"
+
+def _parse_upload_metadata(header: Optional[str]) -> dict:
+    """ Upload-Metadata is a comma separated list of "key base64(value)" pairs. """
+    metadata = {}
+    for pair in (header or "").split(","):
+        key, _, value = pair.strip().partition(" ")
+        if not key:
+            continue
+        try:
+            metadata[key] = base64.b64decode(value).decode() if value else ""
+        except (binascii.Error, UnicodeDecodeError):
+            raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid Upload-Metadata value for '{key}'")
+    return metadata
+
+
+async def _finalize_resumable_upload(upload, storage) -> submission_schema.SubmissionPublic:
+    """
+    Hash the completed file, record it as a submission version and publish it.
+    The version is saved before the file is moved into place, so a failed finalize can be retried
+    with an empty PATCH; the retry hits the unchanged-upload check instead of adding a version.
+    """
+    hasher = hashlib.sha256()
+    async for chunk in storage.iter_pending(upload.id, settings.UPLOAD_CHUNK_SIZE):
+        hasher.update(chunk)
+    content_hash = hasher.hexdigest()
+
+    key = submission_file_key(upload.assignment_id, content_hash, upload.filename)
+    assignment = await crud_assignment.get_assignment_by_id(upload.assignment_id)
+    if not assignment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assignment not found")
+    submission = await _save_submission(
+        assignment,
+        student_id=upload.student_id,
+        file_url=storage.public_url(key),
+        content_hash=content_hash,
+        notes=upload.notes
+    )
+    await storage.open_writer(upload.id, offset=upload.length).commit(key)
+    return submission
+
+
+@router.post("/uploads", response_model=submission_schema.ResumableUploadPublic, status_code=status.HTTP_201_CREATED)
+async def create_resumable_upload(
+    assignment_id: str,
+    response: Response,
+    upload_length: int = Header(..., ge=0),
+    upload_metadata: Optional[str] = Header(None),
+    current_user: user_schema.UserInDB = Depends(deps.get_current_active_user)
+):
+    """
+    Start a resumable upload of Upload-Length bytes. Optional Upload-Metadata keys: filename, notes.
+    The upload URL is returned in the Location header.
+    """
+    if upload_length == 0: # Nothing to resume, and no file to hash as a submission version
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Upload-Length must be at least 1 byte")
+    assignment = await _get_assignment_for_member(assignment_id, current_user)
+    if upload_length > settings.MAX_RESUMABLE_UPLOAD_SIZE:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"File exceeds the {settings.MAX_RESUMABLE_UPLOAD_SIZE} byte upload limit"
+        )
+
+    metadata = _parse_upload_metadata(upload_metadata)
+    upload = await crud_upload.create_upload(
+        assignment_id=assignment.id,
+        team_id=assignment.team_id,
+        student_id=current_user.id,
+        length=upload_length,
+        filename=metadata.get("filename"),
+        notes=metadata.get("notes")
+    )
+    response.headers["Location"] = f"/api/assignments/{assignment_id}/submissions/uploads/{upload.id}"
+    response.headers["Tus-Resumable"] = TUS_VERSION
+    return upload
+
+
+@router.head("/uploads/{upload_id}", status_code=status.HTTP_200_OK, response_class=Response)
+async def get_resumable_upload_offset(
+    assignment_id: str,
+    upload_id: str,
+    current_user: user_schema.UserInDB = Depends(deps.get_current_active_user)
+):
+    """ Report how many bytes have been received, i.e. the Upload-Offset to resume from. """
+    upload = await crud_upload.get_upload(upload_id, current_user.id)
+    if not upload or upload.assignment_id != assignment_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    return Response(headers={
+        "Upload-Offset": str(upload.offset),
+        "Upload-Length": str(upload.length),
+        "Tus-Resumable": TUS_VERSION,
+        "Cache-Control": "no-store"
+    })
+
+
+@router.patch("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT, response_class=Response)
+async def append_to_resumable_upload(
+    assignment_id: str,
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(..., ge=0),
+    content_type: Optional[str] = Header(None),
+    current_user: user_schema.UserInDB = Depends(deps.get_current_active_user)
+):
+    """
+    Append the request body at Upload-Offset. Bytes received before a disconnect are kept,
+    so the client can HEAD for the new offset and continue from there.
+    """
+    if content_type != "application/offset+octet-stream":
+        raise HTTPException(status_code=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE, detail="Content-Type must be application/offset+octet-stream")
+
+    upload = await crud_upload.claim_upload(upload_id, current_user.id, upload_offset)
+    if not upload or upload.assignment_id != assignment_id:
+        current = await crud_upload.get_upload(upload_id, current_user.id)
+        if not current or current.assignment_id != assignment_id:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+        if upload: # Claimed through the wrong assignment path, hand the lease back
+            await crud_upload.release_upload(upload_id, upload.offset)
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail=f"Upload is {current.status} at offset {current.offset}, or another request is writing to it"
+        )
+
+    storage = get_storage_backend()
+    writer = storage.open_writer(upload.id, offset=upload.offset)
+    offset = upload.offset
+    lease_expires_at = upload.lease_expires_at
+    submission_version = None
+    try:
+        try:
+            async for chunk in request.stream():
+                if offset + len(chunk) > upload.length:
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="Body exceeds Upload-Length")
+                await writer.write(chunk)
+                offset += len(chunk)
+                # Renew the lease halfway through so slow clients keep ownership of the upload
+                if lease_expires_at - datetime.now(timezone.utc) < timedelta(seconds=settings.UPLOAD_LEASE_SECONDS / 2):
+                    lease_expires_at = await crud_upload.renew_lease(upload.id, lease_expires_at)
+                    if not lease_expires_at:
+                        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Upload lease lost")
+        finally:
+            await writer.close() # Flush so the recorded offset never runs ahead of stored bytes
+
+        if offset == upload.length:
+            submission = await _finalize_resumable_upload(upload, storage)
+            submission_version = submission.current_version
+    finally:
+        await crud_upload.release_upload(upload.id, offset, submission_version)
+
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers={"Upload-Offset": str(offset), "Tus-Resumable": TUS_VERSION})
+
+
+@router.delete("/uploads/{upload_id}", status_code=status.HTTP_204_NO_CONTENT, response_class=Response)
+async def delete_resumable_upload(
+    assignment_id: str,
+    upload_id: str,
+    current_user: user_schema.UserInDB = Depends(deps.get_current_active_user)
+):
+    """ Abandon an upload and delete its partial file. """
+    upload = await crud_upload.get_upload(upload_id, current_user.id)
+    if not upload or upload.assignment_id != assignment_id:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Upload not found")
+    await get_storage_backend().discard_pending(upload.id)
+    await crud_upload.delete_upload(upload.id)
+    return Response(status_code=status.HTTP_204_NO_CONTENT, headers={"Tus-Resumable": TUS_VERSION})
+
+
+@router.get("/duplicates", response_model=List[submission_schema.DuplicateSubmissionGroup])
+async def get_duplicate_submissions(
+    assignment_id: str,
+    current_user: user_schema.UserInDB = Depends(deps.get_current_active_user)
+):
+    """
+    List groups of students who submitted identical files (matching content_hash) for this assignment.
+    Requires current user to be the team admin.
+    """
+    assignment = await crud_assignment.get_assignment_by_id(assignment_id)
+    if not assignment:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Assignment not found")
+    team = await crud_team.get_team_by_id(assignment.team_id)
+    if not team or current_user.id != team.admin_id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized to view duplicates")
+
+    return await crud_submission.find_duplicate_submissions(assignment_id)
+
+
 @router.get("/{student_id}", response_model=submission_schema.SubmissionPublic)
 async def get_student_submission_for_assignment(
     assignment_id: str,
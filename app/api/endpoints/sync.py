@@ -1,11 +1,17 @@
 from fastapi import APIRouter, Depends, HTTPException, status, Request, Body, Query
+from fastapi.responses import StreamingResponse
 from typing import List, Dict, Any, Optional
+import logging
 
 from app.schemas import user as user_schema # For dependency
 from app.schemas import sync as sync_schema
 from app.schemas import submission as submission_schema # Import submission schema
-from app.crud import crud_submission # Add other CRUD modules if syncing other doc types
+from app.crud import crud_checkpoint, crud_submission, crud_team # Add other CRUD modules if syncing other doc types
 from app.api import deps
+from app.core.config import settings
+from app.core.log import log_event
+from app.services import attachments as attachment_service
+from app.services.storage import get_storage_backend
 
 router = APIRouter()
 
@@ -13,7 +19,11 @@ router = APIRouter()
 # focusing on _bulk_docs with LWW. Real implementation is far more complex.
 # Assumes PouchDB points to /api/sync/{db_name}/... where db_name might be user-specific
 
-@router.post("/{db_name}/_bulk_docs", response_model=List[sync_schema.BulkDocsResponseItem])
+@router.post(
+    "/{db_name}/_bulk_docs",
+    response_model=List[sync_schema.BulkDocsResponseItem],
+    response_model_exclude_none=True # CouchDB shape: {"ok", "id", "rev"} or {"id", "error", "reason"}
+)
 async def handle_bulk_docs(
     db_name: str, # Use db_name for potential multi-tenancy/filtering if needed
     payload: sync_schema.BulkDocsRequest,
@@ -22,6 +32,7 @@ async def handle_bulk_docs(
     """
     Handles bulk document writes from PouchDB.
     Implements simplified LWW based on 'last_updated_at'.
+    With new_edits=false, supplied revisions are stored verbatim and only failures are returned.
     Needs Authentication. Needs to handle different doc types.
     """
     # TODO: Add authentication check (current_user dependency)
@@ -37,7 +48,12 @@ async def handle_bulk_docs(
         # Attempt to parse as known types, fallback to basic PouchDocument
         try:
             # Use discriminated unions in Pydantic v2 for better type handling based on 'doc_type'
-             if doc_dict.get("doc_type") == "submission":
+             if doc_dict.get("_deleted") and (doc_dict.get("doc_type") == "submission"
+                                              or crud_submission.split_submission_doc_id(str(doc_dict.get("_id")))[0]):
+                 # Deletions are bare {_id, _rev, _deleted} docs: stored as tombstones
+                 parsed_docs.append(sync_schema.PouchDocument.model_validate(doc_dict))
+                 submission_docs.append(doc_dict)
+             elif doc_dict.get("doc_type") == "submission":
                  parsed_docs.append(submission_schema.SubmissionInDB.model_validate(doc_dict))
                  submission_docs.append(doc_dict) # Keep raw dict for CRUD for now
              else:
@@ -46,14 +62,18 @@ async def handle_bulk_docs(
                  other_docs.append(doc_dict) # Keep raw dict
         except Exception as e:
             # Handle validation errors for individual docs
-             print(f"Failed to validate doc {doc_dict.get('_id')}: {e}")
+             log_event("sync.doc_invalid", logging.WARNING, doc_id=doc_dict.get("_id"), error=str(e))
              # Decide how to report this error in the response
              # For now, crud function will handle errors internally
 
     # Process submission documents (add logic for other types)
     submission_results = []
     if submission_docs:
-        submission_results = await crud_submission.save_bulk_docs(submission_docs)
+        if payload.new_edits:
+            submission_results = await crud_submission.save_bulk_docs(submission_docs)
+        else:
+            # Replication mode: store supplied revisions verbatim (bulk import / seeding)
+            submission_results = await crud_submission.save_replicated_docs(submission_docs)
 
     # Combine results (add results for other_docs if processed)
     # Ensure the response format matches BulkDocsResponseItem schema
@@ -72,9 +92,8 @@ async def handle_revs_diff(
     # current_user: user_schema.UserInDB = Depends(deps.get_current_active_user) # Auth needed!
 ):
     """
-    Checks which revisions the server is missing for given documents.
-    Simplified: Assumes only latest revision exists on server for LWW.
-    Real CouchDB checks revision history.
+    Checks which revisions the server is missing for given documents: those that are neither the
+    current revision nor in its stored _revisions history.
     """
     # TODO: Add authentication and authorization for db_name
 
@@ -83,7 +102,7 @@ async def handle_revs_diff(
     for doc_id, incoming_revs in payload.items():
         # Fetch current revision(s) from DB for this doc_id
         # Currently only supports submissions, extend as needed
-        server_revs = await crud_submission.get_doc_revisions(doc_id) # Simplified
+        server_revs = await crud_submission.get_doc_revisions(doc_id)
 
         missing_revs = [rev for rev in incoming_revs if rev not in server_revs]
 
@@ -113,24 +132,173 @@ async def handle_changes_feed(
     raise HTTPException(status_code=501, detail="_changes feed not implemented")
 
 
+# --- _local documents (replication checkpoints, never replicated) ---
+# Declared before /{db_name}/{doc_id}; PouchDB reads its checkpoint when a replication starts and
+# resumes from the stored sequence instead of re-diffing everything from zero.
+
+@router.get("/{db_name}/_local/{local_id}")
+async def get_local_document(
+    db_name: str,
+    local_id: str,
+    # current_user: user_schema.UserInDB = Depends(deps.get_current_active_user) # Auth needed!
+):
+    """
+    Fetch a replication checkpoint. 404 tells PouchDB to replicate from the start.
+    """
+    doc = await crud_checkpoint.get_local_doc(db_name, local_id)
+    if not doc:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return doc
+
+
+@router.put("/{db_name}/_local/{local_id}", status_code=status.HTTP_201_CREATED)
+async def put_local_document(
+    db_name: str,
+    local_id: str,
+    doc: Dict[str, Any] = Body(...),
+    # current_user: user_schema.UserInDB = Depends(deps.get_current_active_user) # Auth needed!
+):
+    """
+    Create or update a replication checkpoint. The body's _rev must match the stored revision.
+    """
+    rev = await crud_checkpoint.put_local_doc(db_name, local_id, doc)
+    if rev is None:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Document update conflict")
+    return {"ok": True, "id": f"_local/{local_id}", "rev": rev}
+
+
+@router.delete("/{db_name}/_local/{local_id}")
+async def delete_local_document(
+    db_name: str,
+    local_id: str,
+    rev: str = Query(...),
+    # current_user: user_schema.UserInDB = Depends(deps.get_current_active_user) # Auth needed!
+):
+    """
+    Delete a replication checkpoint at revision 'rev'.
+    """
+    if not await crud_checkpoint.delete_local_doc(db_name, local_id, rev):
+        if await crud_checkpoint.get_local_doc(db_name, local_id):
+            raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Document update conflict")
+        raise HTTPException(status_code=404, detail="Document not found")
+    return {"ok": True, "id": f"_local/{local_id}", "rev": "0-0"}
+
+
 @router.get("/{db_name}/{doc_id}")
 async def get_document(
     db_name: str,
     doc_id: str,
     rev: Optional[str] = Query(None), # Optional specific revision
+    attachments: bool = Query(False), # Inline attachment data instead of stubs
+    atts_since: Optional[str] = Query(None), # JSON list of revs the client has; implies attachments
     # current_user: user_schema.UserInDB = Depends(deps.get_current_active_user) # Auth needed!
 ):
     """
     (Stub) Fetch a specific document, potentially a specific revision.
-    PouchDB uses this during replication.
+    PouchDB uses this during replication. Attachments are returned as stubs unless requested; with
+    atts_since, only attachments changed after the client's revisions carry their data.
+    Deleted docs are only returned when their tombstone's rev is asked for.
     """
      # TODO: Implement document fetching, potentially specific revisions if stored
+    try:
+        since_generation = attachment_service.parse_atts_since(atts_since)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="atts_since must be a JSON array of revisions")
     submission = await crud_submission.get_submission_by_doc_id(doc_id)
     if submission:
         # Need to return as raw dict with _id, _rev etc.
-        return submission.model_dump(by_alias=True)
+        doc = submission.model_dump(by_alias=True)
+        if submission.attachments:
+            doc["_attachments"] = await attachment_service.render_attachments(
+                submission.attachments, get_storage_backend(),
+                include_data=attachments or since_generation is not None,
+                since_generation=since_generation or 0
+            )
+        return doc
+    tombstone = await crud_submission.get_sync_doc(doc_id)
+    if tombstone and tombstone.get("_deleted"):
+        # Like CouchDB: a deleted doc is "not found", unless its deletion revision is asked for
+        if rev == tombstone["_rev"]:
+            return {"_id": doc_id, "_rev": tombstone["_rev"], "_deleted": True}
+        raise HTTPException(status_code=404, detail="deleted")
     raise HTTPException(status_code=404, detail="Document not found")
 
 
+# --- Attachments (raw bytes, streamed to and from the storage backend) ---
+
+async def _get_submission_for_student_or_admin(doc_id: str, current_user: user_schema.UserInDB):
+    """ The submission behind an attachment route: only its student and their team's admin may use it. """
+    submission = await crud_submission.get_submission_by_doc_id(doc_id)
+    if not submission:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if submission.student_id != current_user.id:
+        team = await crud_team.get_team_by_id(submission.team_id)
+        if not team or team.admin_id != current_user.id:
+            raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    return submission
+
+
+@router.get("/{db_name}/{doc_id}/{attachment_name}")
+async def get_attachment(
+    db_name: str,
+    doc_id: str,
+    attachment_name: str,
+    current_user: user_schema.UserInDB = Depends(deps.get_current_active_user)
+):
+    """
+    Stream an attachment's bytes, always as a download: its content_type is the client's, so it
+    must never be rendered (or sniffed) as a page on the API origin.
+    """
+    submission = await _get_submission_for_student_or_admin(doc_id, current_user)
+    attachment = (submission.attachments or {}).get(attachment_name)
+    if not attachment:
+        raise HTTPException(status_code=404, detail="Attachment not found")
+    chunks = get_storage_backend().iter_object(attachment["storage_key"], settings.UPLOAD_CHUNK_SIZE)
+    try:
+        first_chunk = await anext(chunks, b"") # Fail with a 404 before the response starts
+    except FileNotFoundError:
+        raise HTTPException(status_code=404, detail="Attachment data not found")
+
+    async def stream():
+        yield first_chunk
+        async for chunk in chunks:
+            yield chunk
+
+    return StreamingResponse(
+        stream(),
+        media_type=attachment.get("content_type", "application/octet-stream"),
+        headers={
+            "Content-Length": str(attachment["length"]), "ETag": f'"{attachment["digest"]}"',
+            "Content-Disposition": "attachment", "X-Content-Type-Options": "nosniff",
+        }
+    )
+
+
+@router.put("/{db_name}/{doc_id}/{attachment_name}", status_code=status.HTTP_201_CREATED)
+async def put_attachment(
+    db_name: str,
+    doc_id: str,
+    attachment_name: str,
+    request: Request,
+    rev: str = Query(...), # Current revision of the document
+    current_user: user_schema.UserInDB = Depends(deps.get_current_active_user)
+):
+    """
+    Add or replace an attachment from the raw request body, creating a new document revision.
+    """
+    submission = await _get_submission_for_student_or_admin(doc_id, current_user)
+    if submission.rev != rev: # Checked before the upload too, to not store bytes for a stale rev
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Document update conflict")
+    try:
+        stored = await attachment_service.write_attachment(request.stream(), get_storage_backend())
+    except attachment_service.AttachmentTooLargeError as e:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=str(e))
+    stub = {"content_type": request.headers.get("content-type", "application/octet-stream"), **stored}
+    updated = await crud_submission.put_attachment_stub(doc_id, rev, attachment_name, stub)
+    if not updated:
+        raise HTTPException(status_code=status.HTTP_409_CONFLICT, detail="Document update conflict")
+    return {"ok": True, "id": doc_id, "rev": updated["_rev"]}
+
+
 # Add other endpoints PouchDB might call: PUT /{db_name}/{doc_id}, DELETE /{db_name}/{doc_id}, etc.
 # if PouchDB is configured to use them directly (less common with replication protocol).
\ No newline at end of file
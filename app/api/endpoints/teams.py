@@ -1,10 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+import csv
+
+from fastapi import APIRouter, BackgroundTasks, Depends, File, HTTPException, Response, UploadFile, status
 from typing import List
 
 from app.schemas import team as team_schema
 from app.schemas import user as user_schema # For response model
-from app.crud import crud_team, crud_user
+from app.crud import crud_enrollment, crud_membership, crud_team, crud_user
 from app.api import deps
+from app.core import cache
+from app.core.config import settings
+from app.db.database import get_user_collection
+from app.services import enrollment
 
 router = APIRouter()
 
@@ -18,9 +24,7 @@ async def create_team(
     """
     team_create_data = team_schema.TeamCreate(**team_in.model_dump(), admin_id=current_user.id)
     team = await crud_team.create_team(team_in=team_create_data)
-    # Calculate member count for public response
-    member_count = len(team.member_ids)
-    return team_schema.TeamPublic(**team.model_dump(), member_count=member_count)
+    return team_schema.TeamPublic(**team.model_dump())
 
 
 @router.get("", response_model=List[team_schema.TeamPublic])
@@ -31,11 +35,7 @@ async def get_user_teams(
     Get all teams the current user is a member or admin of.
     """
     teams_db = await crud_team.get_teams_for_user(user_id=current_user.id)
-    teams_public = []
-    for team in teams_db:
-        member_count = len(team.member_ids)
-        teams_public.append(team_schema.TeamPublic(**team.model_dump(), member_count=member_count))
-    return teams_public
+    return [team_schema.TeamPublic(**team.model_dump()) for team in teams_db]
 
 
 @router.post("/join", response_model=team_schema.TeamPublic)
@@ -46,35 +46,18 @@ async def join_team(
     """
     Join a team using its unique join code.
     """
-    team = await crud_team.get_team_by_join_code(code=join_data.join_code)
+    team, joined = await crud_team.join_team_by_code(code=join_data.join_code, user_id=current_user.id)
     if not team:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Team with this join code not found",
         )
-
-    if current_user.id in team.member_ids:
-         raise HTTPException(
-             status_code=status.HTTP_400_BAD_REQUEST,
-             detail="User is already a member of this team",
-         )
-
-    success = await crud_team.add_member_to_team(team_id=team.id, user_id=current_user.id)
-    if not success:
-        # Should not happen if checks above pass, but handle potential DB error
-         raise HTTPException(
-             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-             detail="Failed to add user to the team",
-         )
-
-    # Return the joined team's public info
-    # Refetch team to get updated member count, or calculate
-    updated_team = await crud_team.get_team_by_id(team.id)
-    if not updated_team: # Should exist
-        raise HTTPException(status_code=500, detail="Failed to retrieve team after joining")
-
-    member_count = len(updated_team.member_ids)
-    return team_schema.TeamPublic(**updated_team.model_dump(), member_count=member_count)
+    if not joined:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="User is already a member of this team",
+        )
+    return team
 
 
 @router.get("/{team_id}", response_model=team_schema.TeamWithMembers)
@@ -86,26 +69,109 @@ async def get_team_details(
     Get details of a specific team, including its members (public info).
     Requires user to be a member of the team.
     """
-    team = await crud_team.get_team_by_id(team_id)
-    if not team: # Should be caught by dependency, but double check
-        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Team not found")
-
-    # Fetch member details (public info only)
-    member_details = []
-    if team.member_ids:
-        member_cursor = crud_user.user_collection.find(
-            {"_id": {"$in": team.member_ids}},
-            # Projection to fetch only fields needed for UserPublic
-            {"_id": 1, "email": 1, "full_name": 1, "is_active": 1, "created_at": 1, "updated_at": 1}
+    async def build():
+        team = await crud_team.get_team_by_id(team_id)
+        if not team: # Should be caught by dependency, but double check
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Team not found")
+
+        # Fetch member details (public info only)
+        member_details = []
+        member_ids = await crud_membership.get_member_ids(team_id)
+        if member_ids:
+            member_cursor = get_user_collection().find(
+                {"_id": {"$in": member_ids}},
+                # Projection to fetch only fields needed for UserPublic
+                {"_id": 1, "email": 1, "full_name": 1, "is_active": 1, "created_at": 1, "updated_at": 1}
+            )
+            members_db = await member_cursor.to_list(length=None)
+            member_details = [user_schema.UserPublic.model_validate(m) for m in members_db]
+
+        return team_schema.TeamWithMembers(
+            **team.model_dump(),
+            members=member_details
+        )
+
+    return await cache.cached_json("team_details", team_id, "details", build, team_schema.TeamWithMembers)
+
+
+async def _start_enrollment(
+    team_id: str,
+    emails: List[str],
+    current_user: user_schema.UserInDB,
+    background_tasks: BackgroundTasks,
+    response: Response
+) -> team_schema.EnrollmentJob:
+    if len(emails) > settings.ENROLL_MAX_ROWS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"At most {settings.ENROLL_MAX_ROWS} emails can be enrolled at once"
         )
-        members_db = await member_cursor.to_list(length=None)
-        member_details = [user_schema.UserPublic.model_validate(m) for m in members_db]
-
-    member_count = len(team.member_ids)
-    return team_schema.TeamWithMembers(
-        **team.model_dump(),
-        member_count=member_count,
-        members=member_details
-    )
+    job = team_schema.EnrollmentJob(team_id=team_id, requested_by=current_user.id, total=len(emails))
+
+    if len(emails) <= settings.ENROLL_SYNC_MAX_ROWS:
+        return await enrollment.run_enrollment(job, emails)
+
+    # Large list: run after the response and let the client poll the job
+    await crud_enrollment.create_job(job)
+    background_tasks.add_task(enrollment.run_enrollment, job, emails, persist=True)
+    response.status_code = status.HTTP_202_ACCEPTED
+    response.headers["Location"] = f"/api/teams/{team_id}/enroll/jobs/{job.id}"
+    return job
+
+
+@router.post("/{team_id}/enroll", response_model=team_schema.EnrollmentJob)
+async def enroll_members(
+    team_id: str,
+    enroll_in: team_schema.TeamEnrollRequest,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    current_user: user_schema.UserInDB = Depends(deps.get_team_admin)
+):
+    """
+    Enroll existing users into the team by email, with a result per row.
+    Lists above ENROLL_SYNC_MAX_ROWS return 202 with a job to poll at the Location header.
+    Requires user to be the team admin.
+    """
+    return await _start_enrollment(team_id, enroll_in.emails, current_user, background_tasks, response)
+
+
+@router.post("/{team_id}/enroll/csv", response_model=team_schema.EnrollmentJob)
+async def enroll_members_csv(
+    team_id: str,
+    background_tasks: BackgroundTasks,
+    response: Response,
+    file: UploadFile = File(...),
+    current_user: user_schema.UserInDB = Depends(deps.get_team_admin)
+):
+    """
+    Same as /enroll, taking a CSV file with an "email" column (or emails in the first column).
+    Requires user to be the team admin.
+    """
+    content = await file.read(settings.MAX_UPLOAD_SIZE + 1)
+    if len(content) > settings.MAX_UPLOAD_SIZE:
+        raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail="CSV file too large")
+    try:
+        emails = enrollment.parse_email_csv(content.decode("utf-8-sig"))
+    except (UnicodeDecodeError, csv.Error) as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Invalid CSV file: {e}")
+    if not emails:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="No emails found in CSV file")
+    return await _start_enrollment(team_id, emails, current_user, background_tasks, response)
+
+
+@router.get("/{team_id}/enroll/jobs/{job_id}", response_model=team_schema.EnrollmentJob)
+async def get_enrollment_job(
+    team_id: str,
+    job_id: str,
+    current_user: user_schema.UserInDB = Depends(deps.get_team_admin)
+):
+    """
+    Poll a background enrollment job: status, processed/total and the row results so far.
+    Requires user to be the team admin.
+    """
+    job = await crud_enrollment.get_job(team_id, job_id)
+    if not job:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Enrollment job not found")
+    return job
 
 # Add endpoints for updating team (admin only), removing members (admin only), generating new join code etc.
\ No newline at end of file
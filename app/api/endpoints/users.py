@@ -1,8 +1,10 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Query
+from typing import List
 
+from app.schemas import assignment as assignment_schema
 from app.schemas import user as user_schema
 from app.api import deps
-from app.crud import crud_user
+from app.crud import crud_assignment, crud_user
 
 router = APIRouter()
 
@@ -14,4 +16,20 @@ async def read_users_me(current_user: user_schema.UserInDB = Depends(deps.get_cu
     # Convert UserInDB to UserPublic before returning
     return user_schema.UserPublic.model_validate(current_user)
 
+
+@router.get("/me/feed", response_model=List[assignment_schema.AssignmentFeedItem])
+async def read_my_feed(
+    skip: int = Query(0, ge=0),
+    limit: int = Query(20, ge=1, le=100),
+    include_past: bool = False,
+    current_user: user_schema.UserInDB = Depends(deps.get_current_active_user)
+):
+    """
+    Home feed: assignments from all of the current user's teams, soonest due first,
+    each with the user's own submission status. Past-due assignments only with include_past.
+    """
+    return await crud_assignment.get_feed_for_student(
+        user_id=current_user.id, skip=skip, limit=limit, include_past=include_past
+    )
+
 # Add endpoint to update user details if needed, e.g., PUT /me
\ No newline at end of file
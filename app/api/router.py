@@ -1,6 +1,9 @@
-from fastapi import APIRouter
+from fastapi import APIRouter, Depends, Request, status
+from fastapi.responses import JSONResponse, PlainTextResponse
 
-from app.api.endpoints import auth, users, teams, assignments, submissions, sync
+from app.api import deps
+from app.api.endpoints import auth, users, teams, assignments, submissions, sync, events, debug
+from app.core import admission, cache, metrics
 
 api_router = APIRouter()
 
@@ -13,8 +16,34 @@ api_router.include_router(assignments.router, prefix="/teams/{team_id}/assignmen
 api_router.include_router(submissions.router, prefix="/assignments/{assignment_id}/submissions", tags=["Submissions"])
 # Sync endpoint (adjust prefix as needed)
 api_router.include_router(sync.router, prefix="/sync", tags=["Synchronization"])
+# Live updates (server-sent events)
+api_router.include_router(events.router, prefix="/events", tags=["Live Updates"])
+# Admin-only diagnostics
+api_router.include_router(debug.router, prefix="/debug", tags=["Debug"])
 
 # Simple health check endpoint
 @api_router.get("/health", tags=["Health"])
 async def health_check():
-    return {"status": "ok"}
\ No newline at end of file
+    return {"status": "ok"}
+
+# Readiness: true once the lifespan has pinged MongoDB, warmed the pool and checked indexes
+@api_router.get("/health/ready", tags=["Health"])
+async def readiness_check(request: Request):
+    if not getattr(request.app.state, "ready", False):
+        return JSONResponse({"status": "starting"}, status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status": "ready"}
+
+# Admission control: in-flight requests and shed counts per limited route
+@api_router.get("/health/admission", tags=["Health"], dependencies=[Depends(deps.require_metrics_access)])
+async def admission_stats():
+    return admission.get_stats()
+
+# Response cache: hits, misses and hit ratio per cached endpoint
+@api_router.get("/health/cache", tags=["Health"], dependencies=[Depends(deps.require_metrics_access)])
+async def cache_stats():
+    return cache.get_stats()
+
+# Prometheus exposition: route latency, Mongo command/pool timings, sync outcomes, shed requests
+@api_router.get("/metrics", tags=["Health"], response_class=PlainTextResponse, dependencies=[Depends(deps.require_metrics_access)])
+async def metrics_exposition():
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
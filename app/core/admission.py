@@ -0,0 +1,276 @@
+import asyncio
+import logging
+import math
+import re
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta, timezone
+from typing import Dict, Optional, Tuple
+
+from fastapi import status
+from fastapi.responses import JSONResponse
+from pymongo import ReturnDocument
+from pymongo.errors import PyMongoError
+
+from app.core import metrics, security
+from app.core.config import settings
+from app.core.log import log_event
+from app.db.database import get_rate_limit_collection
+
+
+@dataclass
+class RouteLimit:
+    """Admission rule for one expensive route."""
+    name: str
+    method: str
+    path_pattern: str
+    max_concurrency: int
+    rate_per_minute: int
+    burst: int
+    in_flight: int = field(default=0, init=False)
+    _path_re: re.Pattern = field(init=False, repr=False)
+    _semaphore: asyncio.Semaphore = field(init=False, repr=False)
+
+    def __post_init__(self):
+        self._path_re = re.compile(self.path_pattern)
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+
+    @property
+    def refill_per_second(self) -> float:
+        return self.rate_per_minute / 60.0
+
+    def matches(self, method: str, path: str) -> bool:
+        return method == self.method and self._path_re.match(path) is not None
+
+
+def default_route_limits() -> list[RouteLimit]:
+    return [
+        RouteLimit(
+            name="bulk_docs", method="POST", path_pattern=r"^/api/sync/[^/]+/_bulk_docs$",
+            max_concurrency=settings.BULK_DOCS_MAX_CONCURRENCY,
+            rate_per_minute=settings.BULK_DOCS_RATE_PER_MINUTE,
+            burst=settings.BULK_DOCS_BURST,
+        ),
+        RouteLimit(
+            name="auth", method="POST", path_pattern=r"^/api/auth/(login|register)$",
+            max_concurrency=settings.AUTH_MAX_CONCURRENCY,
+            rate_per_minute=settings.AUTH_RATE_PER_MINUTE,
+            burst=settings.AUTH_BURST,
+        ),
+        RouteLimit(
+            name="submissions", method="POST", path_pattern=r"^/api/assignments/[^/]+/submissions$",
+            max_concurrency=settings.SUBMISSION_MAX_CONCURRENCY,
+            rate_per_minute=settings.SUBMISSION_RATE_PER_MINUTE,
+            burst=settings.SUBMISSION_BURST,
+        ),
+        RouteLimit(
+            name="file_upload", method="POST", path_pattern=r"^/api/assignments/[^/]+/submissions/upload$",
+            max_concurrency=settings.FILE_UPLOAD_MAX_CONCURRENCY,
+            rate_per_minute=settings.FILE_UPLOAD_RATE_PER_MINUTE,
+            burst=settings.FILE_UPLOAD_BURST,
+        ),
+        RouteLimit(
+            name="resumable_upload", method="PATCH", path_pattern=r"^/api/assignments/[^/]+/submissions/uploads/[^/]+$",
+            max_concurrency=settings.RESUMABLE_UPLOAD_MAX_CONCURRENCY,
+            rate_per_minute=settings.RESUMABLE_UPLOAD_RATE_PER_MINUTE,
+            burst=settings.RESUMABLE_UPLOAD_BURST,
+        ),
+    ]
+
+_route_limits: Optional[list[RouteLimit]] = None
+
+def get_route_limits() -> list[RouteLimit]:
+    """ Route limits from settings, built on first use (the middleware stack is built on the first request). """
+    global _route_limits
+    if _route_limits is None:
+        _route_limits = default_route_limits()
+    return _route_limits
+
+
+# --- Token bucket backends ---
+
+class MemoryTokenBucketBackend:
+    """
+    Token buckets held in this worker's memory. Limits are per worker process.
+    Buckets that have refilled completely are pruned every prune_interval seconds; past max_keys the
+    least recently used buckets are evicted as well, so memory stays bounded whatever the traffic.
+    """
+    max_keys = 10_000
+    prune_interval = 60.0
+
+    def __init__(self):
+        # key -> (tokens, last refill timestamp, refill per second, capacity), least recently used first
+        self._buckets: Dict[str, Tuple[float, float, float, int]] = {}
+        self._next_prune = time.monotonic() + self.prune_interval
+
+    async def consume(self, key: str, refill_per_second: float, capacity: int) -> Tuple[bool, float]:
+        now = time.monotonic()
+        tokens, last, _, _ = self._buckets.pop(key, (float(capacity), now, refill_per_second, capacity))
+        tokens = min(float(capacity), tokens + (now - last) * refill_per_second)
+        allowed = tokens >= 1
+        self._buckets[key] = (tokens - 1 if allowed else tokens, now, refill_per_second, capacity)
+        if now >= self._next_prune or len(self._buckets) > self.max_keys:
+            self._prune(now)
+        if allowed:
+            return True, 0.0
+        return False, (1 - tokens) / refill_per_second
+
+    def _prune(self, now: float):
+        # Buckets that have refilled completely carry no state worth keeping; each is checked
+        # against its own route's rate and capacity
+        for key, (tokens, last, refill_per_second, capacity) in list(self._buckets.items()):
+            if tokens + (now - last) * refill_per_second >= capacity:
+                del self._buckets[key]
+        # Still too many active callers: drop the least recently used (they start again with a full
+        # bucket), down to 90% of max_keys so the next new caller doesn't prune again
+        for key in list(self._buckets)[:max(0, len(self._buckets) - self.max_keys * 9 // 10)]:
+            del self._buckets[key]
+        self._next_prune = now + self.prune_interval
+
+
+class MongoTokenBucketBackend:
+    """
+    Token buckets shared by all workers, stored in the 'rate_limits' collection.
+    Refill and consume happen in a single atomic pipeline update per request.
+    """
+
+    async def consume(self, key: str, refill_per_second: float, capacity: int) -> Tuple[bool, float]:
+        now = time.time()
+        idle_expiry = datetime.now(timezone.utc) + timedelta(seconds=capacity / refill_per_second)
+        try:
+            bucket = await get_rate_limit_collection().find_one_and_update(
+                {"_id": key},
+                [
+                    {"$set": {"tokens": {"$min": [
+                        capacity,
+                        {"$add": [
+                            {"$ifNull": ["$tokens", capacity]},
+                            {"$multiply": [{"$subtract": [now, {"$ifNull": ["$ts", now]}]}, refill_per_second]},
+                        ]},
+                    ]}}},
+                    {"$set": {"allowed": {"$gte": ["$tokens", 1]}}},
+                    {"$set": {
+                        "tokens": {"$cond": ["$allowed", {"$subtract": ["$tokens", 1]}, "$tokens"]},
+                        "ts": now,
+                        "expires_at": idle_expiry,
+                    }},
+                ],
+                upsert=True,
+                return_document=ReturnDocument.AFTER,
+            )
+        except PyMongoError as e:
+            # Fail open: a rate limiter outage must not take the API down with it
+            log_event("admission.backend_unavailable", logging.WARNING, error=str(e))
+            return True, 0.0
+        if bucket["allowed"]:
+            return True, 0.0
+        return False, (1 - bucket["tokens"]) / refill_per_second
+
+
+def get_token_bucket_backend():
+    if settings.RATE_LIMIT_BACKEND == "mongo":
+        return MongoTokenBucketBackend()
+    return MemoryTokenBucketBackend()
+
+
+# --- Shed counters (exported at /api/metrics) ---
+
+def get_stats() -> dict:
+    return {
+        "routes": {
+            limit.name: {
+                "max_concurrency": limit.max_concurrency,
+                "in_flight": limit.in_flight,
+                "shed_rate_limited": metrics.admission_shed_total.get(route=limit.name, status=status.HTTP_429_TOO_MANY_REQUESTS),
+                "shed_overloaded": metrics.admission_shed_total.get(route=limit.name, status=status.HTTP_503_SERVICE_UNAVAILABLE),
+            }
+            for limit in get_route_limits()
+        }
+    }
+
+
+def client_ip(scope) -> str:
+    """
+    The caller's IP. Behind TRUSTED_PROXY_COUNT reverse proxies it is the X-Forwarded-For entry added
+    by the outermost one: entries further left are set by the client and can't be trusted.
+    """
+    if settings.TRUSTED_PROXY_COUNT > 0:
+        forwarded = [
+            address.strip()
+            for name, value in scope.get("headers", []) if name == b"x-forwarded-for"
+            for address in value.decode("latin-1").split(",")
+        ]
+        if len(forwarded) >= settings.TRUSTED_PROXY_COUNT:
+            return forwarded[-settings.TRUSTED_PROXY_COUNT]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+def client_key(scope) -> str:
+    """ Identify the caller: the authenticated user if a bearer token is present, else the client IP. """
+    for name, value in scope.get("headers", []):
+        if name == b"authorization":
+            scheme, _, token = value.decode("latin-1").partition(" ")
+            if scheme.lower() == "bearer" and token:
+                token_data = security.decode_access_token(token)
+                if token_data and token_data.user_id:
+                    return f"user:{token_data.user_id}"
+            break
+    return f"ip:{client_ip(scope)}"
+
+
+class AdmissionControlMiddleware:
+    """
+    ASGI middleware that sheds load in front of expensive routes.
+    - Per-user token bucket exceeded -> 429 with Retry-After
+    - No concurrency slot free within ADMISSION_QUEUE_TIMEOUT_SECONDS -> 503 with Retry-After
+    Requests to routes without a RouteLimit pass straight through.
+    """
+
+    def __init__(self, app, limits: Optional[list[RouteLimit]] = None, backend=None):
+        self.app = app
+        self.limits = limits if limits is not None else get_route_limits()
+        self.backend = backend or get_token_bucket_backend()
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.ADMISSION_CONTROL_ENABLED:
+            await self.app(scope, receive, send)
+            return
+
+        limit = next((l for l in self.limits if l.matches(scope["method"], scope["path"])), None)
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        if limit.rate_per_minute > 0: # 0 disables the per-user bucket for this route
+            allowed, retry_after = await self.backend.consume(
+                f"{limit.name}:{client_key(scope)}", limit.refill_per_second, limit.burst
+            )
+            if not allowed:
+                await self._shed(limit, status.HTTP_429_TOO_MANY_REQUESTS, "Too many requests", retry_after, scope, receive, send)
+                return
+
+        try:
+            await asyncio.wait_for(limit._semaphore.acquire(), timeout=settings.ADMISSION_QUEUE_TIMEOUT_SECONDS)
+        except asyncio.TimeoutError:
+            await self._shed(
+                limit, status.HTTP_503_SERVICE_UNAVAILABLE, "Server is busy, please retry",
+                settings.ADMISSION_QUEUE_TIMEOUT_SECONDS, scope, receive, send
+            )
+            return
+        limit.in_flight += 1
+        metrics.admission_in_flight.inc(route=limit.name)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            limit.in_flight -= 1
+            metrics.admission_in_flight.dec(route=limit.name)
+            limit._semaphore.release()
+
+    async def _shed(self, limit: RouteLimit, status_code: int, detail: str, retry_after: float, scope, receive, send):
+        metrics.admission_shed_total.inc(route=limit.name, status=status_code)
+        response = JSONResponse(
+            {"detail": detail},
+            status_code=status_code,
+            headers={"Retry-After": str(max(1, math.ceil(retry_after)))},
+        )
+        await response(scope, receive, send)
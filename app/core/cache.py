@@ -0,0 +1,201 @@
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from fastapi import Response
+from pydantic import TypeAdapter
+from pymongo.errors import PyMongoError
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.log import log_event
+from app.db.database import get_response_cache_collection
+
+# Read-through cache of serialized responses for team-scoped reads (assignments, team details).
+# Every key embeds the team's generation counter; writes that change what those endpoints return
+# call invalidate_team(), which bumps the generation so stale entries are never read again and
+# simply age out. Authorization still runs on every request: only the response body is cached.
+
+
+# --- Backends ---
+
+class MemoryResponseCache:
+    """
+    LRU of response bodies held in this worker's memory. Generations are per worker too, so with
+    several workers a write only invalidates the worker that handled it and the other workers serve
+    the old response for up to the TTL. Only suitable for a single worker (see RESPONSE_CACHE_BACKEND).
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: int):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries: "OrderedDict[Tuple[str, int, str], Tuple[float, bytes]]" = OrderedDict() # -> (expiry, body)
+        # Generations come from one counter shared by all teams. Teams without a generation of their
+        # own (never bumped, or pruned) are at _floor, which is raised past every pruned generation
+        self._generations: Dict[str, int] = {}
+        self._clock = 0
+        self._floor = 0
+
+    async def get(self, team_id: str, key: str) -> Tuple[Optional[bytes], int]:
+        generation = self._generations.get(team_id, self._floor)
+        entry_key = (team_id, generation, key)
+        entry = self._entries.get(entry_key)
+        if entry is None:
+            return None, generation
+        if entry[0] < time.monotonic():
+            del self._entries[entry_key]
+            return None, generation
+        self._entries.move_to_end(entry_key)
+        return entry[1], generation
+
+    async def set(self, team_id: str, key: str, generation: int, body: bytes):
+        if generation != self._generations.get(team_id, self._floor): # Invalidated while the response was built
+            return
+        self._entries[(team_id, generation, key)] = (time.monotonic() + self.ttl_seconds, body)
+        self._entries.move_to_end((team_id, generation, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def bump(self, team_id: str):
+        self._clock += 1
+        self._generations[team_id] = self._clock
+        if len(self._generations) > 2 * self.max_entries:
+            self._prune_generations()
+
+    def _prune_generations(self):
+        # Generations of teams with no cached entries guard nothing; raising the floor past them keeps
+        # a response built before their last bump from being stored at the floor
+        cached_teams = {team_id for team_id, _, _ in self._entries}
+        for team_id, generation in list(self._generations.items()):
+            if team_id not in cached_teams:
+                self._floor = max(self._floor, generation)
+                del self._generations[team_id]
+
+
+class MongoResponseCache:
+    """
+    Response bodies and team generations shared by all workers, stored in the 'response_cache'
+    collection. A lookup reads the team's generation doc and the entry with one query; entries
+    are removed by a TTL index on expires_at.
+    """
+
+    def __init__(self, ttl_seconds: int):
+        self.ttl_seconds = ttl_seconds
+
+    @staticmethod
+    def _generation_id(team_id: str) -> str:
+        return f"{team_id}|generation"
+
+    async def get(self, team_id: str, key: str) -> Tuple[Optional[bytes], int]:
+        entry_id = f"{team_id}|{key}"
+        try:
+            docs = await get_response_cache_collection().find(
+                {"_id": {"$in": [self._generation_id(team_id), entry_id]}}
+            ).to_list(length=2)
+        except PyMongoError as e:
+            log_event("cache.backend_unavailable", logging.WARNING, error=str(e))
+            return None, -1 # Negative generation: the response is not stored either
+        by_id = {doc["_id"]: doc for doc in docs}
+        generation = by_id.get(self._generation_id(team_id), {}).get("generation", 0)
+        entry = by_id.get(entry_id)
+        if entry and entry.get("generation") == generation:
+            return entry["body"], generation
+        return None, generation
+
+    async def set(self, team_id: str, key: str, generation: int, body: bytes):
+        if generation < 0:
+            return
+        expires_at = datetime.now(timezone.utc) + timedelta(seconds=self.ttl_seconds)
+        try:
+            await get_response_cache_collection().replace_one(
+                {"_id": f"{team_id}|{key}"},
+                {"generation": generation, "body": body, "expires_at": expires_at},
+                upsert=True
+            )
+        except PyMongoError as e:
+            log_event("cache.store_failed", logging.WARNING, team_id=team_id, error=str(e))
+
+    async def bump(self, team_id: str):
+        # Generation docs carry no expires_at: they must outlive every entry of their team
+        await get_response_cache_collection().update_one(
+            {"_id": self._generation_id(team_id)}, {"$inc": {"generation": 1}}, upsert=True
+        )
+
+
+def get_response_cache_backend():
+    backend = settings.RESPONSE_CACHE_BACKEND
+    if backend == "auto": # Per-worker generations would leave the other workers serving stale responses
+        backend = "mongo" if settings.WEB_CONCURRENCY > 1 else "memory"
+    if backend == "mongo":
+        return MongoResponseCache(settings.RESPONSE_CACHE_TTL_SECONDS)
+    return MemoryResponseCache(settings.RESPONSE_CACHE_MAX_ENTRIES, settings.RESPONSE_CACHE_TTL_SECONDS)
+
+_backend = None
+
+def get_backend():
+    global _backend
+    if _backend is None:
+        _backend = get_response_cache_backend()
+    return _backend
+
+
+# --- Read-through helper and invalidation ---
+
+_adapters: Dict[Any, TypeAdapter] = {}
+
+def _adapter(response_type: Any) -> TypeAdapter:
+    adapter = _adapters.get(response_type)
+    if adapter is None:
+        adapter = _adapters[response_type] = TypeAdapter(response_type)
+    return adapter
+
+async def cached_json(endpoint: str, team_id: str, key: str, build: Callable[[], Awaitable[Any]], response_type: Any) -> Response:
+    """
+    Serve the JSON body cached for (team_id, key) at the team's current generation, or await
+    build(), serialize it as response_type and cache it. Exceptions from build() (404/403) are
+    raised as usual and never cached.
+    """
+    if not settings.RESPONSE_CACHE_ENABLED:
+        body = _adapter(response_type).dump_json(await build(), by_alias=True)
+        return Response(content=body, media_type="application/json")
+
+    body, generation = await get_backend().get(team_id, key)
+    if body is not None:
+        metrics.response_cache_requests_total.inc(endpoint=endpoint, result="hit")
+        return Response(content=body, media_type="application/json")
+    metrics.response_cache_requests_total.inc(endpoint=endpoint, result="miss")
+    body = _adapter(response_type).dump_json(await build(), by_alias=True)
+    await get_backend().set(team_id, key, generation, body)
+    return Response(content=body, media_type="application/json")
+
+async def invalidate_team(team_id: str):
+    """ Make every cached response of the team stale. Call after writes to its assignments or members. """
+    if not settings.RESPONSE_CACHE_ENABLED:
+        return
+    try:
+        await get_backend().bump(team_id)
+    except PyMongoError as e:
+        # Entries of the old generation stay readable until their TTL
+        log_event("cache.invalidate_failed", logging.WARNING, team_id=team_id, error=str(e))
+    metrics.response_cache_invalidations_total.inc()
+
+_ENDPOINTS = ("team_assignments", "assignment_details", "team_details")
+
+def get_stats() -> dict:
+    endpoints = {}
+    for endpoint in _ENDPOINTS:
+        hits = metrics.response_cache_requests_total.get(endpoint=endpoint, result="hit")
+        misses = metrics.response_cache_requests_total.get(endpoint=endpoint, result="miss")
+        endpoints[endpoint] = {
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+        }
+    return {
+        "enabled": settings.RESPONSE_CACHE_ENABLED,
+        "backend": "mongo" if isinstance(get_backend(), MongoResponseCache) else "memory",
+        "invalidations": metrics.response_cache_invalidations_total.get(),
+        "endpoints": endpoints,
+    }
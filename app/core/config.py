@@ -1,11 +1,12 @@
 import os
+from functools import lru_cache
 from pydantic_settings import BaseSettings
 from dotenv import load_dotenv
 from pathlib import Path
+from typing import Dict, List, Optional
 
-# Load .env file from the project root
+# Loaded from the project root on first use of settings (see get_settings)
 env_path = Path('.') / '.env'
-load_dotenv(dotenv_path=env_path)
 
 class Settings(BaseSettings):
     # Database
@@ -21,6 +22,106 @@ class Settings(BaseSettings):
     GOOGLE_CLIENT_ID: str | None = None
     GOOGLE_CLIENT_SECRET: str | None = None
 
+    # Admission control (per-route concurrency limits + per-user token buckets)
+    ADMISSION_CONTROL_ENABLED: bool = True
+    RATE_LIMIT_BACKEND: str = "memory" # "memory" (per worker) or "mongo" (shared across workers)
+    ADMISSION_QUEUE_TIMEOUT_SECONDS: float = 2.0 # Max wait for a concurrency slot before shedding with 503
+    TRUSTED_PROXY_COUNT: int = 0 # Reverse proxies in front of the app; anonymous callers are then keyed by X-Forwarded-For
+    BULK_DOCS_MAX_CONCURRENCY: int = 8
+    BULK_DOCS_RATE_PER_MINUTE: int = 30
+    BULK_DOCS_BURST: int = 10
+    AUTH_MAX_CONCURRENCY: int = 4 # bcrypt is CPU bound, keep this close to the core count
+    AUTH_RATE_PER_MINUTE: int = 10
+    AUTH_BURST: int = 5
+    SUBMISSION_MAX_CONCURRENCY: int = 16
+    SUBMISSION_RATE_PER_MINUTE: int = 20
+    SUBMISSION_BURST: int = 5
+    FILE_UPLOAD_MAX_CONCURRENCY: int = 8 # Direct uploads hash and write up to MAX_UPLOAD_SIZE each
+    FILE_UPLOAD_RATE_PER_MINUTE: int = 20
+    FILE_UPLOAD_BURST: int = 5
+    RESUMABLE_UPLOAD_MAX_CONCURRENCY: int = 16 # PATCH requests streaming resumable upload chunks
+    RESUMABLE_UPLOAD_RATE_PER_MINUTE: int = 120 # One file takes many PATCHes
+    RESUMABLE_UPLOAD_BURST: int = 20
+
+    # Sync
+    SYNC_REPLICATION_BATCH_SIZE: int = 1000 # Docs per unordered bulk_write for new_edits=false imports
+    SYNC_CHECKPOINT_RETENTION_DAYS: int = 90 # _local checkpoint docs untouched for this long are deleted
+    SYNC_TOMBSTONE_RETENTION_DAYS: int = 90 # Replication window: replicas offline longer may push deleted docs back
+
+    # Slow-query profiler (opt-in; adds explain() round trips for slow commands)
+    QUERY_PROFILER_ENABLED: bool = False
+    SLOW_QUERY_THRESHOLD_MS: float = 100.0
+    SLOW_QUERY_BUFFER_SIZE: int = 200 # Most recent slow queries kept for /api/debug/slow-queries
+    ADMIN_EMAILS: List[str] = [] # Platform admins (debug/maintenance endpoints), e.g. ["ops@example.com"]
+    METRICS_TOKEN: Optional[str] = None # Bearer token for the /api/metrics scraper; platform admins can always read it
+
+    # File storage for direct uploads
+    STORAGE_BACKEND: str = "local" # Only "local" for now; object stores plug into app/services/storage.py
+    STORAGE_LOCAL_DIR: str = "uploads"
+    STORAGE_PUBLIC_BASE_URL: str = "http://localhost:8000/files" # Local files are served by the app under /files
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024 # Bytes read per chunk; bounds memory per upload
+    MAX_UPLOAD_SIZE: int = 50 * 1024 * 1024
+    # Extensions kept on stored file names; others are dropped so uploads are never served as e.g. .html/.svg
+    UPLOAD_ALLOWED_EXTENSIONS: List[str] = [
+        ".pdf", ".txt", ".md", ".csv", ".zip", ".tar", ".gz", ".7z", ".docx", ".xlsx", ".pptx", ".odt",
+        ".png", ".jpg", ".jpeg", ".gif", ".mp3", ".mp4", ".mov", ".webm",
+        ".ipynb", ".py", ".java", ".c", ".cpp", ".h", ".js", ".ts", ".sql",
+    ]
+
+    # Resumable (tus-style) uploads
+    MAX_RESUMABLE_UPLOAD_SIZE: int = 1024 * 1024 * 1024
+    UPLOAD_EXPIRY_HOURS: int = 24 # Abandoned partial uploads are purged this long after their last PATCH
+    UPLOAD_LEASE_SECONDS: int = 300 # A PATCH holds the upload for this long, renewed while it streams
+    UPLOAD_CLEANUP_INTERVAL_SECONDS: int = 3600
+
+    # Bulk team enrollment
+    ENROLL_BATCH_SIZE: int = 500 # Emails resolved with one $in query and written together
+    ENROLL_SYNC_MAX_ROWS: int = 200 # Larger lists run as a background job
+    ENROLL_MAX_ROWS: int = 10000
+    ENROLLMENT_JOB_RETENTION_DAYS: int = 7
+
+    # MongoDB connection pool
+    MONGO_MIN_POOL_SIZE: int = 10 # Connections opened during startup and kept open
+    MONGO_MAX_POOL_SIZE: int = 100
+    MONGO_STARTUP_TIMEOUT_SECONDS: float = 30.0 # Startup fails if the ping/warm-up/index checks take longer
+
+    # Read-through response cache for team-scoped reads
+    RESPONSE_CACHE_ENABLED: bool = True
+    # "memory" (per-worker LRU), "mongo" (shared by all workers) or "auto": mongo when WEB_CONCURRENCY > 1
+    RESPONSE_CACHE_BACKEND: str = "auto"
+    WEB_CONCURRENCY: int = 1 # Worker processes; also read by uvicorn and gunicorn as their default worker count
+    RESPONSE_CACHE_MAX_ENTRIES: int = 10000 # Memory backend only
+    RESPONSE_CACHE_TTL_SECONDS: int = 300 # Upper bound on staleness for data without a generation bump
+
+    # Live updates (server-sent events)
+    EVENTS_ENABLED: bool = True
+    EVENTS_SOURCE: str = "memory" # "memory" (this worker's writes) or "change_stream" (all workers; needs a replica set)
+    EVENTS_QUEUE_SIZE: int = 100 # Per connection; a client that falls this far behind is disconnected
+    EVENTS_HEARTBEAT_SECONDS: float = 15.0
+
+    # Retention/compaction of submission history (old versions moved to submission_archive)
+    COMPACTION_ENABLED: bool = False
+    COMPACTION_INTERVAL_SECONDS: int = 24 * 3600
+    COMPACTION_KEEP_VERSIONS: int = 5 # The latest N versions of a submission are always kept...
+    COMPACTION_KEEP_VERSIONS_DAYS: int = 180 # ...and so is every version submitted in the last X days
+    COMPACTION_BATCH_SIZE: int = 100 # Submissions per batch
+    COMPACTION_BATCH_PAUSE_SECONDS: float = 0.5 # Pause between batches
+    COMPACTION_MAX_IN_FLIGHT: int = 20 # Wait while the worker serves more requests than this
+
+    # Idempotency-Key support for retried mutating requests
+    IDEMPOTENCY_ENABLED: bool = True
+    IDEMPOTENCY_TTL_HOURS: int = 24 # Stored responses are replayed for this long
+    IDEMPOTENCY_LEASE_SECONDS: int = 60 # Renewed while the original runs; a key whose original died is taken over after this long
+    IDEMPOTENCY_WAIT_SECONDS: float = 10.0 # Duplicates wait this long for the original, then get 409
+    IDEMPOTENCY_MAX_RESPONSE_BYTES: int = 1024 * 1024 # Larger responses are not stored
+
+    # Structured logging (JSON lines on stdout, written by a background thread)
+    LOG_LEVEL: str = "INFO"
+    LOG_FORMAT: str = "json" # "json" or "text"
+    LOG_QUEUE_SIZE: int = 10000 # Events waiting to be written; further events are dropped (and counted)
+    LOG_EVENT_RATE_PER_SECOND: float = 20.0 # Per event type; excess events are sampled out. 0 = unlimited
+    LOG_EVENT_RATES: Dict[str, float] = {} # Per-event overrides, e.g. {"sync.conflict": 5}
+
     # URLs (Optional, load if needed for redirects etc.)
     # BACKEND_URL: str | None = None
     # FRONTEND_URL: str | None = None
@@ -29,4 +130,20 @@ class Settings(BaseSettings):
         env_file = ".env"
         extra = "ignore" # Ignore extra fields from .env
 
-settings = Settings()
\ No newline at end of file
+@lru_cache
+def get_settings() -> Settings:
+    load_dotenv(dotenv_path=env_path)
+    return Settings()
+
+class _LazySettings:
+    """
+    Stand-in for the Settings instance that is only built on first attribute access, so importing
+    a module does not require configuration to be present.
+    """
+    def __getattr__(self, name):
+        return getattr(get_settings(), name)
+
+    def __setattr__(self, name, value):
+        setattr(get_settings(), name, value)
+
+settings = _LazySettings()
\ No newline at end of file
@@ -0,0 +1,194 @@
+import asyncio
+import json
+import logging
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Any, Dict, Iterable, Optional, Set, Tuple
+
+from pymongo.errors import OperationFailure, PyMongoError
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.log import log_event
+from app.db.database import get_assignment_collection, get_database, get_submission_collection
+
+# Live updates for clients, pushed over server-sent events (see app/api/endpoints/events.py).
+# Write paths in the CRUD layer call emit(); the broker fans each event out to the subscriptions of
+# its topics. Every subscription has a bounded queue: a client that falls behind by more than
+# EVENTS_QUEUE_SIZE events is disconnected (and refetches on reconnect) instead of buffering
+# without limit. With EVENTS_SOURCE=change_stream, events come from MongoDB change streams instead
+# of the local write paths, so every worker sees the writes of all workers.
+
+# Topics
+def team_topic(team_id: str) -> str:
+    """ Assignment changes, for every member of the team. """
+    return f"team:{team_id}"
+
+def team_submissions_topic(team_id: str) -> str:
+    """ Submission changes of the whole team, for its admins. """
+    return f"team_submissions:{team_id}"
+
+def user_topic(user_id: str) -> str:
+    """ Changes to the user's own submissions. """
+    return f"user:{user_id}"
+
+
+@dataclass
+class Event:
+    type: str # e.g. "assignment.created", "submission.updated", "submission.deleted"
+    data: Dict[str, Any]
+    topics: Tuple[str, ...]
+
+    def to_sse(self) -> str:
+        return f"event: {self.type}\ndata: {json.dumps(self.data, default=_json_default)}\n\n"
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return str(value)
+
+
+class Subscription:
+    """ One client connection: a bounded queue of events for its topics. """
+
+    def __init__(self, topics: Iterable[str], max_queue: int):
+        self.topics = tuple(topics)
+        self.queue: "asyncio.Queue[Optional[Event]]" = asyncio.Queue(maxsize=max_queue + 1) # +1 for the close marker
+        self.max_queue = max_queue
+        self.dropped = False # Closed because the client did not keep up
+
+    def deliver(self, event: Event) -> bool:
+        """ Queue the event; returns False (and closes the subscription) if the client is too far behind. """
+        if self.queue.qsize() >= self.max_queue:
+            self.dropped = True
+            self.close()
+            return False
+        self.queue.put_nowait(event)
+        return True
+
+    def close(self):
+        # Nothing queued matters once the subscription is closed; None tells the reader to stop
+        while not self.queue.empty():
+            self.queue.get_nowait()
+        self.queue.put_nowait(None)
+
+    async def get(self) -> Optional[Event]:
+        return await self.queue.get()
+
+
+class EventBroker:
+    """ In-process fan-out of events to the subscriptions of this worker. """
+
+    def __init__(self):
+        self._subscriptions: Dict[str, Set[Subscription]] = {}
+
+    def subscribe(self, topics: Iterable[str], max_queue: int) -> Subscription:
+        subscription = Subscription(topics, max_queue)
+        for topic in subscription.topics:
+            self._subscriptions.setdefault(topic, set()).add(subscription)
+        metrics.events_subscribers.inc()
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription):
+        for topic in subscription.topics:
+            subscribers = self._subscriptions.get(topic)
+            if subscribers is not None:
+                subscribers.discard(subscription)
+                if not subscribers:
+                    del self._subscriptions[topic]
+        metrics.events_subscribers.dec()
+
+    def publish(self, event: Event):
+        metrics.events_published_total.inc(type=event.type)
+        delivered = set() # A subscription of several of the event's topics gets it once
+        for topic in event.topics:
+            for subscription in list(self._subscriptions.get(topic, ())):
+                if subscription in delivered or subscription.dropped:
+                    continue
+                delivered.add(subscription)
+                if not subscription.deliver(event):
+                    metrics.events_slow_consumers_total.inc()
+                    self.unsubscribe(subscription)
+
+    def close_all(self):
+        """ End every open stream, e.g. on shutdown. """
+        for subscription in {s for subscribers in self._subscriptions.values() for s in subscribers}:
+            subscription.close()
+
+broker = EventBroker()
+
+
+# --- Events of the write paths ---
+
+def assignment_event(assignment: Dict[str, Any]) -> Event:
+    return Event(
+        type="assignment.created",
+        data={key: assignment.get(key) for key in ("_id", "team_id", "title", "due_date")},
+        topics=(team_topic(assignment["team_id"]),)
+    )
+
+def submission_event(submission: Dict[str, Any], deleted: bool = False) -> Optional[Event]:
+    """ Event for a raw submission document, or None if it names no student to notify. """
+    student_id, team_id = submission.get("student_id"), submission.get("team_id")
+    if not student_id:
+        return None
+    fields = ("_id", "assignment_id", "student_id", "team_id") if deleted else \
+        ("_id", "_rev", "assignment_id", "student_id", "team_id", "current_version", "last_updated_at")
+    topics = (user_topic(student_id),) + ((team_submissions_topic(team_id),) if team_id else ())
+    return Event(
+        type="submission.deleted" if deleted else "submission.updated",
+        data={key: submission.get(key) for key in fields},
+        topics=topics
+    )
+
+def emit(event: Optional[Event]):
+    """ Publish an event from a local write. A no-op when events come from change streams instead. """
+    if event is None or not settings.EVENTS_ENABLED or settings.EVENTS_SOURCE != "memory":
+        return
+    broker.publish(event)
+
+
+# --- Change stream source ---
+
+async def watch_change_streams():
+    """
+    Publish assignment inserts and submission writes from a MongoDB change stream (requires a
+    replica set). Runs in every worker for its own subscribers, resuming after errors.
+    """
+    from app.crud.crud_submission import split_submission_doc_id # Avoid circular import
+
+    collections = {get_assignment_collection().name, get_submission_collection().name}
+    pipeline = [{"$match": {
+        "ns.coll": {"$in": sorted(collections)},
+        "operationType": {"$in": ["insert", "update", "replace", "delete"]}
+    }}]
+    resume_token = None
+    while True:
+        try:
+            async with get_database().watch(pipeline, full_document="updateLookup", resume_after=resume_token) as stream:
+                async for change in stream:
+                    resume_token = stream.resume_token
+                    collection, operation = change["ns"]["coll"], change["operationType"]
+                    if collection == get_assignment_collection().name:
+                        if operation == "insert":
+                            broker.publish(assignment_event(change["fullDocument"]))
+                        continue
+                    document = change.get("fullDocument")
+                    if operation == "delete" or (document and document.get("_deleted", False)):
+                        # Deletions leave only _id/_rev (tombstone); team admins are not notified of those
+                        assignment_id, student_id = split_submission_doc_id(change["documentKey"]["_id"])
+                        event = submission_event({"_id": change["documentKey"]["_id"], "assignment_id": assignment_id,
+                                                  "student_id": student_id}, deleted=True)
+                    elif document:
+                        event = submission_event(document)
+                    else: # Deleted again before the lookup
+                        continue
+                    if event:
+                        broker.publish(event)
+        except asyncio.CancelledError:
+            raise
+        except PyMongoError as e:
+            log_event("events.change_stream_failed", logging.WARNING, error=str(e))
+            if isinstance(e, OperationFailure): # e.g. the resume point fell off the oplog
+                resume_token = None
+            await asyncio.sleep(1)
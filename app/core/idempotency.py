@@ -0,0 +1,249 @@
+import asyncio
+import hashlib
+import logging
+import re
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from fastapi import status
+from fastapi.responses import JSONResponse, Response
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError, PyMongoError
+
+from app.core import metrics
+from app.core.admission import client_key
+from app.core.config import settings
+from app.core.log import log_event
+from app.db.database import get_idempotency_collection
+
+# Idempotency-Key support for mutating routes that clients retry after timeouts. The first request
+# with a key claims it (status "processing") and its response is stored; a retry with the same key
+# gets the stored response back without running the endpoint again, and a duplicate arriving while
+# the original is still running waits for it instead of racing it. Keys are scoped per caller and
+# route, and are kept for IDEMPOTENCY_TTL_HOURS (TTL index on expires_at).
+# Responses with a 5xx status are not stored, so the client can retry those for real.
+
+IDEMPOTENT_ROUTES: List[Tuple[str, re.Pattern]] = [
+    ("POST", re.compile(r"^/api/assignments/[^/]+/submissions$")),
+    ("POST", re.compile(r"^/api/teams$")),
+    ("POST", re.compile(r"^/api/teams/join$")),
+    ("POST", re.compile(r"^/api/sync/[^/]+/_bulk_docs$")),
+]
+
+MAX_KEY_LENGTH = 255
+_POLL_SECONDS = 0.25 # Waiting on an original served by another worker
+
+# Originals running in this worker, so local duplicates wake up as soon as they finish
+_local_requests: Dict[str, asyncio.Event] = {}
+
+
+def is_idempotent_route(method: str, path: str) -> bool:
+    return any(method == route_method and pattern.match(path) for route_method, pattern in IDEMPOTENT_ROUTES)
+
+def _header(scope, name: bytes) -> Optional[str]:
+    for header_name, value in scope.get("headers", []):
+        if header_name == name:
+            return value.decode("latin-1")
+    return None
+
+def _record_id(scope, key: str) -> str:
+    return hashlib.sha256(f"{client_key(scope)}|{scope['method']} {scope['path']}|{key}".encode()).hexdigest()
+
+def _fingerprint(scope, body: bytes) -> str:
+    return hashlib.sha256(scope.get("query_string", b"") + b"|" + body).hexdigest()
+
+
+async def _read_body(receive) -> bytes:
+    chunks = []
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            break
+        chunks.append(message.get("body", b""))
+        if not message.get("more_body", False):
+            break
+    return b"".join(chunks)
+
+def _replay_receive(body: bytes, receive):
+    """ A receive callable that hands the already-read body to the app, then defers to the client. """
+    sent = False
+    async def replay():
+        nonlocal sent
+        if not sent:
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+        return await receive()
+    return replay
+
+
+def _stored_response(record: Dict[str, Any]) -> Response:
+    stored = record["response"]
+    headers = {name: value for name, value in stored["headers"] if name.lower() != "content-length"}
+    headers["Idempotent-Replayed"] = "true"
+    return Response(content=bytes(stored["body"]), status_code=stored["status_code"], headers=headers)
+
+
+class IdempotencyMiddleware:
+    """
+    ASGI middleware implementing Idempotency-Key for IDEMPOTENT_ROUTES.
+    - Same key, same request, original finished -> the stored response (Idempotent-Replayed: true)
+    - Same key, original still running -> waits up to IDEMPOTENCY_WAIT_SECONDS, then 409
+    - Same key, different request body -> 422
+    Requests without the header pass straight through.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not settings.IDEMPOTENCY_ENABLED:
+            await self.app(scope, receive, send)
+            return
+        key = _header(scope, b"idempotency-key")
+        if key is None or not is_idempotent_route(scope["method"], scope["path"]):
+            await self.app(scope, receive, send)
+            return
+        if not key or len(key) > MAX_KEY_LENGTH:
+            response = JSONResponse({"detail": f"Idempotency-Key must be 1 to {MAX_KEY_LENGTH} characters"},
+                                    status_code=status.HTTP_400_BAD_REQUEST)
+            await response(scope, receive, send)
+            return
+
+        body = await _read_body(receive)
+        receive = _replay_receive(body, receive)
+        record_id, fingerprint = _record_id(scope, key), _fingerprint(scope, body)
+        owner = uuid.uuid4().hex
+        try:
+            record = await self._claim(record_id, fingerprint, owner)
+        except PyMongoError as e:
+            # Fail open: without the store, requests just run as if they had no key
+            log_event("idempotency.store_unavailable", logging.WARNING, error=str(e))
+            await self.app(scope, receive, send)
+            return
+
+        if record is not None: # The key is taken: replay, wait, or reject
+            await self._respond_to_duplicate(record, record_id, fingerprint, owner, scope, receive, send)
+            return
+        await self._run_original(record_id, owner, scope, receive, send)
+
+    async def _claim(self, record_id: str, fingerprint: str, owner: str) -> Optional[Dict[str, Any]]:
+        """ Claim the key for this request. Returns None if claimed, else the record holding it. """
+        now = datetime.now(timezone.utc)
+        try:
+            await get_idempotency_collection().insert_one({
+                "_id": record_id, "status": "processing", "fingerprint": fingerprint, "owner": owner,
+                "lease_expires_at": now + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS),
+                "expires_at": now + timedelta(hours=settings.IDEMPOTENCY_TTL_HOURS),
+            })
+            return None
+        except DuplicateKeyError:
+            return await get_idempotency_collection().find_one({"_id": record_id}) or await self._claim(record_id, fingerprint, owner)
+
+    async def _take_over(self, record_id: str, owner: str) -> bool:
+        """ Claim a key held longer than IDEMPOTENCY_LEASE_SECONDS (e.g. its original's worker died). """
+        now = datetime.now(timezone.utc)
+        record = await get_idempotency_collection().find_one_and_update(
+            {"_id": record_id, "status": "processing", "lease_expires_at": {"$lte": now}},
+            {"$set": {"owner": owner, "lease_expires_at": now + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS)}},
+            return_document=ReturnDocument.AFTER
+        )
+        return record is not None
+
+    async def _respond_to_duplicate(self, record, record_id: str, fingerprint: str, owner: str, scope, receive, send):
+        if record["fingerprint"] != fingerprint:
+            metrics.idempotency_requests_total.inc(result="mismatch")
+            response = JSONResponse({"detail": "Idempotency-Key was already used for a different request"},
+                                    status_code=status.HTTP_422_UNPROCESSABLE_CONTENT)
+            await response(scope, receive, send)
+            return
+
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT_SECONDS
+        while record["status"] == "processing":
+            if record["lease_expires_at"] <= datetime.now(timezone.utc) and await self._take_over(record_id, owner):
+                await self._run_original(record_id, owner, scope, receive, send)
+                return
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                metrics.idempotency_requests_total.inc(result="in_progress")
+                response = JSONResponse({"detail": "A request with this Idempotency-Key is still in progress"},
+                                        status_code=status.HTTP_409_CONFLICT, headers={"Retry-After": "1"})
+                await response(scope, receive, send)
+                return
+            local = _local_requests.get(record_id)
+            if local is not None: # Original runs in this worker: wake up as soon as it is done
+                try:
+                    await asyncio.wait_for(local.wait(), timeout=remaining)
+                except asyncio.TimeoutError:
+                    pass
+            else:
+                await asyncio.sleep(min(_POLL_SECONDS, remaining))
+            record = await get_idempotency_collection().find_one({"_id": record_id})
+            if record is None: # The original failed (5xx/exception) and released the key: run this one
+                record = await self._claim(record_id, fingerprint, owner)
+                if record is None:
+                    await self._run_original(record_id, owner, scope, receive, send)
+                    return
+
+        metrics.idempotency_requests_total.inc(result="replayed")
+        await _stored_response(record)(scope, receive, send)
+
+    async def _store(self, record_id: str, owner: str, response: Dict[str, Any]) -> bool:
+        try:
+            result = await get_idempotency_collection().update_one(
+                {"_id": record_id, "owner": owner},
+                {"$set": {"status": "completed", "response": response}}
+            )
+        except PyMongoError as e:
+            log_event("idempotency.store_failed", logging.WARNING, error=str(e))
+            return False
+        return result.modified_count > 0
+
+    async def _renew_lease(self, record_id: str, owner: str):
+        """ Keep the lease of a running original from expiring, so only a dead worker's key is taken over. """
+        while True:
+            await asyncio.sleep(settings.IDEMPOTENCY_LEASE_SECONDS / 3)
+            try:
+                await get_idempotency_collection().update_one(
+                    {"_id": record_id, "owner": owner, "status": "processing"},
+                    {"$set": {"lease_expires_at": datetime.now(timezone.utc) + timedelta(seconds=settings.IDEMPOTENCY_LEASE_SECONDS)}}
+                )
+            except PyMongoError as e:
+                log_event("idempotency.lease_renewal_failed", logging.WARNING, error=str(e))
+
+    async def _run_original(self, record_id: str, owner: str, scope, receive, send):
+        metrics.idempotency_requests_total.inc(result="executed")
+        done = _local_requests[record_id] = asyncio.Event()
+        renewal = asyncio.create_task(self._renew_lease(record_id, owner))
+        response: Dict[str, Any] = {"status_code": None, "headers": [], "body": []}
+        size = 0
+
+        async def send_wrapper(message):
+            nonlocal size
+            if message["type"] == "http.response.start":
+                response["status_code"] = message["status"]
+                response["headers"] = [[name.decode("latin-1"), value.decode("latin-1")] for name, value in message.get("headers", [])]
+            elif message["type"] == "http.response.body":
+                size += len(message.get("body", b""))
+                if size <= settings.IDEMPOTENCY_MAX_RESPONSE_BYTES:
+                    response["body"].append(message.get("body", b""))
+            await send(message)
+
+        stored = False
+        try:
+            await self.app(scope, receive, send_wrapper)
+            if response["status_code"] is not None and response["status_code"] < 500 \
+                    and size <= settings.IDEMPOTENCY_MAX_RESPONSE_BYTES:
+                stored = await self._store(record_id, owner, {**response, "body": b"".join(response["body"])})
+        finally:
+            renewal.cancel()
+            if not stored:
+                # Release the key so a retry runs the request again
+                try:
+                    await get_idempotency_collection().delete_one({"_id": record_id, "owner": owner, "status": "processing"})
+                except PyMongoError as e:
+                    log_event("idempotency.release_failed", logging.WARNING, error=str(e))
+            if _local_requests.get(record_id) is done:
+                del _local_requests[record_id]
+            done.set()
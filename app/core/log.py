@@ -0,0 +1,281 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import sys
+import threading
+import time
+import uuid
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+from app.core import metrics
+from app.core.config import settings
+
+# Structured, non-blocking logging. log_event() only puts the event's fields on a queue (no record,
+# no formatting, no I/O on the calling thread); a background thread formats it as a JSON line and
+# writes it to stdout, so a burst of events never blocks the event loop on stdout. If the queue
+# is full the event is dropped and counted in log_events_dropped_total instead.
+# Each event type is rate limited (LOG_EVENT_RATE_PER_SECOND, overridden per event by
+# LOG_EVENT_RATES), so a sync storm logs a sample of its conflicts rather than every one; the next
+# event written of that type carries the number sampled out since ("sampled_out").
+# Events carry the request id (RequestContextMiddleware) and user id (deps.get_current_user) of the
+# request they were logged in.
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+user_id_var: ContextVar[Optional[str]] = ContextVar("user_id", default=None)
+
+logger = logging.getLogger("app")
+
+MAX_REQUEST_ID_LENGTH = 128
+
+
+# --- Formatting (runs on the listener thread) ---
+
+def _timestamp(record: logging.LogRecord) -> str:
+    return datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds")
+
+def _event_fields(record: logging.LogRecord) -> Dict[str, Any]:
+    """ The event name, context ids and fields of a record (log_event or plain logging calls). """
+    event: Dict[str, Any] = {"event": getattr(record, "event", None) or record.name}
+    if not hasattr(record, "event"):
+        event["message"] = record.getMessage()
+    for key in ("request_id", "user_id"):
+        if getattr(record, key, None):
+            event[key] = getattr(record, key)
+    event.update(getattr(record, "fields", None) or {})
+    return event
+
+
+class JsonFormatter(logging.Formatter):
+    """ One JSON object per line: ts, level, event, request_id, user_id, then the event's fields. """
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = {"ts": _timestamp(record), "level": record.levelname.lower(), **_event_fields(record)}
+        if record.exc_info:
+            line["exc"] = self.formatException(record.exc_info)
+        return json.dumps(line, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """ Human-readable variant for development: ts LEVEL event key=value... """
+
+    def format(self, record: logging.LogRecord) -> str:
+        fields = _event_fields(record)
+        text = f"{_timestamp(record)} {record.levelname} {fields.pop('event')} " + \
+            " ".join(f"{key}={value}" for key, value in fields.items())
+        if record.exc_info:
+            text += "\n" + self.formatException(record.exc_info)
+        return text.rstrip()
+
+
+# --- Queue ---
+
+_queue: Optional[queue.SimpleQueue] = None
+_queue_size = 0
+_listener: Optional["_QueueListener"] = None
+
+def _enqueue(item: Any, event: str):
+    """ Put an event on the queue, or drop (and count) it if the writer has fallen LOG_QUEUE_SIZE behind. """
+    log_queue = _queue
+    if log_queue is None or log_queue.qsize() >= _queue_size:
+        metrics.log_events_dropped_total.inc(event=event, reason="queue_full")
+        return
+    log_queue.put(item)
+
+def _make_record(created: float, level: int, event: str, fields: Dict[str, Any], request_id: Optional[str],
+                 user_id: Optional[str], exc_info: Any) -> logging.LogRecord:
+    record = logger.makeRecord(logger.name, level, "", 0, event, (), exc_info)
+    record.created = created # When log_event was called, not when the record was built
+    record.event = event
+    record.fields = fields
+    record.request_id = request_id
+    record.user_id = user_id
+    return record
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """ Puts records of plain logging calls (e.g. logging.getLogger("app.x").info(...)) on the queue. """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record # Formatted by the listener thread
+
+    def enqueue(self, record: logging.LogRecord):
+        _enqueue(record, getattr(record, "event", record.name))
+
+
+class _StreamHandler(logging.StreamHandler):
+    """ A StreamHandler that leaves flushing to the listener, which flushes once the queue is drained. """
+
+    def emit(self, record: logging.LogRecord):
+        try:
+            self.stream.write(self.format(record) + self.terminator)
+        except Exception:
+            self.handleError(record)
+
+
+class _QueueListener(logging.handlers.QueueListener):
+    """
+    The writer thread. log_event queues plain tuples, turned into records here rather than on the
+    caller (building a LogRecord costs more than the rest of log_event together). Output is flushed
+    whenever the queue runs empty, so a burst is written in a few large writes.
+    """
+
+    def handle(self, record):
+        if not isinstance(record, threading.Event): # Events are put by flush_logging
+            super().handle(_make_record(*record) if isinstance(record, tuple) else record)
+        if isinstance(record, threading.Event) or self.queue.empty():
+            for handler in self.handlers:
+                handler.flush()
+        if isinstance(record, threading.Event):
+            record.set()
+
+    def stop(self):
+        super().stop()
+        for handler in self.handlers: # The records just before the sentinel are not flushed by handle()
+            handler.flush()
+
+
+# --- Sampling ---
+
+class _EventSampler:
+    """ Token bucket per event type, refilled at the event's rate (burst of one second's worth). """
+
+    def __init__(self, default_rate: float, rates: Dict[str, float]):
+        self.default_rate = default_rate
+        self.rates = rates
+        self._buckets: Dict[str, List[float]] = {} # event -> [tokens, last refill, sampled out since last write]
+        self._lock = threading.Lock() # Events are also logged from pymongo's monitoring threads
+
+    def allow(self, event: str) -> Tuple[bool, int]:
+        """ Whether to write this event, and how many of its type were sampled out before it. """
+        rate = self.rates.get(event, self.default_rate)
+        if rate <= 0:
+            return True, 0
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(event)
+            if bucket is None:
+                bucket = self._buckets[event] = [max(rate, 1.0), now, 0]
+            else:
+                bucket[0] = min(max(rate, 1.0), bucket[0] + (now - bucket[1]) * rate)
+                bucket[1] = now
+            if bucket[0] < 1:
+                bucket[2] += 1
+                return False, 0
+            bucket[0] -= 1
+            sampled_out, bucket[2] = int(bucket[2]), 0
+        return True, sampled_out
+
+
+_sampler = _EventSampler(0, {})
+_configure_lock = threading.Lock()
+_shut_down = False # Set by shutdown_logging: later events are dropped instead of restarting the writer
+
+
+def configure_logging():
+    """ Route the "app" logger through the queue to stdout. Idempotent; called on first use. """
+    global _listener, _queue, _queue_size, _sampler, _shut_down
+    with _configure_lock:
+        _shut_down = False
+        if _listener is not None:
+            return
+        handler = _StreamHandler(sys.stdout)
+        handler.setFormatter(TextFormatter() if settings.LOG_FORMAT == "text" else JsonFormatter())
+        # SimpleQueue: put() never blocks and takes no Python-level lock; the bound is checked by _enqueue
+        _queue, _queue_size = queue.SimpleQueue(), settings.LOG_QUEUE_SIZE
+        logger.handlers = [_NonBlockingQueueHandler(_queue)]
+        logger.setLevel(settings.LOG_LEVEL.upper())
+        logger.propagate = False # Not duplicated by handlers uvicorn installs on the root logger
+        _sampler = _EventSampler(settings.LOG_EVENT_RATE_PER_SECOND, dict(settings.LOG_EVENT_RATES))
+        _listener = _QueueListener(_queue, handler)
+        _listener.start()
+
+def flush_logging():
+    """ Block until the events queued so far have been written. """
+    log_queue = _queue
+    if log_queue is not None and _listener is not None:
+        written = threading.Event()
+        log_queue.put(written)
+        written.wait()
+
+def shutdown_logging():
+    """ Write the queued events and stop the writer thread. Events logged afterwards are dropped. """
+    global _listener, _queue, _shut_down
+    with _configure_lock:
+        _shut_down = True
+        if _listener is None:
+            return
+        _listener.stop()
+        _listener = _queue = None
+        logger.handlers = []
+
+atexit.register(shutdown_logging) # Writes what is still queued when the process exits
+
+
+def log_event(event: str, level: int = logging.INFO, exc_info: Any = None, **fields: Any):
+    """
+    Log a structured event, e.g. log_event("sync.conflict", doc_id=doc_id, incoming_rev=rev).
+    Cheap for the caller: disabled levels and sampled-out events return before anything is queued.
+    """
+    if _listener is None:
+        if _shut_down: # E.g. from a thread still running at exit: no writer to restart
+            return
+        configure_logging()
+    if not logger.isEnabledFor(level):
+        return
+    allowed, sampled_out = _sampler.allow(event)
+    if not allowed:
+        return
+    if sampled_out: # Counted here rather than per sampled-out event, which stays as cheap as possible
+        metrics.log_events_dropped_total.inc(sampled_out, event=event, reason="sampled")
+        fields["sampled_out"] = sampled_out
+    if isinstance(exc_info, BaseException):
+        exc_info = (type(exc_info), exc_info, exc_info.__traceback__)
+    elif exc_info and not isinstance(exc_info, tuple):
+        exc_info = sys.exc_info()
+    # Context variables are not visible on the listener thread, so they are captured here
+    _enqueue((time.time(), level, event, fields, request_id_var.get(), user_id_var.get(), exc_info), event)
+
+
+# --- Request context ---
+
+def _request_id(scope) -> str:
+    for name, value in scope.get("headers", []):
+        if name == b"x-request-id":
+            request_id = value.decode("latin-1")
+            if 0 < len(request_id) <= MAX_REQUEST_ID_LENGTH and request_id.isprintable():
+                return request_id
+            break
+    return uuid.uuid4().hex
+
+
+class RequestContextMiddleware:
+    """
+    ASGI middleware giving each request an id for its log events: the client's X-Request-ID if it
+    sent a usable one, else a new one. The id is echoed back in the X-Request-ID response header.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        request_id = _request_id(scope)
+        request_token = request_id_var.set(request_id)
+        user_token = user_id_var.set(None) # Set by deps.get_current_user once authenticated
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": [*message.get("headers", []), (b"x-request-id", request_id.encode("latin-1"))]}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            user_id_var.reset(user_token)
+            request_id_var.reset(request_token)
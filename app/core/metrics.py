@@ -0,0 +1,345 @@
+import bisect
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from pymongo import monitoring
+
+# Minimal Prometheus text-format registry.
+# Metric updates can come from pymongo's monitoring threads as well as the event loop, so every
+# metric guards its samples with a lock.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+LabelValues = Tuple[str, ...]
+
+
+def _format_labels(names: Tuple[str, ...], values: LabelValues, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class _Metric:
+    metric_type = ""
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._render_samples())
+        return lines
+
+    def _render_samples(self) -> List[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    metric_type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def get(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {_format_value(v)}" for k, v in items]
+
+
+class Gauge(Counter):
+    metric_type = "gauge"
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+
+class Histogram(_Metric):
+    metric_type = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[LabelValues, list] = {} # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            sample = self._values.get(key)
+            if sample is None:
+                sample = self._values[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                sample[index] += 1
+            sample[-2] += value
+            sample[-1] += 1
+
+    def total_count(self) -> int:
+        """ Observations across all label sets. """
+        with self._lock:
+            return sum(sample[-1] for sample in self._values.values())
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            items = [(k, list(v)) for k, v in self._values.items()]
+        lines = []
+        for key, sample in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets, sample):
+                cumulative += count
+                le = 'le="%s"' % _format_value(bound)
+                lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, le)} {cumulative}")
+            inf = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, inf)} {sample[-1]}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(sample[-2])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {sample[-1]}")
+        return lines
+
+
+class InFlightRequests(_Metric):
+    """
+    Gauge of requests being served, labelled by route template.
+    The route is only known once the router has matched the request, so active requests are tracked
+    as ASGI scopes and grouped at scrape time.
+    """
+    metric_type = "gauge"
+
+    def __init__(self, name: str, documentation: str):
+        super().__init__(name, documentation, ("method", "route"))
+        self._active: Dict[int, dict] = {}
+
+    def track(self, scope: dict):
+        with self._lock:
+            self._active[id(scope)] = scope
+
+    def untrack(self, scope: dict):
+        with self._lock:
+            self._active.pop(id(scope), None)
+
+    def count(self) -> int:
+        """ Requests currently being served by this worker. """
+        with self._lock:
+            return len(self._active)
+
+    def _render_samples(self) -> List[str]:
+        with self._lock:
+            scopes = list(self._active.values())
+        counts: Dict[LabelValues, int] = {}
+        for scope in scopes:
+            key = (scope["method"], route_template(scope) if "route" in scope else "pending")
+            counts[key] = counts.get(key, 0) + 1
+        return [f"{self.name}{_format_labels(self.labelnames, k)} {v}" for k, v in counts.items()]
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: List[_Metric] = []
+
+    def register(self, metric: _Metric) -> _Metric:
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+# --- HTTP ---
+http_requests_in_flight = registry.register(InFlightRequests(
+    "http_requests_in_flight", "HTTP requests currently being served."))
+http_request_duration_seconds = registry.register(Histogram(
+    "http_request_duration_seconds", "HTTP request latency by route template.", ["method", "route", "status"]))
+
+# --- MongoDB ---
+mongo_command_duration_seconds = registry.register(Histogram(
+    "mongo_command_duration_seconds", "MongoDB command latency.", ["collection", "command"]))
+mongo_command_failures_total = registry.register(Counter(
+    "mongo_command_failures_total", "MongoDB commands that failed.", ["collection", "command"]))
+mongo_pool_checkout_wait_seconds = registry.register(Histogram(
+    "mongo_pool_checkout_wait_seconds", "Time spent waiting to check a connection out of the pool.",
+    buckets=(0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)))
+mongo_pool_checkout_failures_total = registry.register(Counter(
+    "mongo_pool_checkout_failures_total", "Connection checkouts that failed.", ["reason"]))
+mongo_pool_connections = registry.register(Gauge(
+    "mongo_pool_connections", "Open pooled connections.", ["state"]))
+
+# --- Sync ---
+sync_bulk_docs_total = registry.register(Counter(
+    "sync_bulk_docs_total", "Documents processed by _bulk_docs by outcome.", ["outcome"]))
+
+# --- Admission control ---
+admission_shed_total = registry.register(Counter(
+    "admission_shed_total", "Requests rejected by admission control.", ["route", "status"]))
+admission_in_flight = registry.register(Gauge(
+    "admission_in_flight", "Requests holding an admission concurrency slot.", ["route"]))
+
+# --- Response cache ---
+response_cache_requests_total = registry.register(Counter(
+    "response_cache_requests_total", "Response cache lookups by endpoint and result (hit/miss).", ["endpoint", "result"]))
+response_cache_invalidations_total = registry.register(Counter(
+    "response_cache_invalidations_total", "Team generation bumps invalidating cached responses."))
+
+# --- Live updates ---
+events_published_total = registry.register(Counter(
+    "events_published_total", "Live update events published to the in-process broker by type.", ["type"]))
+events_subscribers = registry.register(Gauge(
+    "events_subscribers", "Open live update connections."))
+events_slow_consumers_total = registry.register(Counter(
+    "events_slow_consumers_total", "Live update connections dropped because their queue was full."))
+
+
+# --- Idempotency keys ---
+idempotency_requests_total = registry.register(Counter(
+    "idempotency_requests_total", "Requests with an Idempotency-Key by result (executed/replayed/in_progress/mismatch).", ["result"]))
+
+# --- Compaction ---
+compaction_archived_total = registry.register(Counter(
+    "compaction_archived_total", "Submission versions moved to the archive."))
+compaction_reclaimed_bytes_total = registry.register(Counter(
+    "compaction_reclaimed_bytes_total", "BSON bytes removed from the submissions collection by compaction."))
+
+# --- Logging ---
+log_events_dropped_total = registry.register(Counter(
+    "log_events_dropped_total", "Log events not written, by reason (sampled/queue_full).", ["event", "reason"]))
+
+
+# --- HTTP middleware ---
+
+def route_template(scope) -> str:
+    """
+    The template (e.g. /api/teams/{team_id}) of the route that handled a request, so ids don't
+    explode label cardinality.
+    """
+    route = scope.get("route")
+    if route is None:
+        return "unmatched"
+    # Routes of included routers keep their own path (e.g. /{team_id}); FastAPI records the full
+    # template, prefixes included, on the route context it selected
+    context = (scope.get("fastapi") or {}).get("effective_route_context")
+    return getattr(context, "path_format", None) or getattr(route, "path_format", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """ ASGI middleware recording per-route latency histograms and in-flight gauges. """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        http_requests_in_flight.track(scope)
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            http_requests_in_flight.untrack(scope)
+            http_request_duration_seconds.observe(
+                time.perf_counter() - start,
+                method=scope["method"], route=route_template(scope), status=status_code,
+            )
+
+
+# --- pymongo listeners ---
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """ Times every command per collection. Registered on the Motor client in app/db/database.py. """
+
+    def __init__(self):
+        self._collections: Dict[Tuple[object, int], str] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        collection = event.command.get(event.command_name)
+        if not isinstance(collection, str):
+            collection = ""
+        with self._lock:
+            self._collections[(event.connection_id, event.request_id)] = collection
+
+    def _pop_collection(self, event) -> str:
+        with self._lock:
+            return self._collections.pop((event.connection_id, event.request_id), "")
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        mongo_command_duration_seconds.observe(
+            event.duration_micros / 1_000_000,
+            collection=self._pop_collection(event), command=event.command_name,
+        )
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        collection = self._pop_collection(event)
+        mongo_command_duration_seconds.observe(
+            event.duration_micros / 1_000_000, collection=collection, command=event.command_name
+        )
+        mongo_command_failures_total.inc(collection=collection, command=event.command_name)
+
+
+class MongoPoolMetrics(monitoring.ConnectionPoolListener):
+    """ Tracks connection checkout wait time and pool occupancy. """
+
+    def connection_checked_out(self, event):
+        if event.duration is not None:
+            mongo_pool_checkout_wait_seconds.observe(event.duration)
+        mongo_pool_connections.inc(state="checked_out")
+
+    def connection_check_out_failed(self, event):
+        mongo_pool_checkout_failures_total.inc(reason=event.reason)
+
+    def connection_checked_in(self, event):
+        mongo_pool_connections.dec(state="checked_out")
+
+    def connection_created(self, event):
+        mongo_pool_connections.inc(state="open")
+
+    def connection_closed(self, event):
+        mongo_pool_connections.dec(state="open")
+
+    # Remaining pool events are not needed for these metrics
+    def pool_created(self, event): pass
+    def pool_ready(self, event): pass
+    def pool_cleared(self, event): pass
+    def pool_closed(self, event): pass
+    def connection_ready(self, event): pass
+    def connection_check_out_started(self, event): pass
@@ -0,0 +1,156 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional, Tuple
+
+from bson import json_util
+from pymongo import monitoring
+
+from app.core.config import settings
+from app.core.log import log_event
+
+# Opt-in slow-query profiler for the CRUD layer.
+# CRUD functions are wrapped with @profiled, which tags every command they issue with the calling
+# function (Motor copies contextvars into its executor threads, so the tag reaches the listener).
+# Commands slower than SLOW_QUERY_THRESHOLD_MS are kept in a ring buffer, and their
+# explain("executionStats") summary is attached asynchronously.
+
+# (CRUD function name, event loop that issued the command)
+_current_operation: contextvars.ContextVar[Optional[Tuple[str, asyncio.AbstractEventLoop]]] = contextvars.ContextVar(
+    "current_crud_operation", default=None
+)
+
+slow_queries: Deque[Dict[str, Any]] = deque() # Trimmed to SLOW_QUERY_BUFFER_SIZE on append
+_slow_queries_lock = threading.Lock()
+
+EXPLAINABLE_COMMANDS = {"find", "aggregate", "count", "distinct", "update", "delete", "findAndModify"}
+
+
+def profiled(func):
+    """
+    Tag Mongo commands issued by a CRUD coroutine. Only a settings check unless QUERY_PROFILER_ENABLED
+    is set (checked per call, so decorating does not require configuration at import time).
+    """
+    name = f"{func.__module__.rsplit('.', 1)[-1]}.{func.__name__}"
+
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        if not settings.QUERY_PROFILER_ENABLED:
+            return await func(*args, **kwargs)
+        token = _current_operation.set((name, asyncio.get_running_loop()))
+        try:
+            return await func(*args, **kwargs)
+        finally:
+            _current_operation.reset(token)
+    return wrapper
+
+
+def _explain_command(command: Dict[str, Any]) -> Dict[str, Any]:
+    # Drop session/cluster fields added by the driver; key order is kept (command name stays first)
+    return {
+        key: value for key, value in command.items()
+        if not key.startswith("$") and key not in ("lsid", "txnNumber", "readConcern", "writeConcern")
+    }
+
+
+def _plan_stages(plan: Optional[Dict[str, Any]]) -> List[str]:
+    stages = []
+    while plan:
+        stages.append(plan.get("stage", "?"))
+        plan = plan.get("inputStage") or (plan.get("inputStages") or [None])[0]
+    return stages
+
+
+def summarize_explain(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """ Reduce explain output to docs examined vs returned and the winning plan's stages. """
+    if "stages" in explain: # Aggregations: the query part lives in the leading $cursor stage
+        cursor_stage = next((s["$cursor"] for s in explain["stages"] if "$cursor" in s), {})
+        explain = {**cursor_stage, "aggregate_stages": [next(iter(s)) for s in explain["stages"]]}
+    stats = explain.get("executionStats", {})
+    summary = {
+        "plan": " > ".join(_plan_stages(explain.get("queryPlanner", {}).get("winningPlan"))),
+        "docs_examined": stats.get("totalDocsExamined"),
+        "keys_examined": stats.get("totalKeysExamined"),
+        "returned": stats.get("nReturned"),
+        "execution_time_ms": stats.get("executionTimeMillis"),
+    }
+    if "aggregate_stages" in explain:
+        summary["aggregate_stages"] = explain["aggregate_stages"]
+    return summary
+
+
+async def _attach_explain(entry: Dict[str, Any], database_name: str, command: Dict[str, Any]):
+    from app.db.database import get_client # Avoid circular import
+    try:
+        explain = await get_client()[database_name].command(
+            {"explain": command, "verbosity": "executionStats"}
+        )
+        entry["explain"] = summarize_explain(explain)
+    except Exception as e:
+        entry["explain"] = {"error": str(e)}
+    log_event("mongo.slow_query", logging.WARNING, crud_function=entry["crud_function"], command=entry["command_name"],
+              collection=entry["collection"], duration_ms=round(entry["duration_ms"], 1), explain=entry["explain"])
+
+
+class SlowQueryListener(monitoring.CommandListener):
+    """ Records CRUD-issued commands slower than SLOW_QUERY_THRESHOLD_MS. """
+
+    def __init__(self, threshold_ms: Optional[float] = None):
+        self.threshold_micros = (threshold_ms if threshold_ms is not None else settings.SLOW_QUERY_THRESHOLD_MS) * 1000
+        self._pending: Dict[Tuple[Any, int], Tuple[str, asyncio.AbstractEventLoop, Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+
+    def started(self, event: monitoring.CommandStartedEvent):
+        operation = _current_operation.get()
+        if operation is None: # Not issued through a profiled CRUD function
+            return
+        with self._lock:
+            self._pending[(event.connection_id, event.request_id)] = (*operation, event.command)
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent):
+        self._finish(event)
+
+    def failed(self, event: monitoring.CommandFailedEvent):
+        self._finish(event)
+
+    def _finish(self, event):
+        with self._lock:
+            pending = self._pending.pop((event.connection_id, event.request_id), None)
+        if pending is None or event.duration_micros < self.threshold_micros:
+            return
+        crud_function, loop, command = pending
+        collection = command.get(event.command_name)
+        explainable = event.command_name in EXPLAINABLE_COMMANDS
+        # Only keep the filter/pipeline for explainable commands; insert payloads can be huge
+        explain_command = _explain_command(command) if explainable else {event.command_name: collection}
+        entry = {
+            "at": datetime.now(timezone.utc).isoformat(),
+            "crud_function": crud_function,
+            "collection": collection if isinstance(collection, str) else None,
+            "command_name": event.command_name,
+            "duration_ms": event.duration_micros / 1000,
+            "failed": isinstance(event, monitoring.CommandFailedEvent),
+            "command": json.loads(json_util.dumps(explain_command)),
+            "explain": None,
+        }
+        with _slow_queries_lock:
+            slow_queries.append(entry)
+            while len(slow_queries) > settings.SLOW_QUERY_BUFFER_SIZE:
+                slow_queries.popleft()
+        if explainable:
+            loop.call_soon_threadsafe(
+                lambda: loop.create_task(_attach_explain(entry, event.database_name, explain_command))
+            )
+        else:
+            log_event("mongo.slow_query", logging.WARNING, crud_function=crud_function, command=event.command_name,
+                      collection=entry["collection"], duration_ms=round(entry["duration_ms"], 1))
+
+
+def get_slow_queries(limit: int = 50) -> List[Dict[str, Any]]:
+    """ Most recent slow queries first. """
+    return list(reversed(slow_queries))[:limit]
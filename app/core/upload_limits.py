@@ -0,0 +1,49 @@
+import re
+
+from fastapi import HTTPException, status
+from fastapi.responses import JSONResponse
+
+from app.core.config import settings
+
+# The direct upload endpoint checks MAX_UPLOAD_SIZE while it streams the file to storage, but by then
+# Starlette has already spooled the whole multipart body to a temporary file. This middleware
+# enforces the limit on the request body itself, before (and while) it is parsed.
+
+UPLOAD_PATH = re.compile(r"^/api/assignments/[^/]+/submissions/upload$")
+MULTIPART_OVERHEAD = 64 * 1024 # Boundaries, part headers and the notes field on top of the file
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware rejecting direct uploads larger than MAX_UPLOAD_SIZE with 413: up front when
+    Content-Length is over the limit, otherwise as soon as the received body goes over it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] != "POST" or not UPLOAD_PATH.match(scope["path"]):
+            await self.app(scope, receive, send)
+            return
+
+        limit = settings.MAX_UPLOAD_SIZE + MULTIPART_OVERHEAD
+        detail = f"File exceeds the {settings.MAX_UPLOAD_SIZE} byte upload limit"
+        content_length = dict(scope.get("headers", [])).get(b"content-length", b"")
+        if content_length.isdigit() and int(content_length) > limit:
+            response = JSONResponse({"detail": detail}, status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+            await response(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit: # Chunked or understated Content-Length
+                    raise HTTPException(status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
@@ -1,29 +1,79 @@
-from motor.motor_asyncio import AsyncIOMotorCollection
-from app.db.database import get_assignment_collection
-from app.schemas.assignment import AssignmentCreate, AssignmentInDB, AssignmentUpdate
+from app.db.database import (
+    get_assignment_collection,
+    get_membership_collection,
+    get_submission_collection,
+    get_team_collection,
+)
+from app.core.cache import invalidate_team
+from app.core.events import assignment_event, emit
+from app.core.profiler import profiled
+from app.crud.crud_stats import init_assignment_stats
+from app.schemas.assignment import AssignmentCreate, AssignmentFeedItem, AssignmentInDB, AssignmentUpdate
+from datetime import datetime, timezone
 import uuid
 from typing import List, Optional
 
-assignment_collection: AsyncIOMotorCollection = get_assignment_collection()
 
+@profiled
 async def create_assignment(assignment_in: AssignmentCreate) -> AssignmentInDB:
     assignment_id = str(uuid.uuid4())
     assignment_db_data = assignment_in.model_dump()
     assignment_db_data["_id"] = assignment_id
 
-    await assignment_collection.insert_one(assignment_db_data)
+    await get_assignment_collection().insert_one(assignment_db_data)
+    await init_assignment_stats(assignment_id, assignment_in.team_id, assignment_in.due_date)
+    await invalidate_team(assignment_in.team_id)
+    emit(assignment_event(assignment_db_data))
     created_assignment = await get_assignment_by_id(assignment_id)
     if not created_assignment:
         raise Exception("Failed to retrieve created assignment")
     return created_assignment
 
+@profiled
 async def get_assignment_by_id(assignment_id: str) -> AssignmentInDB | None:
-    assignment = await assignment_collection.find_one({"_id": assignment_id})
+    assignment = await get_assignment_collection().find_one({"_id": assignment_id})
     return AssignmentInDB(**assignment) if assignment else None
 
+@profiled
 async def get_assignments_for_team(team_id: str) -> List[AssignmentInDB]:
-    assignments_cursor = assignment_collection.find({"team_id": team_id})
+    assignments_cursor = get_assignment_collection().find({"team_id": team_id})
     assignments = await assignments_cursor.to_list(length=None)
     return [AssignmentInDB(**assignment) for assignment in assignments]
 
+@profiled
+async def get_feed_for_student(user_id: str, skip: int = 0, limit: int = 20, include_past: bool = False) -> List[AssignmentFeedItem]:
+    """
+    Assignments across all of the user's teams, soonest due first (undated last), each with the
+    user's own submission status. One aggregation: memberships -> assignments -> submission/team.
+    """
+    due_filter = {} if include_past else {"$or": [{"assignment.due_date": {"$gte": datetime.now(timezone.utc)}}, {"assignment.due_date": None}]}
+    pipeline = [
+        {"$match": {"user_id": user_id}},
+        # The server folds the $unwind and the due_date $match into the lookup, served by the (team_id, due_date) index
+        {"$lookup": {"from": get_assignment_collection().name, "localField": "team_id", "foreignField": "team_id", "as": "assignment"}},
+        {"$unwind": "$assignment"},
+        {"$match": due_filter},
+        {"$replaceRoot": {"newRoot": "$assignment"}},
+        {"$addFields": {"has_due_date": {"$ne": [{"$ifNull": ["$due_date", None]}, None]}}},
+        {"$sort": {"has_due_date": -1, "due_date": 1, "_id": 1}},
+        {"$skip": skip},
+        {"$limit": limit},
+        # Only the page is joined with submissions (by their predictable _id, see generate_submission_doc_id) and teams
+        {"$addFields": {"submission_id": {"$concat": ["sub_", "$_id", "_", user_id]}}},
+        {"$lookup": {"from": get_submission_collection().name, "localField": "submission_id", "foreignField": "_id", "as": "submission"}},
+        {"$lookup": {"from": get_team_collection().name, "localField": "team_id", "foreignField": "_id", "as": "team"}},
+        {"$project": {
+            "title": 1, "description": 1, "due_date": 1, "keep_versions": 1, "keep_versions_days": 1,
+            "team_id": 1, "created_at": 1, "updated_at": 1,
+            "team_name": {"$arrayElemAt": ["$team.name", 0]},
+            "submission": {"$arrayElemAt": [{"$map": {
+                # Deleted submissions are kept as tombstones by sync: not a submission for the feed
+                "input": {"$filter": {"input": "$submission", "as": "doc", "cond": {"$ne": [{"$ifNull": ["$$doc._deleted", False]}, True]}}},
+                "in": {"current_version": "$$this.current_version", "last_updated_at": "$$this.last_updated_at"}
+            }}, 0]}
+        }}
+    ]
+    items = await get_membership_collection().aggregate(pipeline).to_list(length=None)
+    return [AssignmentFeedItem(**item) for item in items]
+
 # Add update_assignment function if needed (check admin/creator permission)
\ No newline at end of file
@@ -0,0 +1,68 @@
+from app.db.database import get_sync_checkpoint_collection
+from app.core.profiler import profiled
+from datetime import datetime, timezone
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+from typing import Any, Dict
+
+# _local documents (replication checkpoints). Like CouchDB's, they are never replicated: they live
+# in their own collection, scoped per sync db_name, and never show up in _bulk_docs, _revs_diff or
+# _changes. Revisions are "0-N" with N counting the writes, as in CouchDB.
+
+def _checkpoint_id(db_name: str, local_id: str) -> str:
+    return f"{db_name}|{local_id}"
+
+def _parse_local_rev(rev: str) -> int | None:
+    prefix, _, number = rev.partition("-")
+    return int(number) if prefix == "0" and number.isdigit() else None
+
+def _to_local_doc(checkpoint: Dict[str, Any]) -> Dict[str, Any]:
+    return {**checkpoint["body"], "_id": f"_local/{checkpoint['local_id']}", "_rev": f"0-{checkpoint['rev_number']}"}
+
+@profiled
+async def get_local_doc(db_name: str, local_id: str) -> Dict[str, Any] | None:
+    checkpoint = await get_sync_checkpoint_collection().find_one({"_id": _checkpoint_id(db_name, local_id)})
+    return _to_local_doc(checkpoint) if checkpoint else None
+
+@profiled
+async def put_local_doc(db_name: str, local_id: str, doc: Dict[str, Any]) -> str | None:
+    """
+    Create or update a _local doc. The doc's _rev must be the current revision (none to create it).
+    Returns the new revision, or None on a revision conflict.
+    """
+    now = datetime.now(timezone.utc)
+    body = {key: value for key, value in doc.items() if key not in ("_id", "_rev")}
+    checkpoint_id = _checkpoint_id(db_name, local_id)
+    rev = doc.get("_rev")
+    if not rev:
+        try:
+            await get_sync_checkpoint_collection().insert_one({
+                "_id": checkpoint_id, "db_name": db_name, "local_id": local_id,
+                "rev_number": 1, "body": body, "updated_at": now
+            })
+        except DuplicateKeyError:
+            return None
+        return "0-1"
+
+    rev_number = _parse_local_rev(rev)
+    if rev_number is None:
+        return None
+    # Compare-and-set on the revision, so two replications of the same db cannot interleave writes
+    checkpoint = await get_sync_checkpoint_collection().find_one_and_update(
+        {"_id": checkpoint_id, "rev_number": rev_number},
+        {"$set": {"body": body, "updated_at": now}, "$inc": {"rev_number": 1}},
+        projection={"rev_number": 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return f"0-{checkpoint['rev_number']}" if checkpoint else None
+
+@profiled
+async def delete_local_doc(db_name: str, local_id: str, rev: str) -> bool:
+    """ Delete a _local doc at revision 'rev'. Returns False if it does not exist at that revision. """
+    rev_number = _parse_local_rev(rev)
+    if rev_number is None:
+        return False
+    result = await get_sync_checkpoint_collection().delete_one(
+        {"_id": _checkpoint_id(db_name, local_id), "rev_number": rev_number}
+    )
+    return result.deleted_count > 0
@@ -0,0 +1,64 @@
+from app.db.database import get_assignment_collection, get_submission_archive_collection, get_submission_collection
+from app.core.profiler import profiled
+from app.crud.crud_submission import generate_revision
+from datetime import datetime, timezone
+from pymongo import ReplaceOne
+from typing import Any, Dict, List, Optional, Tuple
+
+# Data access for the compaction job (app/services/compaction.py). Archived versions are upserted
+# into submission_archive under deterministic _ids before the submission is trimmed, so a run
+# interrupted between the two steps just archives the same versions again.
+
+@profiled
+async def get_retention_overrides() -> Dict[str, Tuple[Optional[int], Optional[int]]]:
+    """ (keep_versions, keep_versions_days) of the assignments that override the default retention. """
+    cursor = get_assignment_collection().find(
+        {"$or": [{"keep_versions": {"$ne": None}}, {"keep_versions_days": {"$ne": None}}]},
+        {"keep_versions": 1, "keep_versions_days": 1}
+    )
+    return {assignment["_id"]: (assignment.get("keep_versions"), assignment.get("keep_versions_days")) async for assignment in cursor}
+
+@profiled
+async def find_submissions_with_versions_over(keep_versions: int, after_id: str | None, limit: int) -> List[Dict[str, Any]]:
+    """ Submissions (by ascending _id, after 'after_id') holding more than 'keep_versions' versions. """
+    query: Dict[str, Any] = {f"versions.{keep_versions}": {"$exists": True}, "_deleted": {"$ne": True}}
+    if after_id is not None:
+        query["_id"] = {"$gt": after_id}
+    return await get_submission_collection().find(query).sort("_id", 1).limit(limit).to_list(length=None)
+
+@profiled
+async def archive_versions(submission: Dict[str, Any], archived: List[Dict[str, Any]]) -> Dict[str, Any] | None:
+    """
+    Move the 'archived' versions of a raw submission to the archive. Returns the trimmed submission,
+    or None if it changed since it was read (it is then left alone until the next run).
+    """
+    now = datetime.now(timezone.utc)
+    await get_submission_archive_collection().bulk_write([
+        ReplaceOne({"_id": f"{submission['_id']}|v{version.get('version')}"}, {
+            "kind": "version",
+            "submission_id": submission["_id"],
+            "assignment_id": submission.get("assignment_id"),
+            "student_id": submission.get("student_id"),
+            "team_id": submission.get("team_id"),
+            "version": version,
+            "archived_at": now,
+        }, upsert=True)
+        for version in archived
+    ], ordered=False)
+
+    archived_ids = {id(version) for version in archived}
+    trimmed = {
+        **submission,
+        "versions": [version for version in submission["versions"] if id(version) not in archived_ids],
+        # Keeps the assignment stats' version totals unchanged (see crud_stats.submission_summary)
+        "archived_version_count": submission.get("archived_version_count", 0) + len(archived),
+    }
+    if submission.get("_rev"): # Sync docs get a new revision, so replicas pick up the trimmed history
+        trimmed["_rev"] = generate_revision(trimmed, parent_rev=submission["_rev"])
+    # Compare-and-set: a concurrent write (new version, sync push) wins over the compaction
+    result = await get_submission_collection().replace_one(
+        {"_id": submission["_id"], "_rev": submission.get("_rev"),
+         "current_version": submission.get("current_version"), "last_updated_at": submission.get("last_updated_at")},
+        trimmed
+    )
+    return trimmed if result.modified_count else None
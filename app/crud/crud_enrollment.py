@@ -0,0 +1,37 @@
+from app.db.database import get_enrollment_job_collection
+from app.core.profiler import profiled
+from app.schemas.team import EnrollmentJob, EnrollmentRowResult
+from datetime import datetime, timezone
+from typing import List
+
+
+@profiled
+async def create_job(job: EnrollmentJob):
+    await get_enrollment_job_collection().insert_one(job.model_dump(by_alias=True))
+
+@profiled
+async def get_job(team_id: str, job_id: str) -> EnrollmentJob | None:
+    job = await get_enrollment_job_collection().find_one({"_id": job_id, "team_id": team_id})
+    return EnrollmentJob(**job) if job else None
+
+@profiled
+async def set_job_status(job_id: str, status: str, error: str | None = None):
+    await get_enrollment_job_collection().update_one(
+        {"_id": job_id},
+        {"$set": {"status": status, "error": error, "updated_at": datetime.now(timezone.utc)}}
+    )
+
+@profiled
+async def record_progress(job_id: str, results: List[EnrollmentRowResult]):
+    """ Append one batch of row results so pollers see progress. """
+    await get_enrollment_job_collection().update_one(
+        {"_id": job_id},
+        {
+            "$push": {"results": {"$each": [result.model_dump() for result in results]}},
+            "$inc": {
+                "processed": len(results),
+                "enrolled_count": sum(1 for result in results if result.status == "enrolled")
+            },
+            "$set": {"updated_at": datetime.now(timezone.utc)}
+        }
+    )
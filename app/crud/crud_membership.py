@@ -0,0 +1,67 @@
+from app.db.database import get_membership_collection, get_team_collection
+from app.core.cache import invalidate_team
+from app.core.profiler import profiled
+from app.schemas.team import MembershipInDB
+from pymongo.errors import BulkWriteError, DuplicateKeyError
+from typing import List
+
+DUPLICATE_KEY_ERROR = 11000
+
+# Deterministic id: one membership per team/user, and membership checks are _id lookups
+def membership_id(team_id: str, user_id: str) -> str:
+    return f"{team_id}:{user_id}"
+
+@profiled
+async def get_membership(team_id: str, user_id: str) -> MembershipInDB | None:
+    membership = await get_membership_collection().find_one({"_id": membership_id(team_id, user_id)})
+    return MembershipInDB(**membership) if membership else None
+
+async def insert_membership(team_id: str, user_id: str, role: str = "member") -> bool:
+    """ Insert the membership document only. Returns False if the user already is a member. """
+    membership = MembershipInDB(_id=membership_id(team_id, user_id), team_id=team_id, user_id=user_id, role=role)
+    try:
+        await get_membership_collection().insert_one(membership.model_dump(by_alias=True))
+    except DuplicateKeyError:
+        return False
+    return True
+
+@profiled
+async def add_membership(team_id: str, user_id: str, role: str = "member", count: bool = True) -> bool:
+    """
+    Add the user to the team. Returns False if they already are a member.
+    count=False skips the member_count update, for teams created with the count already set.
+    """
+    if not await insert_membership(team_id, user_id, role):
+        return False
+    if count:
+        await get_team_collection().update_one({"_id": team_id}, {"$inc": {"member_count": 1}})
+    await invalidate_team(team_id)
+    return True
+
+@profiled
+async def add_memberships(team_id: str, user_ids: List[str]) -> List[str]:
+    """ Add several users to the team with one unordered insert. Returns the ids that were not members yet. """
+    if not user_ids:
+        return []
+    memberships = [
+        MembershipInDB(_id=membership_id(team_id, user_id), team_id=team_id, user_id=user_id).model_dump(by_alias=True)
+        for user_id in user_ids
+    ]
+    existing = set()
+    try:
+        await get_membership_collection().insert_many(memberships, ordered=False)
+    except BulkWriteError as e:
+        for error in e.details.get("writeErrors", []):
+            if error.get("code") != DUPLICATE_KEY_ERROR:
+                raise
+            existing.add(user_ids[error["index"]])
+    added = [user_id for user_id in user_ids if user_id not in existing]
+    if added:
+        await get_team_collection().update_one({"_id": team_id}, {"$inc": {"member_count": len(added)}})
+        await invalidate_team(team_id)
+    return added
+
+@profiled
+async def get_member_ids(team_id: str) -> List[str]:
+    cursor = get_membership_collection().find({"team_id": team_id}, {"user_id": 1}).sort("joined_at", 1)
+    return [membership["user_id"] async for membership in cursor]
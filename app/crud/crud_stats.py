@@ -0,0 +1,117 @@
+from app.db.database import get_assignment_stats_collection
+from app.core.log import log_event
+from app.core.profiler import profiled
+from app.schemas.assignment import AssignmentStatsInDB
+import logging
+from datetime import datetime, timezone
+from pymongo import UpdateOne
+from typing import Any, Dict, List, Optional, Tuple
+
+# Per-assignment submission counters, kept up to date by the submission write paths in
+# crud_submission so that stats reads are a single _id lookup. Drift (e.g. after a due date
+# change or a failed counter update) is repaired with: python -m app.db.migrations assignment_stats
+
+# (assignment_id, submission before the write, submission after the write); None = no submission
+SubmissionChange = Tuple[str, Optional[Dict[str, Any]], Optional[Dict[str, Any]]]
+
+def submission_summary(submission: Optional[Dict[str, Any]]) -> Tuple[int, Optional[datetime]]:
+    """
+    (number of versions, submitted_at of the current version) of a raw submission document.
+    Versions moved to the archive by compaction still count.
+    """
+    if not submission or submission.get("_deleted", False):
+        return 0, None
+    versions = submission.get("versions") or []
+    if not versions:
+        return 0, None
+    current = next((v for v in reversed(versions) if v.get("version") == submission.get("current_version")), versions[-1])
+    submitted_at = current.get("submitted_at")
+    if isinstance(submitted_at, str): # Docs pushed through sync keep client ISO strings
+        submitted_at = datetime.fromisoformat(submitted_at)
+    if submitted_at and submitted_at.tzinfo is None:
+        submitted_at = submitted_at.replace(tzinfo=timezone.utc)
+    return len(versions) + submission.get("archived_version_count", 0), submitted_at
+
+def _late(submitted_at: Optional[datetime]):
+    """ Expression evaluating to 1 if submitted_at is after the stats doc's due_date. """
+    if submitted_at is None:
+        return 0
+    return {"$cond": [
+        {"$and": [{"$ne": [{"$ifNull": ["$due_date", None]}, None]}, {"$gt": [submitted_at, "$due_date"]}]}, 1, 0
+    ]}
+
+def _stats_update(changes: List[SubmissionChange], now: datetime) -> list | None:
+    """ Pipeline update applying the changes of one assignment, or None if nothing changes. """
+    submitted_delta, version_delta, late_terms = 0, 0, []
+    for _, before, after in changes:
+        before_versions, before_submitted_at = submission_summary(before)
+        after_versions, after_submitted_at = submission_summary(after)
+        submitted_delta += (after_versions > 0) - (before_versions > 0)
+        version_delta += after_versions - before_versions
+        if before_submitted_at != after_submitted_at:
+            late_terms.append({"$subtract": [_late(after_submitted_at), _late(before_submitted_at)]})
+    if not submitted_delta and not version_delta and not late_terms:
+        return None
+    return [{"$set": {
+        "submitted_count": {"$add": [{"$ifNull": ["$submitted_count", 0]}, submitted_delta]},
+        "version_count": {"$add": [{"$ifNull": ["$version_count", 0]}, version_delta]},
+        "late_count": {"$add": [{"$ifNull": ["$late_count", 0]}, *late_terms]},
+        "updated_at": now
+    }}]
+
+@profiled
+async def init_assignment_stats(assignment_id: str, team_id: str, due_date: datetime | None):
+    await get_assignment_stats_collection().update_one(
+        {"_id": assignment_id},
+        {
+            "$set": {"team_id": team_id, "due_date": due_date},
+            "$setOnInsert": {"submitted_count": 0, "late_count": 0, "version_count": 0}
+        },
+        upsert=True
+    )
+
+@profiled
+async def apply_submission_changes(changes: List[SubmissionChange]):
+    """
+    Fold submission writes into their assignments' counters with one round trip.
+    Counters are secondary data: failures are logged, not raised, and repaired by a rebuild.
+    """
+    now = datetime.now(timezone.utc)
+    by_assignment: Dict[str, List[SubmissionChange]] = {}
+    for change in changes:
+        if change[0]:
+            by_assignment.setdefault(change[0], []).append(change)
+    operations = []
+    for assignment_id, assignment_changes in by_assignment.items():
+        update = _stats_update(assignment_changes, now)
+        if update:
+            operations.append(UpdateOne({"_id": assignment_id}, update, upsert=True))
+    if not operations:
+        return
+    try:
+        await get_assignment_stats_collection().bulk_write(operations, ordered=False)
+    except Exception as e:
+        log_event("stats.update_failed", logging.WARNING, exc_info=e, assignment_ids=list(by_assignment))
+
+@profiled
+async def get_assignment_stats(assignment_id: str) -> AssignmentStatsInDB | None:
+    stats = await get_assignment_stats_collection().find_one({"_id": assignment_id})
+    return AssignmentStatsInDB(**stats) if stats else None
+
+@profiled
+async def rebuild_assignment_stats(assignment: Dict[str, Any], submissions: List[Dict[str, Any]]) -> AssignmentStatsInDB:
+    """ Recompute an assignment's counters from its submissions and overwrite the stats doc. """
+    due_date = assignment.get("due_date")
+    if due_date and due_date.tzinfo is None:
+        due_date = due_date.replace(tzinfo=timezone.utc)
+    stats = AssignmentStatsInDB(_id=assignment["_id"], team_id=assignment.get("team_id"), due_date=due_date,
+                                updated_at=datetime.now(timezone.utc))
+    for submission in submissions:
+        versions, submitted_at = submission_summary(submission)
+        if versions:
+            stats.submitted_count += 1
+            stats.version_count += versions
+            if due_date and submitted_at and submitted_at > due_date:
+                stats.late_count += 1
+    await get_assignment_stats_collection().replace_one({"_id": stats.id}, stats.model_dump(by_alias=True), upsert=True)
+    return stats
@@ -1,5 +1,10 @@
-from motor.motor_asyncio import AsyncIOMotorCollection
 from app.db.database import get_submission_collection
+from app.core.profiler import profiled
+from app.core.config import settings
+from app.core.events import emit, submission_event
+from app.core.log import log_event
+from app.core.metrics import sync_bulk_docs_total
+from app.crud.crud_stats import SubmissionChange, apply_submission_changes
 from app.schemas.submission import (
     SubmissionCreate,
     SubmissionInDB,
@@ -8,35 +13,131 @@ from app.schemas.submission import (
 )
 # Import PouchDocument from sync schema
 from app.schemas.sync import PouchDocument
-import uuid
+from app.services.attachments import MissingStubError, revision_generation, store_inline_attachments
+from app.services.storage import get_storage_backend
+from app.services.sync_resolvers import get_resolver
+import hashlib
+import json
+import logging
 from datetime import datetime, timezone
 from typing import List, Optional, Dict, Any
-from pymongo.results import UpdateResult
-
-
-submission_collection: AsyncIOMotorCollection = get_submission_collection()
+from pymongo import ReplaceOne, ReturnDocument
+from pymongo.errors import BulkWriteError
 
 # Generate ID for submission document (consistent per student per assignment)
 def generate_submission_doc_id(assignment_id: str, student_id: str) -> str:
      # Using a predictable ID helps PouchDB manage the same logical submission
      return f"sub_{assignment_id}_{student_id}"
 
+def split_submission_doc_id(doc_id: str) -> tuple[str | None, str | None]:
+    """ (assignment_id, student_id) of an id made by generate_submission_doc_id. """
+    prefix, _, rest = doc_id.partition("_")
+    assignment_id, _, student_id = rest.partition("_")
+    if prefix != "sub" or not assignment_id or not student_id:
+        return None, None
+    return assignment_id, student_id
+
+def make_tombstone(doc_id: str, rev: str, deleted_at: datetime) -> Dict[str, Any]:
+    """
+    What is kept of a deleted sync document: enough for replicas to learn about the deletion instead
+    of pushing the document back. Purged after SYNC_TOMBSTONE_RETENTION_DAYS (TTL index on deleted_at).
+    """
+    return {"_id": doc_id, "_rev": rev, "_deleted": True, "deleted_at": deleted_at}
+
+def is_resurrection(existing_doc: Dict[str, Any] | None, doc: Dict[str, Any]) -> bool:
+    """ Does 'doc' re-create a deleted document without descending from its deletion? """
+    if not existing_doc or not existing_doc.get("_deleted", False) or doc.get("_deleted", False):
+        return False
+    return revision_generation(doc.get("_rev")) <= revision_generation(existing_doc.get("_rev")) \
+        and doc.get("_rev") != existing_doc.get("_rev")
+
+def revision_history(doc: Dict[str, Any]) -> set[str]:
+    """ The revs listed in a doc's _revisions (sent by PouchDB with new_edits=false). """
+    revisions = doc.get("_revisions") or {}
+    start, ids = revisions.get("start"), revisions.get("ids") or []
+    if not isinstance(start, int):
+        return set()
+    return {f"{start - index}-{rev_id}" for index, rev_id in enumerate(ids)}
+
+def classify_replicated_rev(held_doc: Dict[str, Any] | None, doc: Dict[str, Any]) -> str:
+    """
+    How a replicated revision relates to the one the server holds:
+    "new" (nothing held), "same", "descendant" (replaces it), "ancestor" (stale) or "divergent".
+    Without a _revisions history a higher generation is taken to descend from the held rev.
+    """
+    if not held_doc:
+        return "new"
+    held_rev, rev = held_doc.get("_rev"), doc["_rev"]
+    if held_rev == rev:
+        return "same"
+    if held_rev in revision_history(doc) or \
+            (not doc.get("_revisions") and revision_generation(rev) > revision_generation(held_rev)):
+        return "descendant"
+    if rev in revision_history(held_doc) or \
+            (not doc.get("_revisions") and revision_generation(rev) < revision_generation(held_rev)):
+        return "ancestor"
+    return "divergent"
+
+def merged_revision(held_doc: Dict[str, Any], doc: Dict[str, Any], merged: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    A resolver's merge of two divergent replicated branches, as a new revision on top of the winning
+    branch, with a _revisions history so replicas see it descend from that branch. Its generation is
+    above both leaves, so replicas holding the losing one pick it as the winner too.
+    """
+    parent = doc if replicated_rev_wins(held_doc, doc) else held_doc
+    rev = generate_revision(merged, parent_rev=parent["_rev"])
+    history = (parent.get("_revisions") or {}).get("ids") or [parent["_rev"].split("-", 1)[-1]]
+    return {**merged, "_rev": rev, "_revisions": {"start": revision_generation(rev), "ids": [rev.split("-", 1)[1], *history]}}
+
+def replicated_rev_wins(held_doc: Dict[str, Any], doc: Dict[str, Any]) -> bool:
+    """ CouchDB's deterministic winner between two branches: higher generation, then higher rev string. """
+    held_rev, rev = held_doc.get("_rev") or "", doc["_rev"]
+    return (revision_generation(rev), rev) > (revision_generation(held_rev), held_rev)
+
+def emit_submission_changes(changes: List[SubmissionChange]):
+    """ Live update events for (assignment_id, before, after) changes, as passed to apply_submission_changes. """
+    for _, before, after in changes:
+        if after is not None and not after.get("_deleted", False):
+            emit(submission_event(after))
+        elif before is not None or after is not None:
+            # Tombstones may carry nothing but _id/_rev: fill in student/team from the held doc
+            emit(submission_event({**(before or {}), **(after or {})}, deleted=True))
+
+def get_latest_version(submission: SubmissionInDB) -> SubmissionVersion | None:
+    return next((v for v in reversed(submission.versions) if v.version == submission.current_version), None)
+
+def is_unchanged_upload(submission: SubmissionInDB, content_hash: Optional[str]) -> bool:
+    """ True if content_hash matches the submission's current version, i.e. the same file again. """
+    if not content_hash:
+        return False
+    latest_version = get_latest_version(submission)
+    return latest_version is not None and latest_version.content_hash == content_hash
+
+@profiled
 async def get_submission_by_doc_id(doc_id: str) -> SubmissionInDB | None:
-    submission = await submission_collection.find_one({"_id": doc_id})
+    submission = await get_submission_collection().find_one({"_id": doc_id, "_deleted": {"$ne": True}}) # Not tombstones
+    return _submission_from_doc(submission) if submission else None
+
+def _submission_from_doc(submission: Dict[str, Any]) -> SubmissionInDB:
     # Manually handle potential alias if needed during retrieval if model validation fails
-    if submission and '_id' in submission:
+    if '_id' in submission:
          submission['id'] = submission['_id']
-    if submission and '_rev' in submission:
+    if '_rev' in submission:
          submission['rev'] = submission['_rev']
-    return SubmissionInDB.model_validate(submission) if submission else None # Use model_validate in Pydantic v2
+    return SubmissionInDB.model_validate(submission) # Use model_validate in Pydantic v2
 
+@profiled
 async def create_submission(submission_in: SubmissionCreate, student_id: str) -> SubmissionInDB:
     doc_id = generate_submission_doc_id(submission_in.assignment_id, student_id)
     now = datetime.now(timezone.utc)
 
-    # Check if submission already exists (e.g., due to sync race condition)
-    existing_submission = await get_submission_by_doc_id(doc_id)
+    # Check if submission already exists (e.g., due to sync race condition); a tombstone is replaced
+    existing_doc = await get_sync_doc(doc_id)
+    existing_submission = _submission_from_doc(dict(existing_doc)) if existing_doc and not existing_doc.get("_deleted") else None
     if existing_submission:
+        # Same file submitted twice (double click, client retry): nothing to write
+        if is_unchanged_upload(existing_submission, submission_in.content_hash):
+            return existing_submission
         # This shouldn't happen if UI prevents creating twice, but handle defensively
         # Maybe update instead? Or raise error? For now, let's raise.
         raise ValueError(f"Submission document {doc_id} already exists.")
@@ -49,14 +150,9 @@ async def create_submission(submission_in: SubmissionCreate, student_id: str) ->
         notes=submission_in.notes
     )
 
-    # NOTE: The initial _rev is typically set by CouchDB/PouchDB.
-    # When creating directly in MongoDB, we don't usually set it,
-    # but for sync compatibility, we might need a strategy.
-    # For simplicity here, we'll let the sync logic handle revisions.
-    # A placeholder 'rev' might be needed if Pouch expects it immediately.
     submission_db = SubmissionInDB(
         _id=doc_id, # Set _id explicitly
-        rev=None, # Let sync process handle initial rev? Or generate "1-hash"?
+        rev=None, # Set below, from the content
         assignment_id=submission_in.assignment_id,
         student_id=student_id,
         team_id=submission_in.team_id,
@@ -67,13 +163,19 @@ async def create_submission(submission_in: SubmissionCreate, student_id: str) ->
 
     # Use model_dump to get dict, respecting aliases
     submission_dict = submission_db.model_dump(by_alias=True)
+    # Like a sync edit: replicas see a re-created submission descend from its deletion
+    submission_dict["_rev"] = generate_revision(submission_dict, parent_rev=existing_doc["_rev"] if existing_doc else None)
 
-    await submission_collection.insert_one(submission_dict)
+    # Replaces the tombstone of a previously deleted submission, if any; a live doc fails with DuplicateKeyError
+    await get_submission_collection().replace_one({"_id": doc_id, "_deleted": True}, submission_dict, upsert=True)
+    await apply_submission_changes([(submission_in.assignment_id, None, submission_dict)])
+    emit(submission_event(submission_dict))
     created_submission = await get_submission_by_doc_id(doc_id)
     if not created_submission:
         raise Exception("Failed to retrieve created submission")
     return created_submission
 
+@profiled
 async def add_new_submission_version(
     doc_id: str,
     version_data: SubmissionUploadNewVersion,
@@ -90,47 +192,110 @@ async def add_new_submission_version(
         notes=version_data.notes
     )
 
-    # Use optimistic locking: only update if current_version matches expected
-    result: UpdateResult = await submission_collection.update_one(
-        {"_id": doc_id, "current_version": expected_current_version},
-        {
-            "$push": {"versions": new_version.model_dump()},
-            "$set": {
-                "current_version": new_version_number,
-                "last_updated_at": now
-                # IMPORTANT: The _rev field should be updated by the sync logic
-                # when this change is processed via _bulk_docs, not here directly.
-            }
-        }
-    )
-
-    if result.matched_count == 0:
-        # Either doc not found OR current_version didn't match (concurrency issue)
-        existing = await get_submission_by_doc_id(doc_id)
+    # The new revision is derived from the new content, so the document is read first and replaced
+    # only if it is still that revision (compare-and-set, like a sync push)
+    before = await get_submission_collection().find_one({"_id": doc_id, "_deleted": {"$ne": True}})
+    existing = _submission_from_doc(dict(before)) if before else None
+    if existing and is_unchanged_upload(existing, version_data.content_hash):
+        return existing # Re-upload of the current file, no new version
+    if existing is None or existing.current_version != expected_current_version:
         if existing:
-            print(f"Optimistic lock failed for {doc_id}. Expected version {expected_current_version}, found {existing.current_version}")
+            log_event("submission.lock_conflict", doc_id=doc_id, expected_version=expected_current_version,
+                      found_version=existing.current_version)
+        return None
+
+    after = {
+        **before,
+        "versions": [*before.get("versions", []), new_version.model_dump()],
+        "current_version": new_version_number,
+        "last_updated_at": now,
+    }
+    after["_rev"] = generate_revision(after, parent_rev=before.get("_rev"))
+    result = await get_submission_collection().replace_one(
+        {"_id": doc_id, "_rev": before.get("_rev"), "current_version": expected_current_version,
+         "last_updated_at": before.get("last_updated_at")},
+        after
+    )
+    if not result.modified_count:
+        # Changed since it was read (concurrency issue)
+        log_event("submission.lock_conflict", doc_id=doc_id, expected_version=expected_current_version)
         return None
 
-    # Fetch the updated document
-    updated_submission = await get_submission_by_doc_id(doc_id)
+    # The stats see the state the replace applied to, without a re-fetch
+    await apply_submission_changes([(before.get("assignment_id"), before, after)])
+    updated_submission = _submission_from_doc(dict(after))
+    emit(submission_event(updated_submission.model_dump(by_alias=True)))
     return updated_submission
 
 
+@profiled
+async def find_duplicate_submissions(assignment_id: str) -> List[Dict[str, Any]]:
+    """
+    Groups of students who submitted identical files (same content_hash, any version) for an
+    assignment. Served by the (assignment_id, versions.content_hash) index.
+    """
+    pipeline = [
+        {"$match": {"assignment_id": assignment_id, "versions.content_hash": {"$nin": [None, ""]}}},
+        {"$unwind": "$versions"},
+        {"$match": {"versions.content_hash": {"$nin": [None, ""]}}},
+        {"$group": {"_id": "$versions.content_hash", "student_ids": {"$addToSet": "$student_id"}}},
+        {"$match": {"student_ids.1": {"$exists": True}}}, # Shared by at least two students
+        {"$project": {"_id": 0, "content_hash": "$_id", "student_ids": 1}},
+        {"$sort": {"content_hash": 1}},
+    ]
+    return await get_submission_collection().aggregate(pipeline).to_list(length=None)
+
+
 # --- Functions for Sync Endpoint ---
 
+@profiled
 async def get_docs_by_ids(doc_ids: List[str]) -> Dict[str, Dict[str, Any]]:
     """ Fetches multiple documents by their _ids, returning raw dicts. """
-    docs_cursor = submission_collection.find({"_id": {"$in": doc_ids}})
+    docs_cursor = get_submission_collection().find({"_id": {"$in": doc_ids}})
     docs_list = await docs_cursor.to_list(length=None)
     return {doc["_id"]: doc for doc in docs_list}
 
+def generate_revision(doc: Dict[str, Any], parent_rev: Optional[str]) -> str:
+    """
+    CouchDB-style revision "<generation>-<md5>", derived from the parent revision, the deleted flag
+    and the document body. The same edit of the same parent always yields the same revision.
+    """
+    prefix = parent_rev.split("-", 1)[0] if parent_rev else ""
+    generation = int(prefix) + 1 if prefix.isdigit() else 1
+    body = {key: value for key, value in doc.items() if key not in ("_id", "_rev", "_deleted", "_revisions")}
+    canonical = json.dumps(
+        [parent_rev, bool(doc.get("_deleted", False)), body],
+        sort_keys=True, separators=(",", ":"), default=str
+    )
+    return f"{generation}-{hashlib.md5(canonical.encode()).hexdigest()}"
+
+def incoming_wins_lww(existing_doc: Dict[str, Any] | None, doc: Dict[str, Any], now: datetime) -> bool:
+    """ Simplified Last-Write-Wins: does the incoming doc replace what the server holds? """
+    if not existing_doc:
+         # Document doesn't exist in MongoDB, definitely write
+         return True
+    existing_ts = existing_doc.get("last_updated_at") or existing_doc.get("deleted_at") # Tombstones keep deleted_at
+    incoming_ts_str = doc.get("last_updated_at") # PouchDB might send ISO string
+    if doc.get("_deleted", False):
+         # Incoming doc is a deletion. Check if it's newer.
+         # A proper system checks revision tree; simplified: check timestamp
+         incoming_ts = datetime.fromisoformat(incoming_ts_str) if incoming_ts_str else None
+         return not existing_ts or bool(incoming_ts and incoming_ts > existing_ts) # Incoming deletion wins
+    # Incoming doc is an update. Check if it's newer than existing.
+    incoming_ts = datetime.fromisoformat(incoming_ts_str) if incoming_ts_str else now # Default to now if missing
+    # Existing document in MongoDB that is newer or same age wins
+    return not existing_ts or incoming_ts > existing_ts
+
+@profiled
 async def save_bulk_docs(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Basic bulk save/update logic for the sync endpoint.
-    Implements a simplified Last-Write-Wins based on 'last_updated_at'.
+    Concurrent edits are merged by the doc_type's conflict resolver; otherwise a simplified
+    Last-Write-Wins based on 'last_updated_at' applies.
     THIS IS A SIMPLIFIED EXAMPLE. Real CouchDB sync is more complex.
     """
     results = []
+    stats_changes = []
     now = datetime.now(timezone.utc)
 
     # Fetch existing documents matching the incoming IDs
@@ -143,75 +308,99 @@ async def save_bulk_docs(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
 
         if not doc_id or not incoming_rev:
             results.append({"id": doc_id, "error": "bad_request", "reason": "Missing _id or _rev"})
+            sync_bulk_docs_total.inc(outcome="error")
             continue
 
-        # Generate a 'winning' revision ID (e.g., incrementing prefix + hash of content)
-        # This needs a proper strategy matching CouchDB's revision handling.
-        # Simplified: Use timestamp for LWW, generate a fake new rev string
-        new_rev_prefix = int(now.timestamp()) # Example prefix
-        new_rev = f"{new_rev_prefix}-{uuid.uuid4().hex[:8]}" # Example new revision
+        # Deterministic 'winning' revision derived from the parent rev and the content
+        new_rev = generate_revision(doc, parent_rev=incoming_rev)
 
         existing_doc = existing_docs_dict.get(doc_id)
 
-        # --- Conflict Detection and Resolution (Simplified LWW) ---
-        should_write = False
-        if not existing_doc:
-             # Document doesn't exist in MongoDB, definitely write
-             should_write = True
-        elif doc.get("_deleted", False):
-             # Incoming doc is a deletion. Check if it's newer.
-             # A proper system checks revision tree; simplified: check timestamp
-             existing_ts = existing_doc.get("last_updated_at")
-             incoming_ts_str = doc.get("last_updated_at") # PouchDB might send ISO string
-             incoming_ts = datetime.fromisoformat(incoming_ts_str) if incoming_ts_str else None
-
-             if not existing_ts or (incoming_ts and incoming_ts > existing_ts):
-                 should_write = True # Incoming deletion wins
-        else:
-             # Incoming doc is an update. Check if it's newer than existing.
-             existing_ts = existing_doc.get("last_updated_at")
-             incoming_ts_str = doc.get("last_updated_at")
-             incoming_ts = datetime.fromisoformat(incoming_ts_str) if incoming_ts_str else now # Default to now if missing
+        # A replayed push (e.g. client retry after a timeout) produces the rev we already hold:
+        # acknowledge it without writing, before LWW would misreport it as a conflict
+        if existing_doc and existing_doc.get("_rev") == new_rev:
+            results.append({"ok": True, "id": doc_id, "rev": new_rev})
+            sync_bulk_docs_total.inc(outcome="unchanged")
+            continue
+
+        # A replica that has not seen the deletion pushes the document back: keep it deleted
+        if is_resurrection(existing_doc, doc):
+            results.append({"id": doc_id, "error": "conflict", "reason": "Document was deleted"})
+            sync_bulk_docs_total.inc(outcome="conflict")
+            continue
 
-             if not existing_ts or incoming_ts > existing_ts:
-                  should_write = True # Incoming update wins
-             # ELSE: Existing document in MongoDB is newer or same age, ignore incoming doc
+        # --- Conflict Detection and Resolution ---
+        # An edit made without seeing the server's revision is merged by the doc_type's resolver
+        # (see app/services/sync_resolvers.py); without one, simplified LWW decides
+        concurrent = existing_doc is not None and existing_doc.get("_rev") != incoming_rev
+        resolver = get_resolver(doc.get("doc_type")) if concurrent else None
+        merged = resolver(existing_doc, doc) if resolver else None
+        if merged is not None and merged is existing_doc and merged.get("_rev"):
+            # The server's revision already contains this edit
+            results.append({"ok": True, "id": doc_id, "rev": existing_doc["_rev"]})
+            sync_bulk_docs_total.inc(outcome="unchanged")
+            continue
+        if merged is not None:
+            doc = merged
+            parent_rev = max(existing_doc.get("_rev") or "", incoming_rev, key=revision_generation)
+            new_rev = generate_revision(merged, parent_rev=parent_rev)
+            should_write = True
+        else:
+            # An edit of the revision the server holds (e.g. a bare deletion) is applied as is
+            should_write = not concurrent or incoming_wins_lww(existing_doc, doc, now)
 
         # --- Perform Write/Delete if Necessary ---
         if should_write:
             try:
                 doc_to_write = doc.copy()
                 doc_to_write["_rev"] = new_rev # Assign the winning revision
+                if doc.get("_attachments") and not doc.get("_deleted", False):
+                    # Inline attachment bytes go to the storage backend, the document keeps stubs
+                    doc_to_write["_attachments"] = await store_inline_attachments(
+                        doc["_attachments"], (existing_doc or {}).get("_attachments"),
+                        revision_generation(new_rev), get_storage_backend()
+                    )
                 doc_to_write["last_updated_at"] = now # Ensure consistent timestamp
 
                 if doc.get("_deleted", False):
-                    # Delete the document in MongoDB
-                    delete_result = await submission_collection.delete_one({"_id": doc_id})
-                    if delete_result.deleted_count > 0:
-                         results.append({"ok": True, "id": doc_id, "rev": new_rev})
-                    else:
-                         # Maybe it was already deleted? Still return ok for sync.
-                         results.append({"ok": True, "id": doc_id, "rev": new_rev})
+                    # Keep a tombstone, so replicas still holding the document don't push it back
+                    await get_submission_collection().replace_one(
+                        {"_id": doc_id}, make_tombstone(doc_id, new_rev, now), upsert=True
+                    )
+                    results.append({"ok": True, "id": doc_id, "rev": new_rev})
 
                 else:
                     # Update or Insert (Upsert)
-                    update_result = await submission_collection.replace_one(
+                    update_result = await get_submission_collection().replace_one(
                         {"_id": doc_id},
                         doc_to_write,
                         upsert=True
                     )
                     results.append({"ok": True, "id": doc_id, "rev": new_rev})
-
+                sync_bulk_docs_total.inc(outcome="written" if merged is None else "merged")
+                stats_changes.append((
+                    doc.get("assignment_id") or (existing_doc or {}).get("assignment_id"),
+                    existing_doc,
+                    None if doc.get("_deleted", False) else doc_to_write
+                ))
+
+            except MissingStubError as e:
+                results.append({"id": doc_id, "error": "missing_stub", "reason": str(e)})
+                sync_bulk_docs_total.inc(outcome="error")
+            except ValueError as e: # Malformed or oversized attachment
+                results.append({"id": doc_id, "error": "bad_request", "reason": str(e)})
+                sync_bulk_docs_total.inc(outcome="error")
             except Exception as e:
-                print(f"Error processing doc {doc_id} in bulk_docs: {e}")
+                log_event("sync.doc_failed", logging.ERROR, exc_info=e, doc_id=doc_id)
                 results.append({"id": doc_id, "error": "internal_error", "reason": str(e)})
+                sync_bulk_docs_total.inc(outcome="error")
         else:
              # Incoming change was older/conflicting and lost LWW
              # We need to inform PouchDB there was a conflict it needs to resolve locally
              # Returning an error might trigger PouchDB's conflict handling
              # Or just don't include it in success results? Sync protocol specifics matter here.
              # For simplicity, we just don't add it to results, PouchDB might retry/resolve.
-             print(f"Doc {doc_id} conflict detected, incoming revision {incoming_rev} ignored (LWW).")
+             log_event("sync.conflict", doc_id=doc_id, incoming_rev=incoming_rev, server_rev=existing_doc.get("_rev"))
              # PouchDB expects *some* result for each doc sent. Maybe an error status?
              results.append({
                  "id": doc_id,
@@ -219,15 +408,186 @@ async def save_bulk_docs(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
                  "reason": "Document update conflict - server version is newer (LWW)"
                  # "rev": existing_doc.get("_rev") # Optionally return existing rev
                  })
+             sync_bulk_docs_total.inc(outcome="conflict")
 
-
+    await apply_submission_changes(stats_changes)
+    emit_submission_changes(stats_changes)
     return results
 
 
-async def get_doc_revisions(doc_id: str) -> List[str]:
-    """ Simplified: Fetch current revision. Real diff needs history. """
-    doc = await submission_collection.find_one({"_id": doc_id}, {"_rev": 1})
-    return [doc["_rev"]] if doc and "_rev" in doc else []
+async def _store_replicated_attachments(
+    docs: List[Dict[str, Any]],
+    held_docs: Dict[str, Dict[str, Any]],
+    errors: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """ Move inline attachments of replicated docs to storage; docs that fail are reported in 'errors'. """
+    stored = []
+    for doc in docs:
+        if not doc.get("_attachments") or doc.get("_deleted", False):
+            stored.append(doc)
+            continue
+        try:
+            attachments = await store_inline_attachments(
+                doc["_attachments"], held_docs.get(doc["_id"], {}).get("_attachments"),
+                revision_generation(doc["_rev"]), get_storage_backend()
+            )
+        except ValueError as e:
+            error = "missing_stub" if isinstance(e, MissingStubError) else "bad_request"
+            errors.append({"id": doc["_id"], "error": error, "reason": str(e)})
+            sync_bulk_docs_total.inc(outcome="error")
+            continue
+        stored.append({**doc, "_attachments": attachments})
+    return stored
+
+@profiled
+async def save_replicated_docs(docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    new_edits=false (replication mode), as used by PouchDB's replicator and for bulk import.
+    Stores the supplied revisions verbatim: no LWW, no new revs. Docs whose rev the server already
+    holds, or that are older than it (see classify_replicated_rev), are skipped; two divergent
+    branches are merged by the doc_type's resolver into a revision that wins over both leaves on
+    every replica, or else the CouchDB winner is kept. Everything else goes out in large unordered
+    bulk_writes. Like CouchDB, only failed docs are reported back, plus divergent docs whose
+    content was discarded (conflict).
+    """
+    errors = []
+    valid_docs = []
+    for doc in docs:
+        if not doc.get("_id") or not doc.get("_rev"):
+            errors.append({"id": doc.get("_id"), "error": "bad_request", "reason": "Missing _id or _rev"})
+            continue
+        if isinstance(doc.get("last_updated_at"), str): # Keep LWW comparisons working for later edits
+            doc = {**doc, "last_updated_at": datetime.fromisoformat(doc["last_updated_at"])}
+        valid_docs.append(doc)
+    if errors:
+        sync_bulk_docs_total.inc(len(errors), outcome="error")
+
+    batch_size = settings.SYNC_REPLICATION_BATCH_SIZE
+    for start in range(0, len(valid_docs), batch_size):
+        batch = valid_docs[start:start + batch_size]
+        # Revs to skip unchanged docs, plus what the assignment stats need to fold in the overwrite
+        # and whom to notify of tombstones
+        held_cursor = get_submission_collection().find(
+            {"_id": {"$in": [doc["_id"] for doc in batch]}},
+            {"_rev": 1, "_revisions": 1, "_deleted": 1, "assignment_id": 1, "student_id": 1, "team_id": 1, "_attachments": 1,
+             "current_version": 1, "versions.version": 1, "versions.submitted_at": 1, "archived_version_count": 1}
+        )
+        held_docs = {held["_id"]: held for held in await held_cursor.to_list(length=None)}
+
+        pending = []
+        divergent = []
+        for doc in batch:
+            held_doc = held_docs.get(doc["_id"])
+            relation = classify_replicated_rev(held_doc, doc)
+            if relation == "same":
+                sync_bulk_docs_total.inc(outcome="unchanged")
+            elif is_resurrection(held_doc, doc) or relation == "ancestor":
+                # A stale device's older revision (or one of a deleted doc) never replaces the server's
+                sync_bulk_docs_total.inc(outcome="conflict")
+            elif relation == "divergent":
+                divergent.append(doc)
+            else:
+                pending.append(doc)
+        merged_ids = set()
+        if divergent:
+            # Both sides edited: merged by the doc_type's resolver, else the CouchDB winner is kept
+            full_held_docs = await get_docs_by_ids([doc["_id"] for doc in divergent])
+            for doc in divergent:
+                held_doc = full_held_docs.get(doc["_id"]) or held_docs[doc["_id"]]
+                resolver = get_resolver(doc.get("doc_type"))
+                merged = resolver(held_doc, doc) if resolver else None
+                if merged is not None and merged is held_doc and not replicated_rev_wins(held_doc, doc):
+                    # The server's revision already contains it and wins over it on the client too
+                    sync_bulk_docs_total.inc(outcome="unchanged")
+                elif merged is not None:
+                    # Also when nothing changed but the incoming leaf would win on the client (e.g. a
+                    # descendant of a branch merged away earlier): otherwise the sides never converge
+                    pending.append(merged_revision(held_doc, doc, merged))
+                    merged_ids.add(doc["_id"])
+                elif replicated_rev_wins(held_doc, doc):
+                    pending.append(doc)
+                else:
+                    errors.append({"id": doc["_id"], "error": "conflict", "reason": "Divergent revision lost to the server's"})
+                    sync_bulk_docs_total.inc(outcome="conflict")
+        pending = await _store_replicated_attachments(pending, held_docs, errors)
+        if not pending:
+            continue
+
+        now = datetime.now(timezone.utc)
+        operations = [
+            ReplaceOne(
+                {"_id": doc["_id"]},
+                make_tombstone(doc["_id"], doc["_rev"], now) if doc.get("_deleted", False) else doc,
+                upsert=True
+            )
+            for doc in pending
+        ]
+        failed_indexes = set()
+        try:
+            await get_submission_collection().bulk_write(operations, ordered=False)
+        except BulkWriteError as e:
+            # Unordered: everything except the reported indexes was applied
+            write_errors = e.details.get("writeErrors", [])
+            for write_error in write_errors:
+                failed_indexes.add(write_error["index"])
+                errors.append({
+                    "id": pending[write_error["index"]]["_id"],
+                    "error": "internal_error",
+                    "reason": write_error.get("errmsg", "write failed"),
+                })
+            sync_bulk_docs_total.inc(len(write_errors), outcome="error")
+        for index, doc in enumerate(pending):
+            if index not in failed_indexes:
+                sync_bulk_docs_total.inc(outcome="merged" if doc["_id"] in merged_ids else "written")
+        changes = [
+            (doc.get("assignment_id") or held_docs.get(doc["_id"], {}).get("assignment_id"), held_docs.get(doc["_id"]), doc)
+            for index, doc in enumerate(pending) if index not in failed_indexes
+        ]
+        await apply_submission_changes(changes)
+        emit_submission_changes(changes)
+
+    return errors
+
+
+@profiled
+async def put_attachment_stub(doc_id: str, rev: str, name: str, stub: Dict[str, Any]) -> Dict[str, Any] | None:
+    """
+    Add or replace attachment 'name' of a document at revision 'rev', as a new revision whose
+    generation becomes the attachment's revpos. Returns the updated document, or None if the
+    document does not exist at that revision.
+    """
+    existing_doc = await get_submission_collection().find_one({"_id": doc_id, "_rev": rev})
+    if not existing_doc:
+        return None
+    doc = {**existing_doc, "_attachments": {
+        **existing_doc.get("_attachments", {}),
+        name: {**stub, "revpos": revision_generation(rev) + 1, "stub": True}
+    }}
+    doc["_rev"] = generate_revision(doc, parent_rev=rev)
+    doc["last_updated_at"] = datetime.now(timezone.utc)
+    # Compare-and-set on the revision: a concurrent edit makes this a conflict instead of a lost update
+    updated = await get_submission_collection().find_one_and_replace(
+        {"_id": doc_id, "_rev": rev}, doc, return_document=ReturnDocument.AFTER
+    )
+    if updated:
+        emit(submission_event(updated))
+    return updated
+
+@profiled
+async def get_sync_doc(doc_id: str) -> Dict[str, Any] | None:
+    """ Raw document as held for sync, tombstones included. """
+    return await get_submission_collection().find_one({"_id": doc_id})
+
+@profiled
+async def get_doc_revisions(doc_id: str) -> set[str]:
+    """
+    Revisions the server has of a document: its current rev (a tombstone's too) and the ancestors
+    in its stored _revisions history. Bodies of older revisions are not kept, only their ids.
+    """
+    doc = await get_submission_collection().find_one({"_id": doc_id}, {"_rev": 1, "_revisions": 1})
+    if not doc or "_rev" not in doc:
+        return set()
+    return {doc["_rev"], *revision_history(doc)}
 
 
 # Add functions for _changes feed if implementing it
@@ -1,69 +1,119 @@
 import secrets
-from motor.motor_asyncio import AsyncIOMotorCollection
-from app.db.database import get_team_collection, get_user_collection
-from app.schemas.team import TeamCreate, TeamInDB, TeamUpdate
-from app.crud.crud_user import add_team_to_user
+from app.db.database import get_membership_collection, get_team_collection, get_user_collection
+from app.core.cache import invalidate_team
+from app.core.profiler import profiled
+from app.schemas.team import EnrollmentRowResult, TeamCreate, TeamInDB, TeamPublic, TeamUpdate
+from app.crud.crud_membership import add_membership, add_memberships, insert_membership
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
 import uuid
-from typing import List, Optional
+from typing import List, Optional, Tuple
 
-team_collection: AsyncIOMotorCollection = get_team_collection()
-user_collection: AsyncIOMotorCollection = get_user_collection()
+JOIN_CODE_ATTEMPTS = 5
 
-# Generate a unique, hard-to-guess join code
-async def generate_unique_join_code(length=8):
-    while True:
-        code = secrets.token_urlsafe(length)
-        existing = await team_collection.find_one({"join_code": code})
-        if not existing:
-            return code
+# TeamPublic fields of a team document
+TEAM_PUBLIC_PROJECTION = {"name": 1, "description": 1, "admin_id": 1, "member_count": 1, "created_at": 1, "updated_at": 1}
 
+# Hard-to-guess join code; uniqueness is enforced by the unique join_code index (see create_indexes)
+def generate_join_code(length=8) -> str:
+    return secrets.token_urlsafe(length)
+
+@profiled
 async def get_team_by_id(team_id: str) -> TeamInDB | None:
-    team = await team_collection.find_one({"_id": team_id})
+    team = await get_team_collection().find_one({"_id": team_id})
     return TeamInDB(**team) if team else None
 
+@profiled
 async def get_team_by_join_code(code: str) -> TeamInDB | None:
-    team = await team_collection.find_one({"join_code": code})
+    team = await get_team_collection().find_one({"join_code": code})
     return TeamInDB(**team) if team else None
 
+@profiled
 async def get_teams_for_user(user_id: str) -> List[TeamInDB]:
-    # Find teams where user is admin or member
-    teams_cursor = team_collection.find({
-        "$or": [
-            {"admin_id": user_id},
-            {"member_ids": user_id}
-        ]
-    })
+    # Teams the user is a member of (admins have an "admin" membership), in one round trip
+    teams_cursor = get_membership_collection().aggregate([
+        {"$match": {"user_id": user_id}},
+        {"$sort": {"joined_at": 1}},
+        {"$lookup": {"from": get_team_collection().name, "localField": "team_id", "foreignField": "_id", "as": "team"}},
+        {"$unwind": "$team"},
+        {"$replaceRoot": {"newRoot": "$team"}}
+    ])
     teams = await teams_cursor.to_list(length=None) # Get all matching teams
     return [TeamInDB(**team) for team in teams]
 
 
+@profiled
+async def join_team_by_code(code: str, user_id: str) -> Tuple[Optional[TeamPublic], bool]:
+    """
+    Add the user to the team with this join code. Returns (team, joined): (None, False) for an unknown
+    code, (team, False) if the user already is a member.
+    Join used to be one find_one_and_update on join_code guarded by member_ids. Members no longer live
+    on the team document, so the guard is now the membership insert (its _id is unique per team/user),
+    and the member_count increment returns the team with the count this join produced.
+    Trade-off: three round trips without a transaction. $inc stays exact under concurrent joins (a
+    recount with $set would not), but a crash between the insert and the $inc leaves member_count, and
+    the stats' student_count, one short; `python -m app.db.migrations memberships` recounts it.
+    """
+    team = await get_team_collection().find_one({"join_code": code}, TEAM_PUBLIC_PROJECTION)
+    if not team:
+        return None, False
+    if not await insert_membership(team_id=team["_id"], user_id=user_id):
+        return TeamPublic(**team), False
+    team = await get_team_collection().find_one_and_update(
+        {"_id": team["_id"]},
+        {"$inc": {"member_count": 1}},
+        projection=TEAM_PUBLIC_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    await invalidate_team(team["_id"])
+    return TeamPublic(**team), True
+
+@profiled
 async def create_team(team_in: TeamCreate) -> TeamInDB:
     team_id = str(uuid.uuid4())
-    join_code = await generate_unique_join_code()
     team_db_data = team_in.model_dump()
     team_db_data["_id"] = team_id
-    team_db_data["join_code"] = join_code
-    team_db_data["member_ids"] = [team_in.admin_id] # Admin is also a member
+    team_db_data["member_count"] = 1 # Admin is also a member
 
-    await team_collection.insert_one(team_db_data)
-    # Add team to admin's user document
-    await add_team_to_user(user_id=team_in.admin_id, team_id=team_id)
+    # Insert and retry with a fresh code on the (rare) collision instead of checking codes up front
+    for attempt in range(JOIN_CODE_ATTEMPTS):
+        team_db_data["join_code"] = generate_join_code()
+        try:
+            await get_team_collection().insert_one(team_db_data)
+            break
+        except DuplicateKeyError as e:
+            if "join_code" not in (e.details or {}).get("keyPattern", {}) or attempt == JOIN_CODE_ATTEMPTS - 1:
+                raise
+    await add_membership(team_id=team_id, user_id=team_in.admin_id, role="admin", count=False)
 
     created_team = await get_team_by_id(team_id)
     if not created_team:
         raise Exception("Failed to retrieve created team")
     return created_team
 
-async def add_member_to_team(team_id: str, user_id: str) -> bool:
-    # Add user to team's member list
-    result_team = await team_collection.update_one(
-        {"_id": team_id},
-        {"$addToSet": {"member_ids": user_id}}
+@profiled
+async def enroll_users_by_email(team_id: str, emails: List[str]) -> List[EnrollmentRowResult]:
+    """
+    Add the users with these (validated, distinct) emails to the team.
+    Costs one $in lookup, one unordered insert and a member_count update however many emails are passed.
+    Emails match case-insensitively, like the duplicate check of services/enrollment.py.
+    """
+    lowered = [email.lower() for email in emails]
+    users_cursor = get_user_collection().find(
+        {"$expr": {"$in": [{"$toLower": {"$ifNull": ["$email", ""]}}, lowered]}}, {"_id": 1, "email": 1}
     )
-    # Add team to user's team list
-    await add_team_to_user(user_id=user_id, team_id=team_id)
+    user_ids_by_email = {user["email"].lower(): user["_id"] async for user in users_cursor}
+    added = set(await add_memberships(team_id, list(user_ids_by_email.values())))
 
-    return result_team.modified_count > 0
+    results = []
+    for email in emails:
+        user_id = user_ids_by_email.get(email.lower())
+        if not user_id:
+            results.append(EnrollmentRowResult(email=email, status="not_found"))
+        else:
+            status = "enrolled" if user_id in added else "already_member"
+            results.append(EnrollmentRowResult(email=email, status=status, user_id=user_id))
+    return results
 
 
 # Add update_team function if needed (check admin permission)
\ No newline at end of file
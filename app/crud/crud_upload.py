@@ -0,0 +1,107 @@
+from app.db.database import get_upload_collection
+from app.core.profiler import profiled
+from app.core.config import settings
+from app.schemas.submission import ResumableUploadInDB
+from app.services.storage import StorageBackend
+from datetime import datetime, timedelta, timezone
+from pymongo import ReturnDocument
+import uuid
+
+def _expiry(now: datetime) -> datetime:
+    return now + timedelta(hours=settings.UPLOAD_EXPIRY_HOURS)
+
+def _new_lease() -> datetime:
+    lease = datetime.now(timezone.utc) + timedelta(seconds=settings.UPLOAD_LEASE_SECONDS)
+    return lease.replace(microsecond=lease.microsecond // 1000 * 1000) # BSON dates keep milliseconds only
+
+@profiled
+async def create_upload(
+    assignment_id: str,
+    team_id: str,
+    student_id: str,
+    length: int,
+    filename: str | None = None,
+    notes: str | None = None
+) -> ResumableUploadInDB:
+    now = datetime.now(timezone.utc)
+    upload = ResumableUploadInDB(
+        _id=uuid.uuid4().hex, # Also names the pending object in storage
+        assignment_id=assignment_id,
+        team_id=team_id,
+        student_id=student_id,
+        length=length,
+        filename=filename,
+        notes=notes,
+        expires_at=_expiry(now)
+    )
+    await get_upload_collection().insert_one(upload.model_dump(by_alias=True))
+    return upload
+
+@profiled
+async def get_upload(upload_id: str, student_id: str) -> ResumableUploadInDB | None:
+    """ Uploads are only visible to the student who created them, until they expire. """
+    upload = await get_upload_collection().find_one({
+        "_id": upload_id,
+        "student_id": student_id,
+        "expires_at": {"$gt": datetime.now(timezone.utc)}
+    })
+    return ResumableUploadInDB(**upload) if upload else None
+
+@profiled
+async def claim_upload(upload_id: str, student_id: str, offset: int) -> ResumableUploadInDB | None:
+    """
+    Take the lease on a pending upload for one PATCH, provided the client's Upload-Offset matches.
+    Returns None if the upload is unknown, completed, at another offset or leased by a running PATCH.
+    """
+    now = datetime.now(timezone.utc)
+    upload = await get_upload_collection().find_one_and_update(
+        {
+            "_id": upload_id,
+            "student_id": student_id,
+            "status": "pending",
+            "offset": offset,
+            "expires_at": {"$gt": now},
+            "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lte": now}}]
+        },
+        {"$set": {"lease_expires_at": _new_lease()}},
+        return_document=ReturnDocument.AFTER
+    )
+    return ResumableUploadInDB(**upload) if upload else None
+
+@profiled
+async def renew_lease(upload_id: str, lease_expires_at: datetime) -> datetime | None:
+    """ Extend a lease we still hold; returns the new expiry, or None if the lease was lost. """
+    new_lease = _new_lease()
+    result = await get_upload_collection().update_one(
+        {"_id": upload_id, "lease_expires_at": lease_expires_at},
+        {"$set": {"lease_expires_at": new_lease}}
+    )
+    return new_lease if result.modified_count == 1 else None
+
+@profiled
+async def release_upload(upload_id: str, offset: int, submission_version: int | None = None):
+    """ Record the bytes flushed by a PATCH and drop its lease. Passing a version completes the upload. """
+    now = datetime.now(timezone.utc)
+    update = {"offset": offset, "lease_expires_at": None, "updated_at": now, "expires_at": _expiry(now)}
+    if submission_version is not None:
+        update.update({"status": "completed", "submission_version": submission_version})
+    await get_upload_collection().update_one({"_id": upload_id}, {"$set": update})
+
+@profiled
+async def delete_upload(upload_id: str):
+    await get_upload_collection().delete_one({"_id": upload_id})
+
+@profiled
+async def purge_expired_uploads(storage: StorageBackend) -> int:
+    """ Delete expired uploads and their partial files. Returns the number purged. """
+    now = datetime.now(timezone.utc)
+    expired = get_upload_collection().find(
+        {"expires_at": {"$lte": now}, "$or": [{"lease_expires_at": None}, {"lease_expires_at": {"$lte": now}}]},
+        {"_id": 1}
+    )
+    purged = 0
+    async for upload in expired:
+        await storage.discard_pending(upload["_id"]) # No-op for completed uploads
+        await get_upload_collection().delete_one({"_id": upload["_id"], "expires_at": {"$lte": now}})
+        purged += 1
+    return purged
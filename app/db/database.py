@@ -1,27 +1,128 @@
+import asyncio
+
 import motor.motor_asyncio
 from app.core.config import settings
+from app.core.metrics import MongoCommandMetrics, MongoPoolMetrics
+from app.core.profiler import SlowQueryListener
+
+# The client is created by connect(), called from the app lifespan (see app/main.py). Nothing
+# connects at import time; scripts that use the getters without the app connect on first use.
+client: motor.motor_asyncio.AsyncIOMotorClient | None = None
+db: motor.motor_asyncio.AsyncIOMotorDatabase | None = None
+
+def connect() -> motor.motor_asyncio.AsyncIOMotorDatabase:
+    global client, db
+    if db is None:
+        event_listeners = [MongoCommandMetrics(), MongoPoolMetrics()] # Exported at /api/metrics
+        if settings.QUERY_PROFILER_ENABLED:
+            event_listeners.append(SlowQueryListener())
+        client = motor.motor_asyncio.AsyncIOMotorClient(
+            settings.DATABASE_URL,
+            uuidRepresentation='standard', # Important for consistency
+            tz_aware=True, # Return aware UTC datetimes so they compare with datetime.now(timezone.utc)
+            minPoolSize=settings.MONGO_MIN_POOL_SIZE, # Kept open by the driver once warmed up
+            maxPoolSize=settings.MONGO_MAX_POOL_SIZE,
+            event_listeners=event_listeners
+        )
+        db = client[settings.DATABASE_NAME]
+    return db
+
+def get_client() -> motor.motor_asyncio.AsyncIOMotorClient:
+    connect()
+    return client
 
-client = motor.motor_asyncio.AsyncIOMotorClient(
-    settings.DATABASE_URL,
-    uuidRepresentation='standard' # Important for consistency
-)
-db = client[settings.DATABASE_NAME]
+def get_database() -> motor.motor_asyncio.AsyncIOMotorDatabase:
+    return db if db is not None else connect()
+
+async def warm_up(connections: int):
+    """
+    Ping the server, then open 'connections' pooled connections with concurrent pings (each
+    in-flight command checks out its own connection), so first requests do not pay for them.
+    """
+    database = get_database()
+    await database.command("ping")
+    if connections > 1:
+        await asyncio.gather(*(database.command("ping") for _ in range(connections)))
+
+def close():
+    global client, db
+    if client is not None:
+        client.close()
+    client, db = None, None
 
 # Get database collections (used in CRUD operations)
 def get_user_collection():
-    return db.get_collection("users")
+    return get_database().get_collection("users")
 
 def get_team_collection():
-    return db.get_collection("teams")
+    return get_database().get_collection("teams")
+
+def get_membership_collection():
+    return get_database().get_collection("memberships")
 
 def get_assignment_collection():
-    return db.get_collection("assignments")
+    return get_database().get_collection("assignments")
+
+def get_assignment_stats_collection():
+    return get_database().get_collection("assignment_stats")
 
 def get_submission_collection():
-    return db.get_collection("submissions")
+    return get_database().get_collection("submissions")
+
+def get_submission_archive_collection():
+    return get_database().get_collection("submission_archive")
+
+def get_sync_checkpoint_collection():
+    return get_database().get_collection("sync_checkpoints")
+
+def get_upload_collection():
+    return get_database().get_collection("uploads")
+
+def get_enrollment_job_collection():
+    return get_database().get_collection("enrollment_jobs")
+
+def get_response_cache_collection():
+    return get_database().get_collection("response_cache")
+
+def get_idempotency_collection():
+    return get_database().get_collection("idempotency_keys")
+
+def get_rate_limit_collection():
+    return get_database().get_collection("rate_limits")
 
-# You might add specific indexes here on startup if needed
-# async def create_indexes():
-#     await get_user_collection().create_index("email", unique=True)
-#     await get_team_collection().create_index("join_code", unique=True, sparse=True)
-#     # Add other necessary indexes
\ No newline at end of file
+# Indexes are checked on startup (see app/main.py); create_index is a no-op for existing indexes
+async def create_indexes():
+    # await get_user_collection().create_index("email", unique=True)
+    # Join looks teams up by join_code, and codes are generated with insert-retry on this index
+    await get_team_collection().create_index("join_code", unique=True, sparse=True)
+    # Membership _ids are "{team_id}:{user_id}", so uniqueness comes from _id; these serve the listings
+    await get_membership_collection().create_index([("team_id", 1), ("joined_at", 1)])
+    await get_membership_collection().create_index([("user_id", 1), ("joined_at", 1)])
+    # Per-team assignment listings and the student feed (sorted by due date)
+    await get_assignment_collection().create_index([("team_id", 1), ("due_date", 1)])
+    # Duplicate-file detection per assignment, see crud_submission.find_duplicate_submissions
+    await get_submission_collection().create_index([("assignment_id", 1), ("versions.content_hash", 1)])
+    # Deletion tombstones of synced submissions are kept for the replication window
+    await get_submission_collection().create_index(
+        "deleted_at", expireAfterSeconds=settings.SYNC_TOMBSTONE_RETENTION_DAYS * 24 * 3600
+    )
+    # Archived versions are looked up per submission
+    await get_submission_archive_collection().create_index([("submission_id", 1), ("archived_at", 1)])
+    # Replication checkpoints of clients that stopped syncing are dropped eventually (a client
+    # without its checkpoint just starts over from sequence zero)
+    await get_sync_checkpoint_collection().create_index(
+        "updated_at", expireAfterSeconds=settings.SYNC_CHECKPOINT_RETENTION_DAYS * 24 * 3600
+    )
+    # Expired resumable uploads are purged by crud_upload.purge_expired_uploads, which also deletes
+    # their partial files, so this is a plain index rather than a TTL index
+    await get_upload_collection().create_index("expires_at")
+    # Finished bulk enrollment jobs only need to be pollable for a while
+    await get_enrollment_job_collection().create_index(
+        "created_at", expireAfterSeconds=settings.ENROLLMENT_JOB_RETENTION_DAYS * 24 * 3600
+    )
+    # Shared response cache entries expire after RESPONSE_CACHE_TTL_SECONDS
+    await get_response_cache_collection().create_index("expires_at", expireAfterSeconds=0)
+    # Stored responses of Idempotency-Key requests expire after IDEMPOTENCY_TTL_HOURS
+    await get_idempotency_collection().create_index("expires_at", expireAfterSeconds=0)
+    # Shared token buckets expire once a client has been idle long enough to refill them
+    await get_rate_limit_collection().create_index("expires_at", expireAfterSeconds=0)
\ No newline at end of file
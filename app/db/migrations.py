@@ -0,0 +1,135 @@
+"""
+One-off data migrations and repair commands. Run from the project root, e.g.:
+
+    python -m app.db.migrations memberships
+    python -m app.db.migrations assignment_stats
+    python -m app.db.migrations compaction
+"""
+import argparse
+import asyncio
+from dataclasses import asdict
+from datetime import datetime, timezone
+
+from pymongo import UpdateOne
+
+from app.core.log import log_event
+from app.crud.crud_membership import membership_id
+from app.crud.crud_stats import rebuild_assignment_stats
+from app.db.database import (
+    create_indexes,
+    get_assignment_collection,
+    get_membership_collection,
+    get_submission_collection,
+    get_team_collection,
+    get_user_collection,
+)
+from app.services.compaction import run_compaction
+
+BATCH_SIZE = 1000
+
+
+async def _flush(collection, ops: list):
+    if ops:
+        await collection.bulk_write(ops, ordered=False)
+        ops.clear()
+
+
+async def migrate_memberships():
+    """
+    Move membership out of teams.member_ids / users.team_ids into the memberships collection and
+    (re)compute teams.member_count. Safe to re-run: memberships are upserted by their _id and
+    member_count is recounted from the memberships collection.
+    """
+    await create_indexes()
+    teams, users, memberships = get_team_collection(), get_user_collection(), get_membership_collection()
+    now = datetime.now(timezone.utc)
+    ops = []
+
+    def upsert(team_id, user_id, role, joined_at):
+        return UpdateOne(
+            {"_id": membership_id(team_id, user_id)},
+            {
+                "$setOnInsert": {"team_id": team_id, "user_id": user_id, "joined_at": joined_at or now},
+                # Both passes derive the role from the team's admin_id, so setting it is never a downgrade
+                "$set": {"role": role}
+            },
+            upsert=True
+        )
+
+    # 1. teams.member_ids (and the admin, who was implicitly a member)
+    admins = {}
+    async for team in teams.find({}, {"admin_id": 1, "member_ids": 1, "created_at": 1}):
+        admins[team["_id"]] = team["admin_id"]
+        for user_id in {team["admin_id"], *team.get("member_ids", [])}:
+            role = "admin" if user_id == team["admin_id"] else "member"
+            ops.append(upsert(team["_id"], user_id, role, team.get("created_at")))
+            if len(ops) >= BATCH_SIZE:
+                await _flush(memberships, ops)
+    await _flush(memberships, ops)
+
+    # 2. users.team_ids, which could hold memberships missing from the team side
+    async for user in users.find({"team_ids": {"$exists": True, "$ne": []}}, {"team_ids": 1}):
+        for team_id in user["team_ids"]:
+            if team_id not in admins: # Team no longer exists
+                continue
+            role = "admin" if admins[team_id] == user["_id"] else "member"
+            ops.append(upsert(team_id, user["_id"], role, None))
+            if len(ops) >= BATCH_SIZE:
+                await _flush(memberships, ops)
+    await _flush(memberships, ops)
+
+    # 3. member_count from the memberships collection
+    counts = {}
+    async for row in memberships.aggregate([{"$group": {"_id": "$team_id", "count": {"$sum": 1}}}]):
+        counts[row["_id"]] = row["count"]
+    for team_id in admins:
+        ops.append(UpdateOne({"_id": team_id}, {"$set": {"member_count": counts.get(team_id, 0)}}))
+        if len(ops) >= BATCH_SIZE:
+            await _flush(teams, ops)
+    await _flush(teams, ops)
+
+    # 4. Drop the embedded arrays
+    await teams.update_many({"member_ids": {"$exists": True}}, {"$unset": {"member_ids": ""}})
+    await users.update_many({"team_ids": {"$exists": True}}, {"$unset": {"team_ids": ""}})
+    log_event("migration.memberships", teams=len(admins), memberships=sum(counts.values()))
+
+
+async def rebuild_all_assignment_stats():
+    """
+    Recompute every assignment's submission counters from the submissions themselves.
+    Repairs drift in the incrementally maintained stats, e.g. after a due date change.
+    """
+    submissions = get_submission_collection()
+    rebuilt = 0
+    async for assignment in get_assignment_collection().find({}, {"team_id": 1, "due_date": 1}):
+        assignment_submissions = await submissions.find(
+            {"assignment_id": assignment["_id"]},
+            {"current_version": 1, "versions.version": 1, "versions.submitted_at": 1, "archived_version_count": 1}
+        ).to_list(length=None)
+        await rebuild_assignment_stats(assignment, assignment_submissions)
+        rebuilt += 1
+    log_event("migration.assignment_stats", assignments=rebuilt)
+
+
+async def compact_submissions():
+    """
+    Run one compaction pass now (archive versions outside the COMPACTION_* retention),
+    e.g. before enabling the background job on a large collection.
+    """
+    await create_indexes()
+    report = await run_compaction()
+    log_event("compaction.completed", **asdict(report))
+
+
+MIGRATIONS = {
+    "memberships": migrate_memberships,
+    "assignment_stats": rebuild_all_assignment_stats,
+    "compaction": compact_submissions,
+}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a data migration")
+    parser.add_argument("migration", choices=sorted(MIGRATIONS))
+    args = parser.parse_args()
+    asyncio.run(MIGRATIONS[args.migration]())
@@ -1,15 +1,81 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, suppress
+
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.api.router import api_router
+from app.core.admission import AdmissionControlMiddleware
+from app.core import events
 from app.core.config import settings
-# from app.db.database import create_indexes # Optional: If creating indexes on startup
+from app.core.idempotency import IdempotencyMiddleware
+from app.core.log import RequestContextMiddleware, configure_logging, log_event, shutdown_logging
+from app.core.metrics import MetricsMiddleware
+from app.core.upload_limits import UploadSizeLimitMiddleware
+from app.crud import crud_upload
+from app.db import database
+from app.services.compaction import compact_periodically
+from app.services.storage import DownloadStaticFiles, get_storage_backend
+
+# --- Background Tasks ---
+async def purge_expired_uploads_periodically():
+    """ Delete resumable uploads abandoned for longer than UPLOAD_EXPIRY_HOURS, with their partial files. """
+    while True:
+        try:
+            purged = await crud_upload.purge_expired_uploads(get_storage_backend())
+            if purged:
+                log_event("uploads.purged", count=purged)
+        except Exception as e:
+            log_event("uploads.purge_failed", logging.WARNING, exc_info=e)
+        await asyncio.sleep(settings.UPLOAD_CLEANUP_INTERVAL_SECONDS)
+
+# --- Startup/Shutdown ---
+async def prepare_database():
+    # Fails startup (instead of the first requests) if MongoDB is unreachable
+    await database.warm_up(settings.MONGO_MIN_POOL_SIZE)
+    await database.create_indexes() # Create MongoDB indexes
+    log_event("startup.database_ready", pooled_connections=settings.MONGO_MIN_POOL_SIZE)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    started = time.perf_counter()
+    app.state.ready = False # Reported by /api/health/ready
+    configure_logging()
+    if "*" in origins:
+        log_event("cors.all_origins_allowed", logging.WARNING) # Adjust for production
+    database.connect()
+    try:
+        await asyncio.wait_for(prepare_database(), timeout=settings.MONGO_STARTUP_TIMEOUT_SECONDS)
+    except BaseException:
+        database.close()
+        raise
+    background_tasks = [asyncio.create_task(purge_expired_uploads_periodically())]
+    if settings.EVENTS_ENABLED and settings.EVENTS_SOURCE == "change_stream":
+        background_tasks.append(asyncio.create_task(events.watch_change_streams()))
+    if settings.COMPACTION_ENABLED:
+        background_tasks.append(asyncio.create_task(compact_periodically()))
+    app.state.ready = True
+    log_event("startup.complete", duration_ms=round((time.perf_counter() - started) * 1000))
+    try:
+        yield
+    finally:
+        app.state.ready = False
+        events.broker.close_all() # Ends open event streams so the server can drain
+        for task in background_tasks:
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+        database.close()
+        shutdown_logging() # Writes the events still queued
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Assignment Portal API",
     description="API for managing teams, assignments, and submissions with offline sync support.",
     version="0.1.0",
+    lifespan=lifespan,
     # Add other FastAPI configurations if needed
     # docs_url="/api/docs", openapi_url="/api/openapi.json"
 )
@@ -27,34 +93,37 @@ origins = [
 origins = [origin for origin in origins if origin]
 
 if not origins: # Fallback if no origins configured (adjust as needed for security)
-    print("WARN: No CORS origins specified, allowing all origins (adjust for production).")
-    origins = ["*"]
+    origins = ["*"] # Logged as a warning at startup
 
 
+# Innermost: bounds the body of direct uploads before Starlette spools it
+app.add_middleware(UploadSizeLimitMiddleware)
+# Admission control sheds load in front of expensive routes (bulk sync, auth, submissions).
+# Added before CORS so that CORS stays outermost and 429/503 responses still carry CORS headers.
+app.add_middleware(AdmissionControlMiddleware)
+# Outside admission control so replayed Idempotency-Key responses don't use up rate limit tokens
+app.add_middleware(IdempotencyMiddleware)
+# Outside admission control so shed requests are still counted in the latency histograms
+app.add_middleware(MetricsMiddleware)
+# Outside the middleware above, so their log events (and the endpoints') carry the request id
+app.add_middleware(RequestContextMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=origins,
     allow_credentials=True,
     allow_methods=["*"], # Allow all standard methods
     allow_headers=["*"], # Allow all headers, including Authorization
+    expose_headers=["Location", "Upload-Offset", "Upload-Length", "Tus-Resumable", "Retry-After", "Idempotent-Replayed", "X-Request-ID"], # Read by resumable upload clients and retrying clients
 )
 
 # Include the main API router
 app.include_router(api_router, prefix="/api") # Prefix all API routes with /api
 
-# --- Optional Startup/Shutdown Events ---
-# @app.on_event("startup")
-# async def startup_event():
-#     # Connect to DB (Motor does this lazily, but can ensure connection here)
-#     # await create_indexes() # Create MongoDB indexes if defined
-#     print("Application startup complete.")
-
-# @app.on_event("shutdown")
-# async def shutdown_event():
-#     # Clean up resources if needed
-#     # client.close() # Close MongoDB connection (Motor might handle this)
-#     print("Application shutdown.")
-
+# Serve files written by the local storage backend (object store backends hand out their own URLs),
+# always as downloads so an uploaded file can't run as a page on this origin
+if settings.STORAGE_BACKEND == "local":
+    app.mount("/files", DownloadStaticFiles(directory=settings.STORAGE_LOCAL_DIR, check_dir=False), name="files")
 
 # Root endpoint (optional)
 @app.get("/", tags=["Root"])
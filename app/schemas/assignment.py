@@ -7,6 +7,9 @@ class AssignmentBase(BaseModel):
     title: str = Field(..., min_length=3)
     description: str | None = None
     due_date: datetime | None = None
+    # Submission history retention for this assignment, overriding COMPACTION_KEEP_VERSIONS(_DAYS)
+    keep_versions: int | None = Field(None, ge=1)
+    keep_versions_days: int | None = Field(None, ge=0)
 
 class AssignmentCreate(AssignmentBase):
     team_id: str
@@ -16,10 +19,43 @@ class AssignmentUpdate(BaseModel):
     title: Optional[str] = None
     description: Optional[str] = None
     due_date: Optional[datetime] = None
+    keep_versions: Optional[int] = Field(None, ge=1)
+    keep_versions_days: Optional[int] = Field(None, ge=0)
 
 class AssignmentInDB(AssignmentBase, BaseSchema):
     team_id: str
     creator_id: str
 
 class AssignmentPublic(AssignmentBase, BaseSchema):
-    team_id: str
\ No newline at end of file
+    team_id: str
+
+# Student home feed: an assignment from one of the user's teams with their own submission status
+class FeedSubmissionStatus(BaseModel):
+    current_version: int
+    last_updated_at: datetime
+
+class AssignmentFeedItem(AssignmentPublic):
+    team_name: str
+    submission: FeedSubmissionStatus | None = None # None if not submitted yet
+
+# Incrementally maintained per-assignment submission counters (see crud_stats)
+class AssignmentStatsInDB(BaseModel):
+    id: str = Field(..., alias="_id") # The assignment id
+    team_id: str | None = None
+    due_date: datetime | None = None # Copied from the assignment so lateness is evaluated server-side
+    submitted_count: int = 0 # Students with at least one version
+    late_count: int = 0 # Students whose current version was submitted after due_date
+    version_count: int = 0
+    updated_at: datetime | None = None
+
+    class Config:
+        populate_by_name = True
+
+class AssignmentStatsPublic(BaseModel):
+    assignment_id: str
+    student_count: int
+    submitted_count: int
+    not_submitted_count: int
+    late_count: int
+    version_count: int
+    updated_at: datetime | None = None
@@ -1,5 +1,5 @@
-from pydantic import Field, HttpUrl, BaseModel
-from typing import List, Optional
+from pydantic import Field, HttpUrl, BaseModel, field_serializer, model_serializer
+from typing import Any, Dict, List, Optional
 from datetime import datetime, timezone
 from app.schemas.base import BaseSchema # Reusing BaseSchema is tricky for _rev handling
 
@@ -11,10 +11,14 @@ class PouchDocBase(BaseModel):
 class SubmissionVersion(BaseModel):
     version: int
     file_url: HttpUrl # URL to the uploaded file (S3, GCS, etc.)
-    submitted_at: datetime = Field(default_factory=datetime.now(timezone.utc))
+    submitted_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
     content_hash: Optional[str] = None # Optional hash to detect identical files
     notes: Optional[str] = None
 
+    @field_serializer("file_url")
+    def serialize_file_url(self, file_url: HttpUrl) -> str:
+        return str(file_url) # BSON cannot encode pydantic Url objects
+
 # Represents the document stored in MongoDB and potentially synced via PouchDB
 class SubmissionInDB(PouchDocBase): # Inherit _id, _rev structure
     doc_type: str = "submission" # Add a type field for easier querying/sync filtering
@@ -23,8 +27,19 @@ class SubmissionInDB(PouchDocBase): # Inherit _id, _rev structure
     team_id: str
     current_version: int = 0
     versions: List[SubmissionVersion] = []
+    archived_version_count: int = 0 # Older versions moved to submission_archive by compaction
     # Add updated_at specifically managed for LWW resolution if needed
-    last_updated_at: datetime = Field(default_factory=datetime.now(timezone.utc))
+    last_updated_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+    # Attachment stubs (bytes live in the storage backend, see app/services/attachments.py)
+    attachments: Optional[Dict[str, Dict[str, Any]]] = Field(None, alias="_attachments")
+
+    @model_serializer(mode="wrap")
+    def drop_empty_attachments(self, handler):
+        data = handler(self)
+        if self.attachments is None: # Documents without attachments have no _attachments field
+            data.pop("_attachments", None)
+            data.pop("attachments", None)
+        return data
 
     class Config:
         populate_by_name = True # Allow _id and _rev aliases
@@ -57,4 +72,34 @@ class SubmissionPublic(BaseModel):
     class Config:
         populate_by_name = True
         json_encoders = {datetime: lambda dt: dt.isoformat()}
-        from_attributes = True # Allow creation from SubmissionInDB model
\ No newline at end of file
+        from_attributes = True # Allow creation from SubmissionInDB model
+
+# Students sharing an identical file (same content_hash) within an assignment
+class DuplicateSubmissionGroup(BaseModel):
+    content_hash: str
+    student_ids: List[str]
+
+# Resumable (tus-style) upload of a submission file, finalized into a new submission version
+class ResumableUploadInDB(BaseSchema):
+    assignment_id: str
+    team_id: str
+    student_id: str
+    length: int # Total size announced by the client (Upload-Length)
+    offset: int = 0 # Bytes received and flushed to storage so far
+    filename: Optional[str] = None
+    notes: Optional[str] = None
+    status: str = "pending" # "pending" | "completed"
+    submission_version: Optional[int] = None # Version created on completion
+    expires_at: datetime
+    lease_expires_at: Optional[datetime] = None # Set while a PATCH is streaming into the upload
+
+class ResumableUploadPublic(BaseModel):
+    id: str = Field(..., alias="_id")
+    length: int
+    offset: int
+    status: str
+    expires_at: datetime
+
+    class Config:
+        populate_by_name = True
+        from_attributes = True
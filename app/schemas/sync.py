@@ -26,9 +26,9 @@ class BulkDocsRequest(BaseModel):
     new_edits: bool = True # PouchDB usually sends true
 
 class BulkDocsResponseItem(BaseModel):
-    ok: bool = True
-    id: str
-    rev: str # The new revision ID after successful save/update
+    ok: Optional[bool] = None # Set on success; failed items carry error/reason instead
+    id: Optional[str] = None
+    rev: Optional[str] = None # The new revision ID after successful save/update
     error: Optional[str] = None
     reason: Optional[str] = None
 
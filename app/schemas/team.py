@@ -1,5 +1,6 @@
 from pydantic import Field, BaseModel
 from typing import List
+from datetime import datetime, timezone
 from app.schemas.base import BaseSchema
 
 class TeamBase(BaseModel):
@@ -15,14 +16,44 @@ class TeamUpdate(TeamBase):
 class TeamJoin(BaseModel):
     join_code: str
 
+class TeamEnrollRequest(BaseModel):
+    emails: List[str] = Field(..., min_length=1)
+
+class EnrollmentRowResult(BaseModel):
+    email: str
+    status: str # "enrolled" | "already_member" | "not_found" | "invalid_email" | "duplicate"
+    user_id: str | None = None
+
+# Bulk enrollment run. Large lists run as a background job whose progress is polled.
+class EnrollmentJob(BaseSchema):
+    team_id: str
+    requested_by: str
+    status: str = "pending" # "pending" | "running" | "completed" | "failed"
+    total: int
+    processed: int = 0
+    enrolled_count: int = 0
+    results: List[EnrollmentRowResult] = [] # In input order
+    error: str | None = None
+
 class TeamInDB(TeamBase, BaseSchema):
     admin_id: str
-    member_ids: List[str] = []
+    member_count: int = 0 # Maintained alongside the memberships collection, recounted by the memberships migration
     join_code: str | None = None # Unique code to join
 
 class TeamPublic(TeamBase, BaseSchema):
     admin_id: str
-    member_count: int # Calculated field for public view
+    member_count: int
+
+# One user's membership of one team, stored in its own collection so teams and users stay bounded
+class MembershipInDB(BaseModel):
+    id: str = Field(..., alias="_id") # "{team_id}:{user_id}", see crud_membership.membership_id
+    team_id: str
+    user_id: str
+    role: str = "member" # "admin" | "member"
+    joined_at: datetime = Field(default_factory=lambda: datetime.now(timezone.utc))
+
+    class Config:
+        populate_by_name = True
 
 # schemas/team.py continued
 from app.schemas.user import UserPublic # Ensure UserPublic is importable
@@ -7,13 +7,13 @@ class UserBase(BaseModel):
     email: EmailStr = Field(...)
     full_name: str | None = None
     is_active: bool = True
-    is_admin: bool = False # Or role-based system
+    # No is_admin here: it would be settable on register. Platform admins are configured by ADMIN_EMAILS
 
 # Properties stored in DB
 class UserInDBBase(UserBase, BaseSchema):
     hashed_password: str | None = None # Can be null for OAuth users initially
     google_id: str | None = None       # Store Google unique ID
-    team_ids: List[str] = []           # IDs of teams the user is part of
+    # Team memberships live in the memberships collection (see crud_membership)
 
 # For creating a new user via email/password
 class UserCreate(UserBase):
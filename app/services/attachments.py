@@ -0,0 +1,135 @@
+import base64
+import hashlib
+import json
+import re
+from typing import Any, AsyncIterable, AsyncIterator, Dict, Optional
+
+from app.core.config import settings
+from app.services.storage import StorageBackend
+
+# Sync documents carry files as CouchDB _attachments. Inline (base64) attachments are never stored
+# in the document: their bytes go to the storage backend under a content-addressed key and the
+# document keeps a stub with content_type, digest (md5, as computed by PouchDB), length and revpos
+# (generation of the revision that last changed the attachment). Documents are served with stubs;
+# attachment bytes are streamed by the attachment routes or, on request, inlined for those changed
+# since the revisions the client already has (atts_since).
+
+
+class MissingStubError(ValueError):
+    """ A stub refers to an attachment the server does not hold (CouchDB's missing_stub). """
+
+
+class AttachmentTooLargeError(ValueError):
+    pass
+
+
+REVISION = re.compile(r"^[0-9]+-\S+$")
+
+
+def attachment_key(sha256: str) -> str:
+    return f"attachments/{sha256}"
+
+def md5_digest(md5) -> str:
+    return "md5-" + base64.b64encode(md5.digest()).decode()
+
+def revision_generation(rev: Optional[str]) -> int:
+    prefix = (rev or "").split("-", 1)[0]
+    return int(prefix) if prefix.isdigit() else 0
+
+def public_stub(attachment: Dict[str, Any]) -> Dict[str, Any]:
+    """ The stub as clients see it, without the storage key. """
+    return {key: value for key, value in attachment.items() if key != "storage_key"}
+
+
+async def write_attachment(chunks: AsyncIterable[bytes], storage: StorageBackend) -> Dict[str, Any]:
+    """ Stream bytes into storage. Returns digest, length and storage_key of the stored object. """
+    writer = storage.open_writer()
+    md5, sha256, length = hashlib.md5(), hashlib.sha256(), 0
+    try:
+        async for chunk in chunks:
+            length += len(chunk)
+            if length > settings.MAX_UPLOAD_SIZE:
+                raise AttachmentTooLargeError(f"Attachment exceeds the {settings.MAX_UPLOAD_SIZE} byte limit")
+            md5.update(chunk)
+            sha256.update(chunk)
+            await writer.write(chunk)
+    except BaseException:
+        await writer.abort() # Don't leave partial files behind
+        raise
+    key = attachment_key(sha256.hexdigest())
+    await writer.commit(key) # Content-addressed: storing the same bytes again rewrites identical bytes
+    return {"digest": md5_digest(md5), "length": length, "storage_key": key}
+
+async def _chunked(data: bytes) -> AsyncIterator[bytes]:
+    for start in range(0, len(data), settings.UPLOAD_CHUNK_SIZE):
+        yield data[start:start + settings.UPLOAD_CHUNK_SIZE]
+
+async def store_inline_attachments(
+    attachments: Dict[str, Dict[str, Any]],
+    held_attachments: Optional[Dict[str, Dict[str, Any]]],
+    revpos: int,
+    storage: StorageBackend
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Replace the inline attachments of an incoming document with stubs, writing their bytes to storage.
+    Stubs sent by the client must match an attachment of the held document ('held_attachments'), and
+    inline data identical to a held attachment keeps that attachment (and its revpos) without a write.
+    """
+    held_attachments = held_attachments or {}
+    stored = {}
+    for name, attachment in attachments.items():
+        held = held_attachments.get(name)
+        if attachment.get("stub"):
+            if not held or (attachment.get("digest") and attachment["digest"] != held.get("digest")):
+                raise MissingStubError(f"Attachment '{name}' is sent as a stub but the server does not have it")
+            stored[name] = held
+            continue
+        if "data" not in attachment:
+            raise ValueError(f"Attachment '{name}' has neither data nor stub")
+        data = base64.b64decode(attachment["data"])
+        if held and held.get("digest") == md5_digest(hashlib.md5(data)):
+            stored[name] = held
+            continue
+        stored[name] = {
+            "content_type": attachment.get("content_type", "application/octet-stream"),
+            **await write_attachment(_chunked(data), storage),
+            "revpos": revpos,
+            "stub": True,
+        }
+    return stored
+
+
+def parse_atts_since(atts_since: Optional[str]) -> Optional[int]:
+    """
+    Highest generation among the revisions of an atts_since JSON array, None if not given.
+    Raises ValueError unless it is an array of "N-hash" revisions.
+    """
+    if atts_since is None:
+        return None
+    revs = json.loads(atts_since) # JSONDecodeError is a ValueError
+    if not isinstance(revs, list) or not all(isinstance(rev, str) and REVISION.match(rev) for rev in revs):
+        raise ValueError("atts_since must be a JSON array of revisions")
+    return max((revision_generation(rev) for rev in revs), default=0)
+
+async def render_attachments(
+    attachments: Dict[str, Dict[str, Any]],
+    storage: StorageBackend,
+    include_data: bool = False,
+    since_generation: int = 0
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Attachments for a document response: stubs, or inline data for attachments changed after
+    'since_generation'. Only the latest revision is kept, so atts_since is evaluated by generation:
+    an attachment with revpos <= the client's newest known generation is assumed to be held by it.
+    """
+    rendered = {}
+    for name, attachment in attachments.items():
+        if not include_data or attachment.get("revpos", 0) <= since_generation:
+            rendered[name] = public_stub(attachment)
+            continue
+        data = b"".join([chunk async for chunk in storage.iter_object(attachment["storage_key"], settings.UPLOAD_CHUNK_SIZE)])
+        rendered[name] = {
+            **{key: value for key, value in public_stub(attachment).items() if key != "stub"},
+            "data": base64.b64encode(data).decode(),
+        }
+    return rendered
@@ -0,0 +1,110 @@
+import asyncio
+import logging
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Tuple
+
+import bson
+
+from app.core import metrics
+from app.core.config import settings
+from app.core.log import log_event
+from app.crud import crud_compaction
+
+# Retention for submission history. Versions beyond the latest COMPACTION_KEEP_VERSIONS that are
+# also older than COMPACTION_KEEP_VERSIONS_DAYS (or the assignment's own keep_versions /
+# keep_versions_days, where set) are moved to the submission_archive collection,
+# keeping the submissions collection (and its working set) proportional to current data. (Deletion
+# tombstones are purged by their TTL index, see crud_submission.make_tombstone.) The job works in
+# batches of COMPACTION_BATCH_SIZE, pausing between batches and whenever the worker is busy with
+# requests, so it never competes with foreground traffic for the connection pool.
+
+
+@dataclass
+class CompactionReport:
+    submissions_compacted: int = 0
+    versions_archived: int = 0
+    bytes_reclaimed: int = 0 # BSON size removed from the submissions collection
+    conflicts: int = 0 # Documents written to during the run, left for the next one
+
+
+def _bson_size(doc: Dict[str, Any]) -> int:
+    return len(bson.encode(doc))
+
+def _submitted_at(version: Dict[str, Any]) -> Optional[datetime]:
+    submitted_at = version.get("submitted_at")
+    if isinstance(submitted_at, str): # Docs pushed through sync keep client ISO strings
+        submitted_at = datetime.fromisoformat(submitted_at)
+    if submitted_at and submitted_at.tzinfo is None:
+        submitted_at = submitted_at.replace(tzinfo=timezone.utc)
+    return submitted_at
+
+def versions_to_archive(submission: Dict[str, Any], keep_versions: int, cutoff: datetime) -> List[Dict[str, Any]]:
+    """ Versions outside the retention window: not among the latest 'keep_versions' and older than 'cutoff'. """
+    versions = submission.get("versions") or []
+    older = versions[:-keep_versions] if keep_versions else versions
+    return [
+        version for version in older
+        if version.get("version") != submission.get("current_version")
+        and (submitted_at := _submitted_at(version)) is not None and submitted_at < cutoff
+    ]
+
+
+async def _yield_to_foreground():
+    """ Pause between batches, and for as long as this worker is busy serving requests. """
+    await asyncio.sleep(settings.COMPACTION_BATCH_PAUSE_SECONDS)
+    while metrics.http_requests_in_flight.count() > settings.COMPACTION_MAX_IN_FLIGHT:
+        await asyncio.sleep(settings.COMPACTION_BATCH_PAUSE_SECONDS)
+
+
+async def _compact_versions(report: CompactionReport, now: datetime):
+    overrides = await crud_compaction.get_retention_overrides()
+
+    def retention(assignment_id: Optional[str]) -> Tuple[int, datetime]:
+        keep_versions, keep_days = overrides.get(assignment_id, (None, None))
+        keep_versions = settings.COMPACTION_KEEP_VERSIONS if keep_versions is None else keep_versions
+        keep_days = settings.COMPACTION_KEEP_VERSIONS_DAYS if keep_days is None else keep_days
+        return max(keep_versions, 1), now - timedelta(days=keep_days) # The current version is never archived
+
+    # Scan for the smallest keep_versions in use; each submission is then held to its own assignment's
+    scan_keep = min([retention(None)[0], *(retention(assignment_id)[0] for assignment_id in overrides)])
+    after_id = None
+    while True:
+        batch = await crud_compaction.find_submissions_with_versions_over(scan_keep, after_id, settings.COMPACTION_BATCH_SIZE)
+        if not batch:
+            return
+        for submission in batch:
+            archived = versions_to_archive(submission, *retention(submission.get("assignment_id")))
+            if not archived:
+                continue
+            trimmed = await crud_compaction.archive_versions(submission, archived)
+            if trimmed is None:
+                report.conflicts += 1
+                continue
+            report.submissions_compacted += 1
+            report.versions_archived += len(archived)
+            report.bytes_reclaimed += _bson_size(submission) - _bson_size(trimmed)
+            metrics.compaction_archived_total.inc(len(archived))
+        after_id = batch[-1]["_id"]
+        await _yield_to_foreground()
+
+
+async def run_compaction() -> CompactionReport:
+    """ One full compaction pass over the submissions collection. """
+    now = datetime.now(timezone.utc)
+    report = CompactionReport()
+    await _compact_versions(report, now)
+    metrics.compaction_reclaimed_bytes_total.inc(report.bytes_reclaimed)
+    return report
+
+
+async def compact_periodically():
+    """ Background task: a compaction pass every COMPACTION_INTERVAL_SECONDS. """
+    while True:
+        try:
+            report = await run_compaction()
+            if report.versions_archived:
+                log_event("compaction.completed", **asdict(report))
+        except Exception as e:
+            log_event("compaction.failed", logging.WARNING, exc_info=e)
+        await asyncio.sleep(settings.COMPACTION_INTERVAL_SECONDS)
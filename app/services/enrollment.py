@@ -0,0 +1,78 @@
+import csv
+import io
+import logging
+from typing import List
+
+from pydantic import EmailStr, TypeAdapter, ValidationError
+
+from app.core.config import settings
+from app.core.log import log_event
+from app.crud import crud_enrollment, crud_team
+from app.schemas.team import EnrollmentJob, EnrollmentRowResult
+
+# Bulk team enrollment: rows are validated and de-duplicated here, then each batch of
+# ENROLL_BATCH_SIZE distinct emails is resolved and written by crud_team.enroll_users_by_email.
+
+_email_adapter = TypeAdapter(EmailStr)
+
+
+def parse_email_csv(text: str) -> List[str]:
+    """ Emails from the "email" column, or from the first column if there is no such header. """
+    rows = [row for row in csv.reader(io.StringIO(text)) if row and any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    if "email" in header:
+        column = header.index("email")
+        return [row[column] if column < len(row) else "" for row in rows[1:]]
+    return [row[0] for row in rows]
+
+
+async def _enroll_batch(team_id: str, emails: List[str], seen: set) -> List[EnrollmentRowResult]:
+    results: List[EnrollmentRowResult | None] = []
+    to_resolve = []
+    for raw_email in emails:
+        try:
+            email = _email_adapter.validate_python(raw_email.strip()) # Normalized like stored user emails
+        except ValidationError:
+            results.append(EnrollmentRowResult(email=raw_email, status="invalid_email"))
+            continue
+        if email.lower() in seen:
+            results.append(EnrollmentRowResult(email=email, status="duplicate"))
+            continue
+        seen.add(email.lower())
+        results.append(None) # Filled in from the batched lookup below
+        to_resolve.append(email)
+
+    resolved = iter(await crud_team.enroll_users_by_email(team_id, to_resolve) if to_resolve else [])
+    return [result if result is not None else next(resolved) for result in results]
+
+
+async def run_enrollment(job: EnrollmentJob, emails: List[str], persist: bool = False) -> EnrollmentJob:
+    """
+    Enroll 'emails' into job.team_id batch by batch, collecting per-row results on 'job'.
+    With persist=True (background jobs) progress is written after every batch and failures
+    are recorded on the job instead of raised.
+    """
+    seen = set()
+    job.status = "running"
+    if persist:
+        await crud_enrollment.set_job_status(job.id, job.status)
+    try:
+        for start in range(0, len(emails), settings.ENROLL_BATCH_SIZE):
+            results = await _enroll_batch(job.team_id, emails[start:start + settings.ENROLL_BATCH_SIZE], seen)
+            job.results.extend(results)
+            job.processed += len(results)
+            job.enrolled_count += sum(1 for result in results if result.status == "enrolled")
+            if persist:
+                await crud_enrollment.record_progress(job.id, results)
+        job.status = "completed"
+    except Exception as e:
+        if not persist:
+            raise
+        log_event("enrollment.job_failed", logging.WARNING, exc_info=e, job_id=job.id, team_id=job.team_id)
+        job.status = "failed"
+        job.error = str(e)
+    if persist:
+        await crud_enrollment.set_job_status(job.id, job.status, job.error)
+    return job
@@ -0,0 +1,161 @@
+import asyncio
+import os
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from starlette.staticfiles import StaticFiles
+
+from app.core.config import settings
+
+# Pluggable storage for uploaded submission files and sync attachments.
+# Backends stream chunks into a pending object and publish it under its final key on commit, so
+# callers can name the object after its content hash, which is only known once the upload ends.
+
+
+class StorageWriter:
+    async def write(self, chunk: bytes):
+        raise NotImplementedError
+
+    async def close(self):
+        """ Flush and keep the pending bytes so a resumable upload can continue later. """
+        raise NotImplementedError
+
+    async def commit(self, key: str) -> str:
+        """ Publish the written bytes under 'key' and return their public URL. """
+        raise NotImplementedError
+
+    async def abort(self):
+        raise NotImplementedError
+
+
+class StorageBackend:
+    def open_writer(self, upload_id: Optional[str] = None, offset: int = 0) -> StorageWriter:
+        """
+        Open a writer on a pending object. Resumable uploads pass their upload_id and the
+        confirmed offset; anything stored past that offset (e.g. from a crashed request) is dropped.
+        """
+        raise NotImplementedError
+
+    def iter_pending(self, upload_id: str, chunk_size: int) -> AsyncIterator[bytes]:
+        raise NotImplementedError
+
+    async def discard_pending(self, upload_id: str):
+        raise NotImplementedError
+
+    def iter_object(self, key: str, chunk_size: int) -> AsyncIterator[bytes]:
+        """ Stream a committed object. Raises FileNotFoundError if there is none under 'key'. """
+        raise NotImplementedError
+
+    def public_url(self, key: str) -> str:
+        raise NotImplementedError
+
+
+class LocalStorageWriter(StorageWriter):
+    def __init__(self, backend: "LocalStorageBackend", upload_id: Optional[str] = None, offset: int = 0):
+        self.backend = backend
+        self.pending_path = backend.pending_path(upload_id or uuid.uuid4().hex)
+        self.offset = offset
+        self._file = None
+
+    def _open(self):
+        self.pending_path.parent.mkdir(parents=True, exist_ok=True)
+        if self.offset == 0:
+            return open(self.pending_path, "wb")
+        file = open(self.pending_path, "r+b")
+        file.seek(self.offset)
+        file.truncate()
+        return file
+
+    async def write(self, chunk: bytes):
+        if self._file is None:
+            self._file = await asyncio.to_thread(self._open)
+        await asyncio.to_thread(self._file.write, chunk) # Keep disk I/O off the event loop
+
+    async def close(self):
+        if self._file is not None:
+            await asyncio.to_thread(self._file.close)
+
+    async def commit(self, key: str) -> str:
+        if self._file is None: # Nothing written in this request (empty or already complete upload)
+            self._file = await asyncio.to_thread(self._open)
+        await self.close()
+        final_path = self.backend.path_for(key)
+        final_path.parent.mkdir(parents=True, exist_ok=True)
+        await asyncio.to_thread(os.replace, self.pending_path, final_path)
+        return self.backend.public_url(key)
+
+    async def abort(self):
+        await self.close()
+        await asyncio.to_thread(self.pending_path.unlink, True)
+
+
+class LocalStorageBackend(StorageBackend):
+    """ Files on local disk, served by the app under /files (see app/main.py). """
+
+    def __init__(self, root: str | None = None, public_base_url: str | None = None):
+        self.root = Path(root or settings.STORAGE_LOCAL_DIR).resolve()
+        self.public_base_url = (public_base_url or settings.STORAGE_PUBLIC_BASE_URL).rstrip("/")
+
+    def path_for(self, key: str) -> Path:
+        path = (self.root / key).resolve()
+        if self.root not in path.parents:
+            raise ValueError(f"Invalid storage key: {key}")
+        return path
+
+    def pending_path(self, upload_id: str) -> Path:
+        return self.path_for(f".pending/{upload_id}")
+
+    def open_writer(self, upload_id: Optional[str] = None, offset: int = 0) -> StorageWriter:
+        return LocalStorageWriter(self, upload_id, offset)
+
+    async def _iter_file(self, path: Path, chunk_size: int) -> AsyncIterator[bytes]:
+        file = await asyncio.to_thread(open, path, "rb")
+        try:
+            while chunk := await asyncio.to_thread(file.read, chunk_size):
+                yield chunk
+        finally:
+            await asyncio.to_thread(file.close)
+
+    def iter_pending(self, upload_id: str, chunk_size: int) -> AsyncIterator[bytes]:
+        return self._iter_file(self.pending_path(upload_id), chunk_size)
+
+    def iter_object(self, key: str, chunk_size: int) -> AsyncIterator[bytes]:
+        return self._iter_file(self.path_for(key), chunk_size)
+
+    async def discard_pending(self, upload_id: str):
+        await asyncio.to_thread(self.pending_path(upload_id).unlink, True)
+
+    def public_url(self, key: str) -> str:
+        return f"{self.public_base_url}/{key}"
+
+
+class DownloadStaticFiles(StaticFiles):
+    """
+    Serves the local backend's files under /files. Uploads are always downloads, never rendered (or
+    content-sniffed) as a page on the API origin.
+    """
+
+    def file_response(self, *args, **kwargs):
+        response = super().file_response(*args, **kwargs)
+        response.headers["Content-Disposition"] = "attachment"
+        response.headers["X-Content-Type-Options"] = "nosniff"
+        return response
+
+
+def submission_file_key(assignment_id: str, content_hash: str, filename: Optional[str]) -> str:
+    """
+    Content-addressed key of a submission file. The client's extension is only kept if it is in
+    UPLOAD_ALLOWED_EXTENSIONS.
+    """
+    suffix = Path(filename or "").suffix.lower()
+    if suffix not in settings.UPLOAD_ALLOWED_EXTENSIONS:
+        suffix = ""
+    return f"submissions/{assignment_id}/{content_hash}{suffix}"
+
+
+def get_storage_backend() -> StorageBackend:
+    if settings.STORAGE_BACKEND == "local":
+        return LocalStorageBackend()
+    # Object store backends (S3/GCS) plug in here
+    raise ValueError(f"Unsupported STORAGE_BACKEND: {settings.STORAGE_BACKEND}")
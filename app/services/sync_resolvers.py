@@ -0,0 +1,103 @@
+from typing import Any, Callable, Dict, List, Optional
+
+# Server-side merges of concurrent sync edits. A push whose parent _rev is not the revision the
+# server holds was made without seeing the server's latest changes; instead of letting one side
+# win by last_updated_at (and the other retry after a fetch), the resolver registered for the
+# doc_type merges both into a new revision within the same _bulk_docs request.
+#
+# A resolver takes (server_doc, incoming_doc) and returns:
+#   - the merged document,
+#   - server_doc itself if the incoming edit is already contained in it (nothing to write), or
+#   - None if the edits cannot be merged (the push falls back to last-write-wins).
+
+ConflictResolver = Callable[[Dict[str, Any], Dict[str, Any]], Optional[Dict[str, Any]]]
+
+_resolvers: Dict[str, ConflictResolver] = {}
+
+
+def register_resolver(doc_type: str):
+    """ Decorator registering the conflict resolver of a doc_type. """
+    def register(resolver: ConflictResolver) -> ConflictResolver:
+        _resolvers[doc_type] = resolver
+        return resolver
+    return register
+
+def get_resolver(doc_type: Optional[str]) -> Optional[ConflictResolver]:
+    return _resolvers.get(doc_type) if doc_type else None
+
+
+# --- Submissions ---
+
+def _version_key(version: Dict[str, Any]):
+    """ The same upload on both sides: same content hash, or same number and file without a hash. """
+    if version.get("content_hash"):
+        return "hash", version["content_hash"]
+    return "file", version.get("version"), str(version.get("file_url"))
+
+def _merge_notes(server_notes: Optional[str], incoming_notes: Optional[str]) -> Optional[str]:
+    if not incoming_notes or incoming_notes in (server_notes or ""):
+        return server_notes
+    if not server_notes or server_notes in incoming_notes:
+        return incoming_notes
+    return f"{server_notes}\n\n{incoming_notes}"
+
+@register_resolver("submission")
+def merge_submissions(server_doc: Dict[str, Any], incoming_doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Union of both sides' versions. Versions only the client has are appended; one whose number the
+    server already uses for another file (both devices appended) is renumbered after the server's
+    latest. Notes of the same version are merged, current_version is the highest of both sides, and
+    attachments are the union of both.
+    """
+    if server_doc.get("_deleted") or incoming_doc.get("_deleted"):
+        return None
+    if any(incoming_doc.get(key) not in (None, server_doc.get(key)) for key in ("assignment_id", "student_id")):
+        return None
+
+    versions: List[Dict[str, Any]] = [dict(version) for version in server_doc.get("versions") or []]
+    by_key = {_version_key(version): version for version in versions}
+    taken = {version.get("version") for version in versions}
+    # Versions below the oldest held one were moved to the archive by compaction
+    oldest_held = min((number for number in taken if isinstance(number, int)), default=0)
+    changed = False
+
+    for incoming in sorted(incoming_doc.get("versions") or [], key=lambda v: v.get("version") or 0):
+        held = by_key.get(_version_key(incoming))
+        if held is not None:
+            notes = _merge_notes(held.get("notes"), incoming.get("notes"))
+            if notes != held.get("notes"):
+                held["notes"] = notes
+                changed = True
+            continue
+        number = incoming.get("version")
+        if server_doc.get("archived_version_count") and isinstance(number, int) and number < oldest_held:
+            continue
+        if number in taken: # Appended on both sides: the incoming one goes last
+            number = max(n for n in taken if isinstance(n, int)) + 1
+        taken.add(number)
+        versions.append({**incoming, "version": number})
+        changed = True
+
+    current_version = max(
+        server_doc.get("current_version") or 0,
+        incoming_doc.get("current_version") or 0,
+        max((n for n in taken if isinstance(n, int)), default=0)
+    )
+    changed = changed or current_version != server_doc.get("current_version")
+
+    attachments = dict(server_doc.get("_attachments") or {})
+    for name, attachment in (incoming_doc.get("_attachments") or {}).items():
+        if name not in attachments or not attachment.get("stub"): # New, or new data for an existing name
+            attachments[name] = attachment
+            changed = True
+
+    if not changed:
+        return server_doc
+    merged = {
+        **server_doc,
+        "versions": sorted(versions, key=lambda v: v.get("version") or 0),
+        "current_version": current_version,
+    }
+    if attachments:
+        merged["_attachments"] = attachments
+    return merged
@@ -0,0 +1,187 @@
+"""
+Overhead of structured logging (app/core/log.py) on the caller, i.e. the event loop.
+
+Per event: the cost of one log_event call when written through the queue (the default), when
+sampled out, when below LOG_LEVEL, and with a synchronous handler formatting and writing on the
+calling thread, compared with a plain print. Per request: a _bulk_docs batch (save_bulk_docs against
+the bench_sync stub collection) with a share of conflicting documents, each of which logs a
+sync.conflict event, timed with logging disabled, synchronous and queued.
+
+Output goes to --log-file (os.devnull by default, which hides the cost of the write itself; pass a
+real file to include it).
+
+    python -m benchmarks.bench_logging
+    python -m benchmarks.bench_logging --log-file /tmp/bench.log --docs 2000 --conflict-ratio 1 --rate 0
+"""
+import argparse
+import asyncio
+import copy
+import gc
+import logging
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "classie_bench")
+os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+
+MODES = ("disabled", "sync", "queue")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=20000, help="log_event calls per per-event case")
+    parser.add_argument("--docs", type=int, default=500, help="Documents per _bulk_docs batch")
+    parser.add_argument("--conflict-ratio", type=float, default=0.5, help="Share of the batch that conflicts (and logs)")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--rate", type=float, help="LOG_EVENT_RATE_PER_SECOND for the per-request cases (0 = unlimited)")
+    parser.add_argument("--format", choices=("json", "text"), default="json")
+    parser.add_argument("--log-file", default=os.devnull)
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    os.environ["LOG_FORMAT"] = args.format
+    os.environ["LOG_LEVEL"] = "INFO"
+    # Large enough that the timed calls never find the queue full
+    os.environ["LOG_QUEUE_SIZE"] = str(max(args.events, args.docs) * 2)
+    if args.rate is not None:
+        os.environ["LOG_EVENT_RATE_PER_SECOND"] = str(args.rate)
+
+
+def use_mode(mode: str, stream, rate: float | None = None):
+    """ Reconfigure logging to write to 'stream': disabled, synchronously on the caller, or through the queue. """
+    from app.core import log
+    from app.core.config import settings
+
+    log.shutdown_logging()
+    sys.stdout = stream # Captured by configure_logging's handler
+    try:
+        log.configure_logging()
+    finally:
+        sys.stdout = sys.__stdout__
+    if rate is not None:
+        log._sampler = log._EventSampler(rate, dict(settings.LOG_EVENT_RATES))
+    if mode == "disabled":
+        log.logger.setLevel(logging.CRITICAL + 1)
+    elif mode == "sync": # What print-style logging cost: format and write on the event loop
+        handler = logging.StreamHandler(stream)
+        handler.setFormatter(log.TextFormatter() if settings.LOG_FORMAT == "text" else log.JsonFormatter())
+        log._queue = SynchronousQueue(handler)
+
+
+class SynchronousQueue:
+    """ Stands in for the log queue: each event is formatted and written by the caller, as print did. """
+
+    def __init__(self, handler: logging.Handler):
+        self.handler = handler
+
+    def qsize(self) -> int:
+        return 0
+
+    def put(self, item):
+        from app.core import log
+
+        if isinstance(item, threading.Event): # flush_logging
+            item.set()
+        else:
+            self.handler.handle(log._make_record(*item) if isinstance(item, tuple) else item)
+
+
+# --- Per event ---
+
+def time_calls(call, count: int) -> float:
+    """ Microseconds per call. """
+    start = time.perf_counter()
+    for i in range(count):
+        call(i)
+    return (time.perf_counter() - start) / count * 1_000_000
+
+
+def per_event(args, stream):
+    from app.core import log
+
+    fields = {"doc_id": "sub_assignment-bench_student1", "incoming_rev": "3-client", "server_rev": "4-server"}
+    results = {}
+    results["print"] = time_calls(lambda i: print(f"Doc {fields['doc_id']} conflict detected, incoming revision "
+                                                  f"{fields['incoming_rev']} ignored (LWW).", file=stream), args.events)
+    use_mode("sync", stream, rate=0)
+    results["log_event sync"] = time_calls(lambda i: log.log_event("bench.event", i=i, **fields), args.events)
+
+    use_mode("queue", stream, rate=0)
+    results["log_event queued"] = time_calls(lambda i: log.log_event("bench.event", i=i, **fields), args.events)
+    drain_start = time.perf_counter()
+    log.flush_logging()
+    results["  writer thread"] = (time.perf_counter() - drain_start) / args.events * 1_000_000 # Left after the calls
+
+    use_mode("queue", stream, rate=1)
+    results["log_event sampled out"] = time_calls(lambda i: log.log_event("bench.event", i=i, **fields), args.events)
+    results["log_event below level"] = time_calls(lambda i: log.log_event("bench.event", logging.DEBUG, i=i, **fields), args.events)
+    log.flush_logging()
+    return results
+
+
+# --- Per request ---
+
+def per_request(args, stream):
+    from app.core import log
+    from app.crud import crud_submission
+    from benchmarks import bench_sync
+
+    dataset_args = argparse.Namespace(docs=args.docs, new_ratio=0.0, conflict_ratio=args.conflict_ratio,
+                                      deletion_ratio=0.0, versions=5)
+    server_docs, incoming = bench_sync.generate_dataset(dataset_args, random.Random(7))
+    loop = asyncio.new_event_loop()
+    wall = {mode: [] for mode in MODES}
+    sampled_out = dict.fromkeys(MODES, 0)
+    try:
+        # Modes are interleaved round by round (after a warm-up round) so drift affects them alike
+        for round_number in range(args.rounds + 1):
+            for mode in MODES:
+                use_mode(mode, stream)
+                bench_sync._install_stubs(server_docs)
+                docs = copy.deepcopy(incoming)
+                gc.collect()
+                start = time.perf_counter()
+                loop.run_until_complete(crud_submission.save_bulk_docs(docs))
+                elapsed = time.perf_counter() - start
+                log.flush_logging() # Outside the timed section: the writer's backlog is not the request's
+                if round_number:
+                    wall[mode].append(elapsed)
+                    sampled_out[mode] += int(log._sampler._buckets.get("sync.conflict", [0, 0, 0])[2])
+        results = {mode: {"median_ms": statistics.median(wall[mode]) * 1000, "min_ms": min(wall[mode]) * 1000,
+                          "sampled_out": sampled_out[mode]} for mode in MODES}
+    finally:
+        loop.close()
+    return results
+
+
+def main():
+    args = parse_args()
+    configure_environment(args)
+    from app.core import log
+
+    with open(args.log_file, "a") as stream:
+        print(f"Per event ({args.events} calls, {args.format}, unsampled unless noted):")
+        for name, micros in per_event(args, stream).items():
+            print(f"  {name:<24} {micros:>8.2f}us")
+
+        conflicts = round(args.docs * args.conflict_ratio)
+        print(f"\nPer request (_bulk_docs of {args.docs} docs, ~{conflicts} conflicts, {args.rounds} rounds):")
+        results = per_request(args, stream)
+        baseline = results["disabled"]["median_ms"]
+        for mode, result in results.items():
+            overhead = (result["median_ms"] - baseline) * 1000
+            print(f"  {mode:<10} median {result['median_ms']:>9.3f}ms  min {result['min_ms']:>9.3f}ms  "
+                  f"overhead {overhead:>+9.1f}us/request  sampled out {result['sampled_out']:>6}")
+        log.shutdown_logging()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,330 @@
+"""
+Micro-benchmarks for the sync engine's CPU paths: save_bulk_docs, handle_revs_diff and the LWW
+comparison. They run against an in-memory stub collection, so the numbers isolate the Python cost
+per document from MongoDB and network latency.
+
+Synthetic document sets are tunable (size, conflict/deletion ratios, versions per doc). Each case
+is run for several rounds and reported pytest-benchmark style (min/mean/stddev per round) together
+with CPU time per document and allocations per document (tracemalloc, measured in a separate pass).
+
+    python -m benchmarks.bench_sync --docs 2000 --conflict-ratio 0.3 --deletion-ratio 0.05 --versions 10
+    python -m benchmarks.bench_sync --output before.json   # then compare two runs with --compare
+    python -m benchmarks.bench_sync --docs 100000 --new-ratio 1 --rounds 3 --cases save_bulk_docs,replicate_bulk_docs
+"""
+import argparse
+import asyncio
+import copy
+import json
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+from pymongo import DeleteOne, ReplaceOne
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# The stub database never connects, but settings are still read by the CRUD layer
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "classie_bench")
+os.environ.setdefault("JWT_SECRET_KEY", "bench-secret")
+
+
+# --- Stub collection ---
+
+class _Result:
+    def __init__(self, **fields):
+        self.__dict__.update(fields)
+
+
+class _Cursor:
+    def __init__(self, docs):
+        self._docs = docs
+
+    async def to_list(self, length=None):
+        return self._docs if length is None else self._docs[:length]
+
+
+def _matches(doc, query):
+    for key, condition in query.items():
+        value = doc.get(key)
+        if isinstance(condition, dict) and "$in" in condition:
+            if value not in condition["$in"]:
+                return False
+        elif value != condition:
+            return False
+    return True
+
+
+def _project(doc, projection):
+    if not projection:
+        return doc
+    keys = {"_id", *(key.split(".", 1)[0] for key in projection)} # Dotted paths keep the whole top-level field
+    return {key: doc[key] for key in keys if key in doc}
+
+
+class StubCollection:
+    """ Just enough of the Motor collection API for the sync paths, backed by a dict keyed on _id. """
+
+    def __init__(self, docs=()):
+        self.docs = {doc["_id"]: doc for doc in docs}
+        self.calls = 0
+
+    def find(self, query, projection=None):
+        self.calls += 1
+        ids = query.get("_id", {}).get("$in") if isinstance(query.get("_id"), dict) else None
+        candidates = (self.docs[i] for i in ids if i in self.docs) if ids is not None else self.docs.values()
+        return _Cursor([_project(doc, projection) for doc in candidates if _matches(doc, query)])
+
+    async def find_one(self, query, projection=None):
+        self.calls += 1
+        if set(query) == {"_id"} and not isinstance(query["_id"], dict):
+            doc = self.docs.get(query["_id"])
+            return _project(doc, projection) if doc else None
+        return next((_project(doc, projection) for doc in self.docs.values() if _matches(doc, query)), None)
+
+    async def replace_one(self, query, replacement, upsert=False):
+        self.calls += 1
+        exists = query["_id"] in self.docs
+        if exists or upsert:
+            self.docs[query["_id"]] = replacement
+        return _Result(matched_count=int(exists), modified_count=int(exists), upserted_id=None if exists else query["_id"])
+
+    async def delete_one(self, query):
+        self.calls += 1
+        return _Result(deleted_count=int(self.docs.pop(query["_id"], None) is not None))
+
+    async def insert_one(self, doc):
+        self.calls += 1
+        self.docs[doc["_id"]] = doc
+        return _Result(inserted_id=doc["_id"])
+
+    async def bulk_write(self, operations, ordered=True):
+        self.calls += 1
+        for op in operations:
+            if isinstance(op, ReplaceOne):
+                self.docs[op._filter["_id"]] = op._doc
+            elif isinstance(op, DeleteOne):
+                self.docs.pop(op._filter["_id"], None)
+        return _Result(bulk_api_result={})
+
+
+class StubDatabase:
+    """ Stands in for database.db: every collection the CRUD layer asks for is a StubCollection. """
+
+    def __init__(self, **collections):
+        self.collections = collections
+
+    def get_collection(self, name):
+        return self.collections.setdefault(name, StubCollection())
+
+    def calls(self):
+        return sum(collection.calls for collection in self.collections.values())
+
+
+# --- Synthetic documents ---
+
+def make_submission(doc_id, rev, versions, updated_at):
+    return {
+        "_id": doc_id, "_rev": rev, "doc_type": "submission",
+        "assignment_id": "assignment-bench", "student_id": doc_id.rsplit("_", 1)[-1], "team_id": "team-bench",
+        "current_version": versions,
+        "versions": [{"version": v, "file_url": f"https://files.bench.example/{doc_id}/{v}",
+                      "submitted_at": (updated_at - timedelta(minutes=versions - v)).isoformat(),
+                      "content_hash": f"{doc_id}-{v}", "notes": None} for v in range(1, versions + 1)],
+        "last_updated_at": updated_at,
+    }
+
+
+def generate_dataset(args, rng: random.Random):
+    """
+    Returns (server docs, incoming docs). Incoming docs are a mix of:
+    - conflicts: older than the server copy, lose LWW
+    - deletions: newer tombstones for existing docs
+    - updates: newer edits of existing docs (with one more version)
+    - inserts: docs the server has never seen (--new-ratio)
+    """
+    now = datetime.now(timezone.utc)
+    server_docs, incoming = [], []
+    for i in range(args.docs):
+        doc_id = f"sub_assignment-bench_student{i}"
+        roll = rng.random()
+        if roll < args.new_ratio:
+            incoming.append({**make_submission(doc_id, "1-client", args.versions, now), "last_updated_at": now.isoformat()})
+            continue
+        server_doc = make_submission(doc_id, f"{args.versions}-server", args.versions, now - timedelta(hours=1))
+        server_docs.append(server_doc)
+        roll = rng.random()
+        if roll < args.conflict_ratio:
+            stale = make_submission(doc_id, f"{args.versions}-server", args.versions, now - timedelta(hours=2))
+            incoming.append({**stale, "last_updated_at": stale["last_updated_at"].isoformat()})
+        elif roll < args.conflict_ratio + args.deletion_ratio:
+            incoming.append({"_id": doc_id, "_rev": f"{args.versions}-server", "_deleted": True,
+                             "doc_type": "submission", "last_updated_at": now.isoformat()})
+        else:
+            edit = make_submission(doc_id, f"{args.versions}-server", args.versions + 1, now)
+            incoming.append({**edit, "last_updated_at": now.isoformat()})
+    return server_docs, incoming
+
+
+# --- Cases ---
+
+def _install_stubs(server_docs, copy_docs=True):
+    """ Point the CRUD layer at a fresh stub database; assignment stats updates land in their own stub. """
+    from app.db import database
+    database.db = StubDatabase(submissions=StubCollection(copy.deepcopy(server_docs) if copy_docs else server_docs))
+
+
+def _db_calls():
+    from app.db import database
+    return database.db.calls()
+
+
+def case_save_bulk_docs(server_docs, incoming):
+    from app.crud import crud_submission
+
+    def setup():
+        _install_stubs(server_docs)
+        return copy.deepcopy(incoming)
+
+    async def run(docs):
+        return await crud_submission.save_bulk_docs(docs)
+    return setup, run, len(incoming), _db_calls
+
+
+def case_replicate_bulk_docs(server_docs, incoming):
+    """ new_edits=false import of the same batch, for comparison with save_bulk_docs. """
+    from app.crud import crud_submission
+
+    def setup():
+        _install_stubs(server_docs)
+        return copy.deepcopy(incoming)
+
+    async def run(docs):
+        return await crud_submission.save_replicated_docs(docs)
+    return setup, run, len(incoming), _db_calls
+
+
+def case_revs_diff(server_docs, incoming):
+    from app.api.endpoints import sync
+
+    payload = {doc["_id"]: [doc["_rev"], f"{doc['_rev']}-missing"] for doc in incoming}
+
+    def setup():
+        _install_stubs(server_docs, copy_docs=False) # Read-only
+        return payload
+
+    async def run(body):
+        return await sync.handle_revs_diff("bench", body)
+    return setup, run, len(payload), _db_calls
+
+
+def case_lww(server_docs, incoming):
+    from app.crud import crud_submission
+
+    by_id = {doc["_id"]: doc for doc in server_docs}
+    pairs = [(by_id.get(doc["_id"]), doc) for doc in incoming]
+
+    def setup():
+        return pairs
+
+    async def run(items):
+        now = datetime.now(timezone.utc)
+        return [crud_submission.incoming_wins_lww(existing, doc, now) for existing, doc in items]
+    return setup, run, len(pairs), lambda: 0
+
+
+CASES = {
+    "save_bulk_docs": case_save_bulk_docs,
+    "replicate_bulk_docs": case_replicate_bulk_docs,
+    "revs_diff": case_revs_diff,
+    "lww_compare": case_lww,
+}
+
+
+def measure(case, args):
+    setup, run, doc_count, db_calls = case
+    loop = asyncio.new_event_loop()
+    try:
+        wall, cpu = [], []
+        for _ in range(args.rounds):
+            state = setup()
+            wall_start, cpu_start = time.perf_counter(), time.process_time()
+            loop.run_until_complete(run(state))
+            cpu.append(time.process_time() - cpu_start)
+            wall.append(time.perf_counter() - wall_start)
+        calls = db_calls() # Stub round trips of the last timed round
+
+        # Allocation pass (tracemalloc slows execution, so it is kept out of the timed rounds)
+        state = setup()
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        loop.run_until_complete(run(state))
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        allocated = [stat for stat in after.compare_to(before, "filename") if stat.size_diff > 0]
+    finally:
+        loop.close()
+
+    return {
+        "docs": doc_count,
+        "rounds": args.rounds,
+        "min_ms": round(min(wall) * 1000, 3),
+        "mean_ms": round(statistics.mean(wall) * 1000, 3),
+        "stddev_ms": round(statistics.stdev(wall) * 1000, 3) if len(wall) > 1 else 0.0,
+        "cpu_us_per_doc": round(statistics.median(cpu) / max(1, doc_count) * 1_000_000, 2),
+        "db_calls": calls,
+        "alloc_blocks_per_doc": round(sum(s.count_diff for s in allocated) / max(1, doc_count), 2),
+        "alloc_bytes_per_doc": round(sum(s.size_diff for s in allocated) / max(1, doc_count), 1),
+        "peak_kib": round(peak / 1024, 1),
+    }
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--docs", type=int, default=1000, help="Documents per batch")
+    parser.add_argument("--conflict-ratio", type=float, default=0.2)
+    parser.add_argument("--deletion-ratio", type=float, default=0.05)
+    parser.add_argument("--new-ratio", type=float, default=0.1, help="Share of docs the server has never seen")
+    parser.add_argument("--versions", type=int, default=5, help="Versions per document")
+    parser.add_argument("--rounds", type=int, default=10)
+    parser.add_argument("--cases", default=",".join(CASES))
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--output", type=Path, help="Write results as JSON")
+    parser.add_argument("--compare", type=Path, help="Previous --output file to compare against")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # Keep the sync path's log output (written by app.core.log to stdout) out of the report
+    sys.stdout = open(os.devnull, "w") if not os.environ.get("BENCH_VERBOSE") else sys.stdout
+    report = sys.__stdout__
+
+    server_docs, incoming = generate_dataset(args, random.Random(args.seed))
+    results = {"params": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()
+                          if k not in ("output", "compare")}, "cases": {}}
+    for name in [c.strip() for c in args.cases.split(",") if c.strip()]:
+        results["cases"][name] = summary = measure(CASES[name](server_docs, incoming), args)
+        print(f"{name:<20} min {summary['min_ms']:>9}ms  mean {summary['mean_ms']:>9}ms  +-{summary['stddev_ms']:>7}ms  "
+              f"cpu/doc {summary['cpu_us_per_doc']:>8}us  db calls {summary['db_calls']:>7}  allocs/doc {summary['alloc_blocks_per_doc']:>7}  "
+              f"bytes/doc {summary['alloc_bytes_per_doc']:>9}", file=report)
+
+    if args.compare and args.compare.exists():
+        previous = json.loads(args.compare.read_text()).get("cases", {})
+        print("\nChange vs comparison run (positive = slower/more):", file=report)
+        for name, current in results["cases"].items():
+            if name in previous:
+                deltas = [f"{key} {(current[key] - previous[name][key]) / previous[name][key] * 100:+.1f}%"
+                          for key in ("mean_ms", "cpu_us_per_doc", "alloc_bytes_per_doc") if previous[name].get(key)]
+                print(f"  {name:<16} " + ", ".join(deltas), file=report)
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+
+
+if __name__ == "__main__":
+    main()
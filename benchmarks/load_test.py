@@ -0,0 +1,312 @@
+"""
+End-to-end HTTP load test.
+
+Boots app.main:app in-process (httpx ASGI transport) against a local mongod, seeds a throwaway
+database with realistic volumes and drives the main user flows at a configurable concurrency.
+Reports throughput, p50/p95/p99 latency and MongoDB commands per request for each scenario, and
+compares against / stores a JSON baseline in benchmarks/baselines/. Baselines are machine specific
+and not committed (git-ignored): record one before a change and compare on the same machine.
+
+    python -m benchmarks.load_test --save-baseline       # write benchmarks/baselines/load.json
+    python -m benchmarks.load_test --users 5000 --teams 40 --team-size 250 --concurrency 32
+
+The target database (--database-name, default classie_loadtest) is DROPPED before seeding.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+DEFAULT_BASELINE = Path(__file__).parent / "baselines" / "load.json"
+SCENARIOS = ["register_login", "join_team", "list_assignments", "submit", "bulk_docs"]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get("LOADTEST_DATABASE_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--database-name", default="classie_loadtest")
+    parser.add_argument("--users", type=int, default=3000, help="Seeded students")
+    parser.add_argument("--teams", type=int, default=20)
+    parser.add_argument("--team-size", type=int, default=300, help="Students per team")
+    parser.add_argument("--assignments", type=int, default=15, help="Assignments per team")
+    parser.add_argument("--submission-ratio", type=float, default=0.6, help="Share of (student, assignment) pairs with a submission")
+    parser.add_argument("--versions", type=int, default=8, help="Max versions per seeded submission")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--requests", type=int, default=500, help="Requests per scenario")
+    parser.add_argument("--bulk-batch", type=int, default=50, help="Docs per _bulk_docs request")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--admission-control", action="store_true", help="Keep admission control enabled (disabled by default so load isn't shed)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", type=Path, help="Write this run's results as JSON")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE, help="Baseline to compare against")
+    parser.add_argument("--save-baseline", action="store_true", help="Overwrite the baseline with this run")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    # Settings are read on first use, so the environment must be set before the app touches them
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["DATABASE_NAME"] = args.database_name
+    os.environ.setdefault("JWT_SECRET_KEY", "loadtest-secret")
+    if not args.admission_control:
+        os.environ["ADMISSION_CONTROL_ENABLED"] = "false"
+
+
+# --- Seeding ---
+
+class Dataset:
+    def __init__(self):
+        self.students: list[str] = []
+        self.unaffiliated: list[str] = [] # Students without any team, used by join_team
+        self.teams: list[dict] = []
+        self.members_by_team: dict[str, list[str]] = {}
+        self.assignments_by_team: dict[str, list[str]] = {}
+        self.tokens: dict[str, str] = {}
+
+
+async def insert_batched(collection, docs, batch_size=1000):
+    for start in range(0, len(docs), batch_size):
+        await collection.insert_many(docs[start:start + batch_size], ordered=False)
+
+
+async def seed(args, rng: random.Random) -> Dataset:
+    from app.core import security
+    from app.crud.crud_membership import membership_id
+    from app.db import database
+
+    await database.get_client().drop_database(args.database_name)
+    await database.create_indexes()
+
+    now = datetime.now(timezone.utc)
+    data = Dataset()
+    password_hash = security.get_password_hash("loadtest-password") # bcrypt once, shared by all seeded users
+
+    def user_doc(user_id, email):
+        return {"_id": user_id, "email": email, "full_name": f"Load {email}", "is_active": True, "is_admin": False,
+                "hashed_password": password_hash, "created_at": now, "updated_at": now}
+
+    users = {}
+    for i in range(args.users):
+        user_id = str(uuid.uuid4())
+        users[user_id] = user_doc(user_id, f"student{i}@loadtest.example")
+        data.students.append(user_id)
+    for i in range(args.requests):
+        user_id = str(uuid.uuid4())
+        users[user_id] = user_doc(user_id, f"joiner{i}@loadtest.example")
+        data.unaffiliated.append(user_id)
+
+    teams, memberships, assignments, submissions = [], [], [], []
+    for t in range(args.teams):
+        team_id, admin_id = str(uuid.uuid4()), str(uuid.uuid4())
+        users[admin_id] = user_doc(admin_id, f"teacher{t}@loadtest.example")
+        members = rng.sample(data.students, min(args.team_size, len(data.students)))
+        for member_id in [admin_id, *members]:
+            memberships.append({"_id": membership_id(team_id, member_id), "team_id": team_id, "user_id": member_id,
+                                "role": "admin" if member_id == admin_id else "member", "joined_at": now})
+        team = {"_id": team_id, "name": f"Load team {t}", "description": None, "admin_id": admin_id,
+                "member_count": 1 + len(members), "join_code": f"load{t:04d}{uuid.uuid4().hex[:6]}",
+                "created_at": now, "updated_at": now}
+        teams.append(team)
+        data.teams.append(team)
+        data.members_by_team[team_id] = members
+        data.assignments_by_team[team_id] = []
+
+        for a in range(args.assignments):
+            assignment_id = str(uuid.uuid4())
+            data.assignments_by_team[team_id].append(assignment_id)
+            assignments.append({"_id": assignment_id, "title": f"Assignment {a}", "description": "Load test",
+                                "due_date": now + timedelta(days=rng.randint(-20, 40)), "team_id": team_id,
+                                "creator_id": admin_id, "created_at": now, "updated_at": now})
+            for student_id in members:
+                if rng.random() >= args.submission_ratio:
+                    continue
+                version_count = rng.randint(1, args.versions)
+                versions = [{"version": v, "file_url": f"https://files.loadtest.example/{assignment_id}/{student_id}/{v}",
+                             "submitted_at": now - timedelta(hours=version_count - v), "content_hash": uuid.uuid4().hex,
+                             "notes": None} for v in range(1, version_count + 1)]
+                submissions.append({"_id": f"sub_{assignment_id}_{student_id}", "_rev": f"{version_count}-seed",
+                                    "doc_type": "submission", "assignment_id": assignment_id, "student_id": student_id,
+                                    "team_id": team_id, "current_version": version_count, "versions": versions,
+                                    "last_updated_at": now - timedelta(days=1)})
+
+    await insert_batched(database.get_user_collection(), list(users.values()))
+    await insert_batched(database.get_team_collection(), teams)
+    await insert_batched(database.get_membership_collection(), memberships)
+    await insert_batched(database.get_assignment_collection(), assignments)
+    await insert_batched(database.get_submission_collection(), submissions)
+
+    for user_id, user in users.items():
+        data.tokens[user_id] = security.create_access_token({"sub": user["email"], "id": user_id})
+    print(f"Seeded {len(users)} users, {len(teams)} teams, {len(assignments)} assignments, {len(submissions)} submissions")
+    return data
+
+
+# --- Scenarios: each returns an async callable issuing one request for iteration i ---
+
+def build_scenario(name, args, data: Dataset, rng: random.Random):
+    def auth(user_id):
+        return {"Authorization": f"Bearer {data.tokens[user_id]}"}
+
+    def random_member():
+        team = rng.choice(data.teams)
+        return team, rng.choice(data.members_by_team[team["_id"]])
+
+    if name == "register_login":
+        run_id = uuid.uuid4().hex[:8]
+        async def request(client, i):
+            email = f"new{run_id}{i}@loadtest.example"
+            response = await client.post("/api/auth/register", json={"email": email, "password": "loadtest-password"})
+            if response.status_code != 201:
+                return response
+            return await client.post("/api/auth/login", data={"username": email, "password": "loadtest-password"})
+        return request
+
+    if name == "join_team":
+        async def request(client, i):
+            user_id = data.unaffiliated[i % len(data.unaffiliated)]
+            team = data.teams[i % len(data.teams)]
+            return await client.post("/api/teams/join", json={"join_code": team["join_code"]}, headers=auth(user_id))
+        return request
+
+    if name == "list_assignments":
+        async def request(client, i):
+            team, member_id = random_member()
+            return await client.get(f"/api/teams/{team['_id']}/assignments", headers=auth(member_id))
+        return request
+
+    if name == "submit":
+        async def request(client, i):
+            team, member_id = random_member()
+            assignment_id = rng.choice(data.assignments_by_team[team["_id"]])
+            body = {"assignment_id": assignment_id, "team_id": team["_id"],
+                    "file_url": f"https://files.loadtest.example/{uuid.uuid4().hex}", "content_hash": uuid.uuid4().hex}
+            return await client.post(f"/api/assignments/{assignment_id}/submissions", json=body, headers=auth(member_id))
+        return request
+
+    if name == "bulk_docs":
+        async def request(client, i):
+            team, member_id = random_member()
+            now = datetime.now(timezone.utc)
+            docs = []
+            for assignment_id in rng.sample(data.assignments_by_team[team["_id"]],
+                                            min(args.bulk_batch, len(data.assignments_by_team[team["_id"]]))):
+                docs.append({"_id": f"sub_{assignment_id}_{member_id}", "_rev": f"1-{uuid.uuid4().hex}",
+                             "doc_type": "submission", "assignment_id": assignment_id, "student_id": member_id,
+                             "team_id": team["_id"], "current_version": 1,
+                             "versions": [{"version": 1, "file_url": f"https://files.loadtest.example/{uuid.uuid4().hex}",
+                                           "submitted_at": now.isoformat(), "content_hash": uuid.uuid4().hex}],
+                             "last_updated_at": now.isoformat()})
+            return await client.post(f"/api/sync/{member_id}/_bulk_docs", json={"docs": docs}, headers=auth(member_id))
+        return request
+
+    raise ValueError(f"Unknown scenario {name}")
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return None
+    index = min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+
+async def run_scenario(client, request, args):
+    from app.core import metrics
+
+    latencies, errors, next_index = [], 0, 0
+
+    async def worker():
+        nonlocal errors, next_index
+        while next_index < args.requests:
+            i = next_index
+            next_index += 1
+            start = time.perf_counter()
+            response = await request(client, i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    commands_before = metrics.mongo_command_duration_seconds.total_count()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    commands = metrics.mongo_command_duration_seconds.total_count() - commands_before
+
+    latencies.sort()
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "throughput_rps": round(len(latencies) / elapsed, 2),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 2),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 2),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 2),
+        "db_calls_per_request": round(commands / max(1, len(latencies)), 2),
+    }
+
+
+def compare(results, baseline):
+    print("\nChange vs baseline (positive = worse):")
+    for name, current in results["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name)
+        if not previous:
+            print(f"  {name:<18} no baseline")
+            continue
+        changes = []
+        for key, higher_is_worse in (("p50_ms", True), ("p95_ms", True), ("p99_ms", True),
+                                     ("throughput_rps", False), ("db_calls_per_request", True)):
+            if previous.get(key):
+                delta = (current[key] - previous[key]) / previous[key] * 100
+                changes.append(f"{key} {delta if higher_is_worse else -delta:+.1f}%")
+        print(f"  {name:<18} " + ", ".join(changes))
+
+
+async def main(args):
+    import httpx
+    from app.main import app
+
+    rng = random.Random(args.seed)
+    data = await seed(args, rng)
+
+    results = {
+        "meta": {
+            "generated_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "params": {k: (str(v) if isinstance(v, Path) else v) for k, v in vars(args).items()
+                       if k not in ("output", "baseline", "save_baseline", "database_url")},
+        },
+        "scenarios": {},
+    }
+    transport = httpx.ASGITransport(app=app)
+    # ASGITransport does not run the lifespan; enter it so requests see a warmed-up pool, as in production
+    async with app.router.lifespan_context(app):
+        async with httpx.AsyncClient(transport=transport, base_url="http://loadtest", timeout=60) as client:
+            for name in [s.strip() for s in args.scenarios.split(",") if s.strip()]:
+                summary = await run_scenario(client, build_scenario(name, args, data, rng), args)
+                results["scenarios"][name] = summary
+                print(f"{name:<18} {summary['throughput_rps']:>8} req/s  p50 {summary['p50_ms']:>8}ms  "
+                      f"p95 {summary['p95_ms']:>8}ms  p99 {summary['p99_ms']:>8}ms  "
+                      f"db/req {summary['db_calls_per_request']:>6}  errors {summary['errors']}")
+
+    if args.baseline.exists() and not args.save_baseline:
+        compare(results, json.loads(args.baseline.read_text()))
+    elif not args.save_baseline:
+        print(f"\nNo baseline at {args.baseline}; record one with --save-baseline")
+    if args.output:
+        args.output.write_text(json.dumps(results, indent=2) + "\n")
+    if args.save_baseline:
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(results, indent=2) + "\n")
+        print(f"Baseline written to {args.baseline}")
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment(arguments)
+    sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+    asyncio.run(main(arguments))
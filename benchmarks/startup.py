@@ -0,0 +1,106 @@
+"""
+Cold-start measurements: import time of app.main and latency of the first requests after startup.
+
+Import time is measured in fresh interpreters. Startup then runs in-process against a local mongod:
+the lifespan (ping, pool warm-up, index checks) is timed, and a burst of --concurrency requests
+that each do one user lookup is sent right after it, followed by a second, warm burst. Run with
+--no-lifespan to reproduce lazy connection setup, where the first burst opens the pool itself.
+
+    python -m benchmarks.startup
+    python -m benchmarks.startup --no-lifespan              # first requests pay connection setup
+    python -m benchmarks.startup --warm-connections 32 --concurrency 32
+"""
+import argparse
+import asyncio
+import os
+import statistics
+import subprocess
+import sys
+import time
+import uuid
+from contextlib import AsyncExitStack
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--database-url", default=os.environ.get("LOADTEST_DATABASE_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--database-name", default="classie_startup")
+    parser.add_argument("--import-runs", type=int, default=5, help="Fresh interpreters timed for the import")
+    parser.add_argument("--concurrency", type=int, default=16, help="Requests per burst")
+    parser.add_argument("--warm-connections", type=int, help="Override MONGO_MIN_POOL_SIZE")
+    parser.add_argument("--no-lifespan", action="store_true", help="Skip the lifespan, as before it existed")
+    return parser.parse_args()
+
+
+def configure_environment(args):
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["DATABASE_NAME"] = args.database_name
+    os.environ.setdefault("JWT_SECRET_KEY", "startup-secret")
+    os.environ["ADMISSION_CONTROL_ENABLED"] = "false"
+    if args.warm_connections is not None:
+        os.environ["MONGO_MIN_POOL_SIZE"] = str(args.warm_connections)
+
+
+def _import_ms(module: str, env: dict) -> float | None:
+    code = f"import time; t = time.perf_counter(); import {module}; print((time.perf_counter() - t) * 1000)"
+    result = subprocess.run([sys.executable, "-c", code], cwd=ROOT, env=env, capture_output=True, text=True)
+    return float(result.stdout.strip()) if result.returncode == 0 else None
+
+
+def measure_imports(runs: int) -> dict:
+    timings = [_import_ms("app.main", os.environ.copy()) for _ in range(runs)]
+    # Everything below app.main must import without any configuration
+    bare_env = {k: v for k, v in os.environ.items() if k not in ("DATABASE_URL", "DATABASE_NAME", "JWT_SECRET_KEY")}
+    return {
+        "app_main_ms": round(statistics.median(t for t in timings if t is not None), 1) if any(timings) else None,
+        "crud_without_config": _import_ms("app.crud.crud_submission", bare_env) is not None,
+    }
+
+
+def _summary(latencies: list) -> str:
+    return f"p50 {statistics.median(latencies):8.1f}ms  max {max(latencies):8.1f}ms"
+
+
+async def measure_startup(args):
+    import httpx
+    from app.core import security
+    from app.main import app
+
+    # A token for a user that does not exist: each request does one user lookup, then 401s
+    token = security.create_access_token({"sub": "startup@bench.example", "id": str(uuid.uuid4())})
+    headers = {"Authorization": f"Bearer {token}"}
+
+    async def burst(client):
+        async def one():
+            started = time.perf_counter()
+            await client.get("/api/users/me", headers=headers)
+            return (time.perf_counter() - started) * 1000
+        return await asyncio.gather(*(one() for _ in range(args.concurrency)))
+
+    async with AsyncExitStack() as stack:
+        started = time.perf_counter()
+        if not args.no_lifespan:
+            await stack.enter_async_context(app.router.lifespan_context(app))
+        startup_ms = (time.perf_counter() - started) * 1000
+        client = await stack.enter_async_context(
+            httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://startup", timeout=60)
+        )
+        first = await burst(client)
+        warm = await burst(client)
+
+    print(f"lifespan startup  {startup_ms:8.1f}ms" + (" (skipped)" if args.no_lifespan else ""))
+    print(f"first burst       {_summary(first)}")
+    print(f"warm burst        {_summary(warm)}")
+
+
+if __name__ == "__main__":
+    arguments = parse_args()
+    configure_environment(arguments)
+    sys.path.insert(0, str(ROOT))
+    imports = measure_imports(arguments.import_runs)
+    print(f"import app.main   {imports['app_main_ms']:8.1f}ms (median of {arguments.import_runs})")
+    print(f"crud import without configuration: {'ok' if imports['crud_without_config'] else 'FAILED'}")
+    asyncio.run(measure_startup(arguments))
@@ -0,0 +1,69 @@
+import os
+
+import pytest
+
+# Settings are read by the modules under test; nothing connects to these
+os.environ.setdefault("DATABASE_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DATABASE_NAME", "classie_test")
+os.environ.setdefault("JWT_SECRET_KEY", "test-secret")
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture(autouse=True, scope="session")
+def log_writer():
+    """ Stops the log writer started by events logged in tests while pytest's captured stdout is still open. """
+    yield
+    from app.core.log import shutdown_logging
+    shutdown_logging()
+
+
+@pytest.fixture
+def db(monkeypatch):
+    """ An in-memory database behind app.db.database's collection getters (needs mongomock-motor). """
+    mongomock_motor = pytest.importorskip("mongomock_motor")
+    import mongomock.collection
+    from app.db import database
+
+    # pymongo passes bulk update/replace operations a sort argument mongomock does not know yet
+    builder = mongomock.collection.BulkOperationBuilder
+    for name in ("add_update", "add_replace"):
+        add = getattr(builder, name)
+        monkeypatch.setattr(builder, name, lambda self, *args, sort=None, _add=add, **kwargs: _add(self, *args, **kwargs))
+
+    client = mongomock_motor.AsyncMongoMockClient(tz_aware=True)
+    monkeypatch.setattr(database, "client", client)
+    monkeypatch.setattr(database, "db", client[os.environ["DATABASE_NAME"]])
+    return database.db
+
+
+@pytest.fixture
+async def client(db, monkeypatch):
+    """
+    The API on the in-memory database; the lifespan (MongoDB start-up, background tasks) is not run,
+    and admission control is off (its per-worker buckets would carry over between tests).
+    """
+    import httpx
+    from app.core.config import settings
+    from app.main import app
+
+    monkeypatch.setattr(settings, "ADMISSION_CONTROL_ENABLED", False)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        yield client
+
+
+@pytest.fixture
+def make_user(db):
+    """ Inserts a user and returns (user_id, Authorization headers). """
+    from app.core import security
+
+    async def make(user_id, email=None):
+        email = email or f"{user_id}@example.com"
+        await db["users"].insert_one({"_id": user_id, "email": email, "hashed_password": None, "is_active": True})
+        token = security.create_access_token({"sub": email, "id": user_id})
+        return user_id, {"Authorization": f"Bearer {token}"}
+    return make
@@ -0,0 +1,31 @@
+import pytest
+
+from app.core.admission import default_route_limits
+from app.core.config import settings
+
+pytestmark = pytest.mark.anyio
+
+
+def _limit_for(method, path):
+    return next((limit.name for limit in default_route_limits() if limit.matches(method, path)), None)
+
+
+def test_uploads_are_limited():
+    assert _limit_for("POST", "/api/assignments/a1/submissions/upload") == "file_upload"
+    assert _limit_for("PATCH", "/api/assignments/a1/submissions/uploads/u1") == "resumable_upload"
+    # Creating a resumable upload and asking for its offset are cheap
+    assert _limit_for("POST", "/api/assignments/a1/submissions/uploads") is None
+    assert _limit_for("HEAD", "/api/assignments/a1/submissions/uploads/u1") is None
+
+
+@pytest.mark.parametrize("path", ["/api/health/admission", "/api/health/cache"])
+async def test_health_stats_need_metrics_access(client, make_user, monkeypatch, path):
+    monkeypatch.setattr(settings, "METRICS_TOKEN", "scraper-token")
+    monkeypatch.setattr(settings, "ADMIN_EMAILS", ["root@example.com"])
+    _, student = await make_user("student")
+    _, admin = await make_user("root", email="root@example.com")
+
+    assert (await client.get(path)).status_code == 401
+    assert (await client.get(path, headers=student)).status_code == 403
+    assert (await client.get(path, headers=admin)).status_code == 200
+    assert (await client.get(path, headers={"Authorization": "Bearer scraper-token"})).status_code == 200
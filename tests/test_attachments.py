@@ -0,0 +1,97 @@
+import base64
+
+import pytest
+
+from app.core.config import settings
+from app.services.attachments import parse_atts_since
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(autouse=True)
+def local_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_LOCAL_DIR", str(tmp_path))
+
+
+@pytest.fixture
+async def submission(db):
+    await db["teams"].insert_one({"_id": "t1", "name": "Team", "admin_id": "admin", "member_count": 1})
+    await db["submissions"].insert_one({
+        "_id": "sub_a_student", "_rev": "1-abc", "doc_type": "submission", "assignment_id": "a",
+        "student_id": "student", "team_id": "t1", "current_version": 0, "versions": [],
+    })
+    return "sub_a_student"
+
+
+async def _put(client, headers, doc_id, rev, body=b"<script>alert(1)</script>"):
+    return await client.put(
+        f"/api/sync/classie/{doc_id}/notes.html", params={"rev": rev}, content=body,
+        headers={**headers, "Content-Type": "text/html"},
+    )
+
+
+async def test_student_puts_and_downloads_attachment(client, make_user, submission):
+    _, headers = await make_user("student")
+
+    put = await _put(client, headers, submission, "1-abc")
+    assert put.status_code == 201
+    assert put.json()["rev"].startswith("2-")
+
+    response = await client.get(f"/api/sync/classie/{submission}/notes.html", headers=headers)
+    assert response.status_code == 200
+    assert response.content == b"<script>alert(1)</script>"
+    # Client-chosen content types are never rendered on the API origin
+    assert response.headers["content-disposition"] == "attachment"
+    assert response.headers["x-content-type-options"] == "nosniff"
+
+
+async def test_team_admin_can_read_attachment(client, make_user, submission):
+    _, student = await make_user("student")
+    _, admin = await make_user("admin")
+    await _put(client, student, submission, "1-abc")
+
+    assert (await client.get(f"/api/sync/classie/{submission}/notes.html", headers=admin)).status_code == 200
+
+
+async def test_other_users_are_refused(client, make_user, submission):
+    _, student = await make_user("student")
+    _, other = await make_user("other")
+    await _put(client, student, submission, "1-abc")
+
+    assert (await client.get(f"/api/sync/classie/{submission}/notes.html", headers=other)).status_code == 403
+    assert (await _put(client, other, submission, "2-whatever")).status_code == 403
+
+
+async def test_attachments_require_authentication(client, submission):
+    assert (await client.get(f"/api/sync/classie/{submission}/notes.html")).status_code == 401
+    assert (await _put(client, {}, submission, "1-abc")).status_code == 401
+
+
+# --- atts_since ---
+
+def test_parse_atts_since():
+    assert parse_atts_since(None) is None
+    assert parse_atts_since("[]") == 0
+    assert parse_atts_since('["1-abc", "3-def", "2-ghi"]') == 3
+
+@pytest.mark.parametrize("atts_since", ["[", "[1]", '"1-abc"', '{"1-abc": 1}', '["abc"]', '["1-"]'])
+def test_parse_atts_since_rejects_anything_but_revisions(atts_since):
+    with pytest.raises(ValueError):
+        parse_atts_since(atts_since)
+
+
+async def test_atts_since_inlines_only_newer_attachments(client, make_user, submission):
+    _, headers = await make_user("student")
+    rev = (await _put(client, headers, submission, "1-abc", body=b"first")).json()["rev"]
+    await client.put(f"/api/sync/classie/{submission}/second.txt", params={"rev": rev}, content=b"second", headers=headers)
+
+    doc = (await client.get(f"/api/sync/classie/{submission}", params={"atts_since": f'["{rev}"]'})).json()
+
+    assert doc["_attachments"]["notes.html"]["stub"] is True # Held by the client since rev 2
+    assert base64.b64decode(doc["_attachments"]["second.txt"]["data"]) == b"second"
+
+@pytest.mark.parametrize("atts_since", ["[", "[1]"])
+async def test_invalid_atts_since_is_a_bad_request(client, submission, atts_since):
+    response = await client.get(f"/api/sync/classie/{submission}", params={"atts_since": atts_since})
+
+    assert response.status_code == 400
@@ -0,0 +1,37 @@
+import pytest
+
+pytestmark = pytest.mark.anyio
+
+CHECKPOINT = "/api/sync/classie/_local/replication-1"
+
+
+async def test_missing_checkpoint_restarts_replication(client):
+    assert (await client.get(CHECKPOINT)).status_code == 404
+
+async def test_checkpoint_round_trip(client):
+    created = await client.put(CHECKPOINT, json={"session_id": "s1", "last_seq": "10"})
+    assert created.status_code == 201 and created.json()["rev"] == "0-1"
+
+    updated = await client.put(CHECKPOINT, json={"_rev": "0-1", "session_id": "s1", "last_seq": "42"})
+    assert updated.json()["rev"] == "0-2"
+
+    assert (await client.get(CHECKPOINT)).json() == {
+        "_id": "_local/replication-1", "_rev": "0-2", "session_id": "s1", "last_seq": "42"
+    }
+
+async def test_checkpoint_writes_are_compare_and_set(client):
+    await client.put(CHECKPOINT, json={"last_seq": "10"})
+
+    assert (await client.put(CHECKPOINT, json={"last_seq": "11"})).status_code == 409 # Created twice
+    assert (await client.put(CHECKPOINT, json={"_rev": "0-7", "last_seq": "11"})).status_code == 409
+    assert (await client.delete(CHECKPOINT, params={"rev": "0-7"})).status_code == 409
+
+    assert (await client.delete(CHECKPOINT, params={"rev": "0-1"})).status_code == 200
+    assert (await client.get(CHECKPOINT)).status_code == 404
+
+async def test_checkpoints_are_scoped_per_db_and_never_replicated(client):
+    await client.put(CHECKPOINT, json={"last_seq": "10"})
+
+    assert (await client.get("/api/sync/other/_local/replication-1")).status_code == 404
+    changes = (await client.get("/api/sync/classie/_changes")).json()
+    assert not any("_local" in str(change.get("id")) for change in changes.get("results", []))
@@ -0,0 +1,43 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.crud import crud_assignment, crud_submission
+
+pytestmark = pytest.mark.anyio
+
+
+async def _seed(db, student_id="student1"):
+    now = datetime.now(timezone.utc)
+    await db.teams.insert_one({"_id": "team1", "name": "Team One", "admin_id": "admin1", "member_count": 1})
+    await db.memberships.insert_one({"_id": f"team1:{student_id}", "team_id": "team1", "user_id": student_id, "role": "member"})
+    for assignment_id in ("assignment1", "assignment2"):
+        await db.assignments.insert_one({
+            "_id": assignment_id, "title": f"Title {assignment_id}", "team_id": "team1", "creator_id": "admin1",
+            "due_date": now + timedelta(days=1), "created_at": now, "updated_at": now,
+        })
+    return now
+
+
+async def test_feed_reports_own_submission(db):
+    now = await _seed(db)
+    doc_id = crud_submission.generate_submission_doc_id("assignment1", "student1")
+    await db.submissions.insert_one({"_id": doc_id, "_rev": "1-a", "assignment_id": "assignment1", "student_id": "student1",
+                                     "current_version": 2, "versions": [], "last_updated_at": now})
+
+    feed = {item.id: item for item in await crud_assignment.get_feed_for_student("student1")}
+
+    assert feed["assignment1"].submission.current_version == 2
+    assert feed["assignment2"].submission is None
+
+
+async def test_feed_after_sync_deletion(db):
+    now = await _seed(db)
+    doc_id = crud_submission.generate_submission_doc_id("assignment1", "student1")
+    # What _bulk_docs keeps of a deleted submission
+    await db.submissions.insert_one(crud_submission.make_tombstone(doc_id, "2-b", now))
+
+    feed = {item.id: item for item in await crud_assignment.get_feed_for_student("student1")}
+
+    assert feed["assignment1"].submission is None
+    assert feed["assignment1"].team_name == "Team One"
@@ -0,0 +1,54 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.crud import crud_submission
+from app.crud.crud_submission import make_tombstone, revision_generation
+from app.schemas.submission import SubmissionCreate, SubmissionUploadNewVersion
+
+pytestmark = pytest.mark.anyio
+
+
+def _create(content_hash="h1"):
+    return SubmissionCreate(assignment_id="a", team_id="t", file_url=f"http://files/{content_hash}", content_hash=content_hash)
+
+def _new_version(content_hash):
+    return SubmissionUploadNewVersion(file_url=f"http://files/{content_hash}", content_hash=content_hash)
+
+
+async def test_created_submission_has_a_revision(db):
+    submission = await crud_submission.create_submission(_create(), "s")
+
+    assert submission.rev.startswith("1-")
+    assert (await db["submissions"].find_one({"_id": submission.id}))["_rev"] == submission.rev
+
+async def test_new_version_gets_a_new_revision(db):
+    created = await crud_submission.create_submission(_create(), "s")
+
+    updated = await crud_submission.add_new_submission_version(created.id, _new_version("h2"), expected_current_version=1)
+
+    assert updated.rev.startswith("2-") and updated.current_version == 2
+    held = await db["submissions"].find_one({"_id": created.id})
+    assert held["_rev"] == updated.rev
+    assert [version["content_hash"] for version in held["versions"]] == ["h1", "h2"]
+
+async def test_new_version_on_a_stale_version_is_refused(db):
+    created = await crud_submission.create_submission(_create(), "s")
+    await crud_submission.add_new_submission_version(created.id, _new_version("h2"), expected_current_version=1)
+
+    assert await crud_submission.add_new_submission_version(created.id, _new_version("h3"), expected_current_version=1) is None
+
+async def test_same_file_again_is_not_a_new_version(db):
+    created = await crud_submission.create_submission(_create(), "s")
+
+    again = await crud_submission.add_new_submission_version(created.id, _new_version("h1"), expected_current_version=1)
+
+    assert again.rev == created.rev and again.current_version == 1
+
+async def test_recreated_submission_descends_from_its_deletion(db):
+    doc_id = crud_submission.generate_submission_doc_id("a", "s")
+    await db["submissions"].insert_one(make_tombstone(doc_id, "3-deleted", datetime.now(timezone.utc)))
+
+    submission = await crud_submission.create_submission(_create(), "s")
+
+    assert revision_generation(submission.rev) == 4
@@ -0,0 +1,267 @@
+from datetime import datetime, timezone
+
+import pytest
+
+from app.crud.crud_submission import generate_revision, is_resurrection, make_tombstone, revision_history
+from app.services.sync_resolvers import merge_submissions
+
+
+def _version(number, content_hash, notes=None):
+    return {"version": number, "file_url": f"http://files/{content_hash}", "content_hash": content_hash, "notes": notes}
+
+def _submission(versions, **fields):
+    return {"_id": "sub_a_s", "_rev": "3-server", "doc_type": "submission", "assignment_id": "a", "student_id": "s",
+            "versions": versions, "current_version": max((v["version"] for v in versions), default=0), **fields}
+
+def _replicated(rev, versions, ids=None):
+    """ A submission as PouchDB's replicator pushes it: with its team and a _revisions history. """
+    doc = _submission(versions, _rev=rev, team_id="t")
+    generation, rev_id = rev.split("-", 1)
+    doc["_revisions"] = {"start": int(generation), "ids": ids or [rev_id]}
+    return doc
+
+async def _push(client, *docs):
+    response = await client.post("/api/sync/classie/_bulk_docs", json={"docs": list(docs)})
+    assert response.status_code == 200
+    return response.json()
+
+async def _replicate(client, *docs):
+    response = await client.post("/api/sync/classie/_bulk_docs", json={"docs": list(docs), "new_edits": False})
+    assert response.status_code == 200
+    return response.json()
+
+
+# --- generate_revision ---
+
+def test_revision_is_deterministic():
+    doc = {"_id": "sub_a_s", "current_version": 1, "versions": [_version(1, "h1")]}
+
+    assert generate_revision(doc, "1-abc") == generate_revision(dict(doc), "1-abc")
+    # Key order, the id and the previous rev are not part of the content
+    assert generate_revision(doc, "1-abc") == generate_revision({"versions": doc["versions"], "current_version": 1, "_rev": "9-x"}, "1-abc")
+
+def test_revision_generation_follows_parent():
+    assert generate_revision({"a": 1}, None).startswith("1-")
+    assert generate_revision({"a": 1}, "4-abc").startswith("5-")
+
+def test_revision_depends_on_parent_body_and_deletion():
+    revision = generate_revision({"a": 1}, "1-abc")
+
+    assert generate_revision({"a": 1}, "1-def") != revision
+    assert generate_revision({"a": 2}, "1-abc") != revision
+    assert generate_revision({"a": 1, "_deleted": True}, "1-abc") != revision
+
+
+# --- merge_submissions ---
+
+def test_merge_appends_versions_only_the_client_has():
+    server = _submission([_version(1, "h1")])
+    incoming = _submission([_version(1, "h1"), _version(2, "h2")], _rev="2-client")
+
+    merged = merge_submissions(server, incoming)
+
+    assert [(v["version"], v["content_hash"]) for v in merged["versions"]] == [(1, "h1"), (2, "h2")]
+    assert merged["current_version"] == 2
+
+def test_merge_renumbers_versions_appended_on_both_sides():
+    server = _submission([_version(1, "h1"), _version(2, "server")])
+    incoming = _submission([_version(1, "h1"), _version(2, "client")], _rev="2-client")
+
+    merged = merge_submissions(server, incoming)
+
+    assert [(v["version"], v["content_hash"]) for v in merged["versions"]] == [(1, "h1"), (2, "server"), (3, "client")]
+    assert merged["current_version"] == 3
+
+def test_merge_combines_notes_of_the_same_version():
+    server = _submission([_version(1, "h1", notes="draft")])
+    incoming = _submission([_version(1, "h1", notes="final")], _rev="2-client")
+
+    assert merge_submissions(server, incoming)["versions"][0]["notes"] == "draft\n\nfinal"
+
+def test_merge_of_replayed_push_returns_server_doc():
+    server = _submission([_version(1, "h1", notes="draft"), _version(2, "h2")])
+    incoming = _submission([_version(1, "h1", notes="draft")], _rev="2-client")
+
+    assert merge_submissions(server, incoming) is server
+
+def test_merge_skips_versions_archived_by_compaction():
+    # Versions 1-2 were moved to the archive; the client still holds version 1
+    server = _submission([_version(3, "h3"), _version(4, "h4")], archived_version_count=2)
+    incoming = _submission([_version(1, "h1"), _version(3, "h3"), _version(4, "h4")], _rev="2-client")
+
+    assert merge_submissions(server, incoming) is server
+
+def test_merge_refuses_deletions_and_other_owners():
+    server = _submission([_version(1, "h1")])
+
+    assert merge_submissions(server, {**server, "_deleted": True}) is None
+    assert merge_submissions(server, {**server, "student_id": "other"}) is None
+
+
+# --- is_resurrection ---
+
+def test_resurrection_of_a_tombstone():
+    tombstone = make_tombstone("sub_a_s", "3-deleted", datetime.now(timezone.utc))
+
+    assert is_resurrection(tombstone, {"_id": "sub_a_s", "_rev": "2-stale"})
+    assert is_resurrection(tombstone, {"_id": "sub_a_s", "_rev": "3-other"})
+
+def test_not_a_resurrection():
+    tombstone = make_tombstone("sub_a_s", "3-deleted", datetime.now(timezone.utc))
+
+    assert not is_resurrection(tombstone, {"_id": "sub_a_s", "_rev": "4-recreated"}) # Descends from the deletion
+    assert not is_resurrection(tombstone, {"_id": "sub_a_s", "_rev": "3-deleted"}) # The deletion itself
+    assert not is_resurrection(tombstone, {"_id": "sub_a_s", "_rev": "2-x", "_deleted": True})
+    assert not is_resurrection({"_id": "sub_a_s", "_rev": "3-live"}, {"_id": "sub_a_s", "_rev": "2-x"})
+    assert not is_resurrection(None, {"_id": "sub_a_s", "_rev": "1-x"})
+
+
+# --- new_edits=false and _revs_diff ---
+
+@pytest.mark.anyio
+async def test_replication_stores_revisions_verbatim(client, db):
+    doc = _replicated("3-c", [_version(1, "h1")], ids=["c", "b", "a"])
+
+    assert await _replicate(client, doc) == [] # Like CouchDB, only failures are reported
+    assert await _replicate(client, doc) == [] # Replays are no-ops
+
+    held = await db["submissions"].find_one({"_id": "sub_a_s"})
+    assert held["_rev"] == "3-c"
+    assert held["_revisions"] == {"start": 3, "ids": ["c", "b", "a"]}
+
+@pytest.mark.anyio
+async def test_replication_keeps_descendants_and_skips_ancestors(client, db):
+    await _replicate(client, _replicated("2-b", [_version(1, "h1")], ids=["b", "a"]))
+
+    await _replicate(client, _replicated("3-c", [_version(1, "h1"), _version(2, "h2")], ids=["c", "b", "a"]))
+    assert (await db["submissions"].find_one({"_id": "sub_a_s"}))["_rev"] == "3-c"
+
+    await _replicate(client, _replicated("2-b", [_version(1, "h1")], ids=["b", "a"])) # A stale device
+    assert (await db["submissions"].find_one({"_id": "sub_a_s"}))["_rev"] == "3-c"
+
+@pytest.mark.anyio
+async def test_revs_diff_answers_from_revision_history(client):
+    await _replicate(client, _replicated("3-c", [_version(1, "h1")], ids=["c", "b", "a"]))
+
+    response = await client.post("/api/sync/classie/_revs_diff", json={
+        "sub_a_s": ["1-a", "2-b", "3-c", "3-other", "4-d"],
+        "sub_a_unknown": ["1-x"],
+    })
+
+    assert response.json() == {"sub_a_s": {"missing": ["3-other", "4-d"]}, "sub_a_unknown": {"missing": ["1-x"]}}
+
+@pytest.mark.anyio
+async def test_revs_diff_knows_the_tombstone_rev(client):
+    await _replicate(client, _replicated("1-a", [_version(1, "h1")]))
+    await _replicate(client, {"_id": "sub_a_s", "_rev": "2-deleted", "_deleted": True, "_revisions": {"start": 2, "ids": ["deleted", "a"]}})
+
+    response = await client.post("/api/sync/classie/_revs_diff", json={"sub_a_s": ["2-deleted"]})
+
+    assert response.json() == {}
+
+
+# --- Divergent replicated branches ---
+
+@pytest.mark.anyio
+async def test_descendant_of_a_merged_away_branch_converges(client, db):
+    base = [_version(1, "h1"), _version(2, "h2")]
+    await _replicate(client, _replicated("3-ddd", [*base, _version(3, "a3")], ids=["ddd", "bbb", "aaa"]))
+    # Device B appended on the same parent: merged on top of the winning branch (3-xxx)
+    await _replicate(client, _replicated("3-xxx", [*base, _version(3, "b3")], ids=["xxx", "bbb", "aaa"]))
+    merged = await db["submissions"].find_one({"_id": "sub_a_s"})
+    assert merged["_rev"].startswith("4-") and "3-ddd" not in revision_history(merged)
+
+    # Device A kept editing its branch: nothing new for the resolver, but 4-zzz beats the merge on A
+    descendant = _replicated("4-zzz", [*base, _version(3, "a3")], ids=["zzz", "ddd", "bbb", "aaa"])
+    assert await _replicate(client, descendant) == []
+
+    held = await db["submissions"].find_one({"_id": "sub_a_s"})
+    assert held["_rev"].startswith("5-")
+    assert {"4-zzz", merged["_rev"]} & revision_history(held) == {"4-zzz"} # Descends from A's leaf
+    assert [v["content_hash"] for v in held["versions"]] == ["h1", "h2", "a3", "b3"]
+
+    # Replays are then ancestors: nothing is written again
+    await _replicate(client, descendant)
+    assert (await db["submissions"].find_one({"_id": "sub_a_s"}))["_rev"] == held["_rev"]
+
+@pytest.mark.anyio
+async def test_descendant_appending_to_a_merged_away_branch_is_merged(client, db):
+    base = [_version(1, "h1"), _version(2, "h2")]
+    await _replicate(client, _replicated("3-ddd", [*base, _version(3, "a3")], ids=["ddd", "bbb", "aaa"]))
+    await _replicate(client, _replicated("3-xxx", [*base, _version(3, "b3")], ids=["xxx", "bbb", "aaa"]))
+
+    await _replicate(client, _replicated("4-eee", [*base, _version(3, "a3"), _version(4, "a4")], ids=["eee", "ddd", "bbb", "aaa"]))
+
+    held = await db["submissions"].find_one({"_id": "sub_a_s"})
+    assert held["_rev"].startswith("5-")
+    assert [v["content_hash"] for v in held["versions"]] == ["h1", "h2", "a3", "b3", "a4"]
+
+@pytest.mark.anyio
+async def test_discarded_divergent_revision_is_reported(client, db):
+    await _replicate(client, _replicated("3-zzz", [_version(1, "h1")], ids=["zzz", "bbb", "aaa"]))
+    # A deletion cannot be merged, and loses to the server's branch
+    deletion = {"_id": "sub_a_s", "_rev": "3-ccc", "_deleted": True, "_revisions": {"start": 3, "ids": ["ccc", "bbb", "aaa"]}}
+
+    assert await _replicate(client, deletion) == [
+        {"id": "sub_a_s", "error": "conflict", "reason": "Divergent revision lost to the server's"}
+    ]
+    assert (await db["submissions"].find_one({"_id": "sub_a_s"}))["_rev"] == "3-zzz"
+
+
+# --- Concurrent _bulk_docs edits ---
+
+@pytest.mark.anyio
+async def test_concurrent_appends_are_merged(client, db):
+    [created] = await _push(client, _submission([_version(1, "h1")], _rev="1-client", team_id="t"))
+    # Two devices append a version to the same revision
+    [first] = await _push(client, _submission([_version(1, "h1"), _version(2, "phone")], _rev=created["rev"], team_id="t"))
+    [second] = await _push(client, _submission([_version(1, "h1"), _version(2, "laptop")], _rev=created["rev"], team_id="t"))
+
+    assert first["ok"] and second["ok"] and second["rev"].startswith("4-")
+    held = await db["submissions"].find_one({"_id": "sub_a_s"})
+    assert held["_rev"] == second["rev"]
+    assert [(v["version"], v["content_hash"]) for v in held["versions"]] == [(1, "h1"), (2, "phone"), (3, "laptop")]
+    assert held["current_version"] == 3
+
+@pytest.mark.anyio
+async def test_versions_archived_by_compaction_are_not_merged_back(client, db):
+    await db["submissions"].insert_one(_submission(
+        [_version(3, "h3"), _version(4, "h4")], _rev="5-compacted", team_id="t", archived_version_count=2
+    ))
+    # A device still holding version 1 pushes an edit of the revision before compaction
+    stale = _submission([_version(1, "h1"), _version(3, "h3"), _version(4, "h4")], _rev="4-before", team_id="t")
+
+    assert await _push(client, stale) == [{"ok": True, "id": "sub_a_s", "rev": "5-compacted"}]
+    assert [v["version"] for v in (await db["submissions"].find_one({"_id": "sub_a_s"}))["versions"]] == [3, 4]
+
+
+# --- Deletion tombstones ---
+
+@pytest.mark.anyio
+async def test_deletion_keeps_a_tombstone(client, db):
+    [created] = await _push(client, _submission([_version(1, "h1")], _rev="1-client", team_id="t"))
+    [deleted] = await _push(client, {"_id": "sub_a_s", "_rev": created["rev"], "_deleted": True})
+
+    assert deleted["ok"] and deleted["rev"].startswith("3-")
+    tombstone = await db["submissions"].find_one({"_id": "sub_a_s"})
+    assert {key: tombstone[key] for key in ("_rev", "_deleted")} == {"_rev": deleted["rev"], "_deleted": True}
+    assert "versions" not in tombstone
+
+    # Not found, except at its deletion revision
+    assert (await client.get("/api/sync/classie/sub_a_s")).status_code == 404
+    response = await client.get("/api/sync/classie/sub_a_s", params={"rev": deleted["rev"]})
+    assert response.json() == {"_id": "sub_a_s", "_rev": deleted["rev"], "_deleted": True}
+
+@pytest.mark.anyio
+async def test_stale_replica_cannot_resurrect_a_deleted_doc(client, db):
+    [created] = await _push(client, _submission([_version(1, "h1")], _rev="1-client", team_id="t"))
+    [deleted] = await _push(client, {"_id": "sub_a_s", "_rev": created["rev"], "_deleted": True})
+
+    # A device that never saw the deletion pushes its edit of the older revision
+    stale = _submission([_version(1, "h1"), _version(2, "h2")], _rev=created["rev"], team_id="t")
+    assert await _push(client, stale) == [{"id": "sub_a_s", "error": "conflict", "reason": "Document was deleted"}]
+    assert (await db["submissions"].find_one({"_id": "sub_a_s"}))["_rev"] == deleted["rev"]
+
+    # An edit that descends from the deletion re-creates the document
+    [recreated] = await _push(client, _submission([_version(1, "h3")], _rev=deleted["rev"], team_id="t"))
+    assert recreated["ok"] and not (await db["submissions"].find_one({"_id": "sub_a_s"})).get("_deleted")
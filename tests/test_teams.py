@@ -0,0 +1,44 @@
+import pytest
+
+from app.crud import crud_team
+from app.db.migrations import migrate_memberships
+from app.schemas.team import TeamCreate
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_join_by_code_counts_each_member_once(db):
+    team = await crud_team.create_team(TeamCreate(name="Physics", admin_id="admin"))
+
+    joined_team, joined = await crud_team.join_team_by_code(team.join_code, "student")
+    assert joined and joined_team.member_count == 2
+
+    again, joined = await crud_team.join_team_by_code(team.join_code, "student")
+    assert not joined and again.member_count == 2
+
+    assert await crud_team.join_team_by_code("unknown", "student") == (None, False)
+
+async def test_memberships_migration_recounts_interrupted_joins(db):
+    team = await crud_team.create_team(TeamCreate(name="Physics", admin_id="admin"))
+    await crud_team.join_team_by_code(team.join_code, "student")
+    # A join that stopped between the membership insert and the $inc
+    await db["memberships"].insert_one({"_id": f"{team.id}:late", "team_id": team.id, "user_id": "late", "role": "member"})
+
+    await migrate_memberships()
+
+    assert (await crud_team.get_team_by_id(team.id)).member_count == 3
+
+async def test_enrollment_matches_emails_case_insensitively(db):
+    team = await crud_team.create_team(TeamCreate(name="Physics", admin_id="admin"))
+    await db["users"].insert_many([
+        {"_id": "alice", "email": "Alice.Smith@example.com"},
+        {"_id": "bob", "email": "bob@example.com"},
+    ])
+
+    results = await crud_team.enroll_users_by_email(team.id, ["alice.smith@example.com", "Bob@example.com", "carol@example.com"])
+
+    assert [(result.email, result.status, result.user_id) for result in results] == [
+        ("alice.smith@example.com", "enrolled", "alice"),
+        ("Bob@example.com", "enrolled", "bob"),
+        ("carol@example.com", "not_found", None),
+    ]
@@ -0,0 +1,39 @@
+import pytest
+
+from app.core.config import settings
+
+pytestmark = pytest.mark.anyio
+
+UPLOADS = "/api/assignments/a1/submissions/uploads"
+
+
+@pytest.fixture(autouse=True)
+def local_storage(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "STORAGE_LOCAL_DIR", str(tmp_path))
+
+
+@pytest.fixture
+async def student(db, make_user):
+    await db["assignments"].insert_one({"_id": "a1", "title": "Essay", "team_id": "t1", "creator_id": "admin"})
+    await db["memberships"].insert_one({"_id": "t1:student", "team_id": "t1", "user_id": "student", "role": "member"})
+    _, headers = await make_user("student")
+    return {**headers, "Tus-Resumable": "1.0.0"}
+
+
+async def test_resumable_upload_becomes_a_submission_version(client, db, student):
+    created = await client.post(UPLOADS, headers={**student, "Upload-Length": "10"})
+    assert created.status_code == 201
+    location = created.headers["location"]
+
+    patch = {**student, "Content-Type": "application/offset+octet-stream"}
+    assert (await client.patch(location, content=b"hello", headers={**patch, "Upload-Offset": "0"})).headers["upload-offset"] == "5"
+    assert (await client.head(location, headers=student)).headers["upload-offset"] == "5"
+    assert (await client.patch(location, content=b"world", headers={**patch, "Upload-Offset": "5"})).status_code == 204
+
+    submission = await db["submissions"].find_one({"student_id": "student"})
+    assert submission["current_version"] == 1 and submission["_rev"].startswith("1-")
+
+async def test_empty_resumable_upload_is_a_bad_request(client, student):
+    response = await client.post(UPLOADS, headers={**student, "Upload-Length": "0"})
+
+    assert response.status_code == 400